@@ -1,5 +1,7 @@
 """Application API Views"""
-from typing import Optional
+from itertools import chain
+from typing import Iterable, Optional
+from uuid import UUID
 
 from django.core.cache import cache
 from django.db.models import QuerySet
@@ -25,19 +27,58 @@ from authentik.core.api.used_by import UsedByMixin
 from authentik.core.api.utils import FilePathSerializer, FileUploadSerializer
 from authentik.core.models import Application, User
 from authentik.events.models import EventAction
+from authentik.lib.config import CONFIG
+from authentik.lib.utils.cache import CacheNamespace
 from authentik.policies.api.exec import PolicyTestResultSerializer
+from authentik.policies.batch import BatchPolicyEngine
 from authentik.policies.engine import PolicyEngine
+from authentik.policies.models import PolicyBinding, PolicyDependency
+from authentik.policies.process import CACHE_TIMEOUT
 from authentik.policies.types import PolicyResult
 from authentik.stages.user_login.stage import USER_LOGIN_AUTHENTICATED
 
 LOGGER = get_logger()
 
 
+USER_APP_CACHE = CacheNamespace("user_app_cache")
+CACHE_TIMEOUT_USER = int(CONFIG.y("redis.cache_timeout_applications_user", 86400))
+
+
 def user_app_cache_key(user_pk: str) -> str:
     """Cache key where application list for user is saved"""
     return f"user_app_cache_{user_pk}"
 
 
+def user_app_cache(user_pk: str) -> CacheNamespace:
+    """Cache namespace containing the application list of a user"""
+    return USER_APP_CACHE.child(f"user_{user_pk}")
+
+
+def policy_app_cache(policy_pk: UUID) -> CacheNamespace:
+    """Cache namespace containing all application lists which depend on a policy"""
+    return USER_APP_CACHE.child(f"policy_{policy_pk.hex}")
+
+
+def cache_allowed_applications(
+    user_pk: str, applications: list[Application], bindings: Iterable[PolicyBinding]
+):
+    """Cache the application list of a user, and index it by the policies it depends on.
+    Lists which only depend on the user are kept longer, as they're invalidated when the
+    user, their groups, any of the policies or any application or provider change. Other
+    lists are kept as long as the policy results they're based on."""
+    key = user_app_cache_key(user_pk)
+    timeout = CACHE_TIMEOUT_USER
+    policies = set()
+    for binding in bindings:
+        if binding.dependency != PolicyDependency.USER:
+            timeout = min(timeout, CACHE_TIMEOUT)
+        if binding.policy_id:
+            policies.add(binding.policy_id)
+    user_app_cache(user_pk).set(key, applications, timeout=timeout)
+    for policy_pk in policies:
+        policy_app_cache(policy_pk).add(key, timeout=timeout)
+
+
 class ApplicationSerializer(ModelSerializer):
     """Application Serializer"""
 
@@ -95,14 +136,13 @@ class ApplicationViewSet(UsedByMixin, ModelViewSet):
             queryset = backend().filter_queryset(self.request, queryset, self)
         return queryset
 
-    def _get_allowed_applications(self, queryset: QuerySet) -> list[Application]:
-        applications = []
-        for application in queryset:
-            engine = PolicyEngine(application, self.request.user, self.request)
-            engine.build()
-            if engine.passing:
-                applications.append(application)
-        return applications
+    def _get_policy_engine(self, queryset: QuerySet) -> BatchPolicyEngine:
+        return BatchPolicyEngine(queryset, self.request.user, self.request).build()
+
+    def _get_allowed_applications(self, engine: BatchPolicyEngine) -> list[Application]:
+        return [
+            application for application in engine.pbms if engine.results[application.pk].passing
+        ]
 
     @extend_schema(
         parameters=[
@@ -167,16 +207,17 @@ class ApplicationViewSet(UsedByMixin, ModelViewSet):
 
         allowed_applications = []
         if not should_cache:
-            allowed_applications = self._get_allowed_applications(queryset)
+            allowed_applications = self._get_allowed_applications(self._get_policy_engine(queryset))
         if should_cache:
             LOGGER.debug("Caching allowed application list")
             allowed_applications = cache.get(user_app_cache_key(self.request.user.pk))
             if not allowed_applications:
-                allowed_applications = self._get_allowed_applications(queryset)
-                cache.set(
-                    user_app_cache_key(self.request.user.pk),
+                engine = self._get_policy_engine(queryset)
+                allowed_applications = self._get_allowed_applications(engine)
+                cache_allowed_applications(
+                    self.request.user.pk,
                     allowed_applications,
-                    timeout=86400,
+                    chain.from_iterable(engine.bindings.values()),
                 )
         serializer = self.get_serializer(allowed_applications, many=True)
         return self.get_paginated_response(serializer.data)
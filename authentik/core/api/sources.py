@@ -108,6 +108,7 @@ class SourceViewSet(
             if not user_settings:
                 continue
             policy_engine = PolicyEngine(source, request.user, request)
+            policy_engine.short_circuit = True
             policy_engine.build()
             if not policy_engine.passing:
                 continue
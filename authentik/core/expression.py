@@ -32,6 +32,11 @@ class PropertyMappingEvaluator(BaseEvaluator):
         self._context["request"] = req
         self._context.update(**kwargs)
 
+    def set_mapping(self, mapping: PropertyMapping):
+        """Switch the mapping of the current context, used to evaluate multiple mappings
+        for the same object without rebuilding the context"""
+        self._context["request"].obj = mapping
+
     def handle_error(self, exc: Exception, expression_source: str):
         """Exception Handler"""
         error_string = "\n".join(format_tb(exc.__traceback__) + [str(exc)])
@@ -1,5 +1,5 @@
 """authentik core signals"""
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional, Union
 
 from django.apps import apps
 from django.contrib.auth.signals import user_logged_in, user_logged_out
@@ -7,11 +7,12 @@ from django.contrib.sessions.backends.cache import KEY_PREFIX
 from django.core.cache import cache
 from django.core.signals import Signal
 from django.db.models import Model
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.http.request import HttpRequest
 from prometheus_client import Gauge
 
+from authentik.lib.utils.http import ip_override_cache, ip_override_cache_key
 from authentik.root.monitoring import monitoring_set
 
 # Arguments: user: User, password: str
@@ -20,7 +21,7 @@ password_changed = Signal()
 GAUGE_MODELS = Gauge("authentik_models", "Count of various objects", ["model_name", "app"])
 
 if TYPE_CHECKING:
-    from authentik.core.models import AuthenticatedSession, User
+    from authentik.core.models import AuthenticatedSession, Token, User
 
 
 @receiver(monitoring_set)
@@ -35,19 +36,29 @@ def monitoring_set_models(sender, **kwargs):
 
 
 @receiver(post_save)
+@receiver(post_delete)
 # pylint: disable=unused-argument
-def post_save_application(sender: type[Model], instance, created: bool, **_):
-    """Clear user's application cache upon application creation"""
-    from authentik.core.api.applications import user_app_cache_key
-    from authentik.core.models import Application
+def post_save_application(sender: type[Model], instance, **_):
+    """Clear user's application cache when an application or provider is changed"""
+    from authentik.core.api.applications import USER_APP_CACHE
+    from authentik.core.models import Application, Provider
 
-    if sender != Application:
-        return
-    if not created:  # pragma: no cover
+    if sender != Application and not isinstance(instance, Provider):
         return
     # Also delete user application cache
-    keys = cache.keys(user_app_cache_key("*"))
-    cache.delete_many(keys)
+    USER_APP_CACHE.clear()
+
+
+@receiver(post_save)
+# pylint: disable=unused-argument
+def post_save_property_mapping(sender: type[Model], instance, **_):
+    """Clear compiled expressions when a property mapping is updated"""
+    from authentik.core.models import PropertyMapping
+    from authentik.lib.expression.evaluator import EXPRESSION_CACHE
+
+    if not isinstance(instance, PropertyMapping):
+        return
+    EXPRESSION_CACHE.clear()
 
 
 @receiver(user_logged_in)
@@ -80,3 +91,26 @@ def authenticated_session_delete(sender: type[Model], instance: "AuthenticatedSe
 
     cache_key = f"{KEY_PREFIX}{instance.session_key}"
     cache.delete(cache_key)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+# pylint: disable=unused-argument
+def ip_override_invalidate(
+    sender: type[Model],
+    instance: Union["Token", "User"],
+    update_fields: Optional[frozenset[str]] = None,
+    **_,
+):
+    """Invalidate cached IP override checks of a user's tokens when the user
+    or any of their tokens are changed, other than by logging in"""
+    from authentik.core.models import Token, User
+
+    if update_fields and update_fields <= {"last_login"}:
+        return
+    if sender == User:
+        ip_override_cache(instance.pk).clear()
+    if sender == Token:
+        # Also remove checks from before the token existed
+        cache.delete(ip_override_cache_key(instance.key))
+        ip_override_cache(instance.user_id).clear()
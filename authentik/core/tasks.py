@@ -1,7 +1,11 @@
 """authentik core tasks"""
+from typing import Any, Iterator
+
 from django.contrib.sessions.backends.cache import KEY_PREFIX
 from django.core.cache import cache
+from django.db.models import Model, QuerySet
 from django.utils.timezone import now
+from django_redis import get_redis_connection
 from structlog.stdlib import get_logger
 
 from authentik.core.models import AuthenticatedSession, ExpiringModel
@@ -14,6 +18,54 @@ from authentik.events.monitored_tasks import (
 from authentik.root.celery import CELERY_APP
 
 LOGGER = get_logger()
+# Amount of objects loaded and expired per query
+EXPIRY_CHUNK_SIZE = 1000
+
+
+def chunks(queryset: QuerySet, *fields: str) -> Iterator[list[tuple[Any, ...]]]:
+    """Iterate over the primary keys and `fields` of `queryset` in chunks ordered by primary key.
+    Objects may be deleted or changed between chunks."""
+    queryset = queryset.order_by("pk")
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        chunk = list(page.values_list("pk", *fields)[:EXPIRY_CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1][0]
+
+
+def expire_model(cls: type[ExpiringModel]) -> int:
+    """Expire all expired objects of `cls`, returns the amount of expired objects. Objects are
+    deleted in bulk, unless `cls` customises how it's expired or deleted."""
+    objects = cls.objects.all().exclude(expiring=False).exclude(expiring=True, expires__gt=now())
+    bulk = cls.expire_action is ExpiringModel.expire_action and cls.delete is Model.delete
+    amount = 0
+    for chunk in chunks(objects):
+        pks = [row[0] for row in chunk]
+        if bulk:
+            cls.objects.filter(pk__in=pks).delete()
+        else:
+            for obj in cls.objects.filter(pk__in=pks):
+                obj.expire_action()
+        amount += len(pks)
+    return amount
+
+
+def expire_sessions() -> int:
+    """Delete all AuthenticatedSessions whose django session doesn't exist anymore,
+    returns the amount of deleted sessions"""
+    redis = get_redis_connection()
+    amount = 0
+    for chunk in chunks(AuthenticatedSession.objects.all(), "session_key"):
+        pipeline = redis.pipeline(transaction=False)
+        for _, session_key in chunk:
+            pipeline.exists(cache.make_key(f"{KEY_PREFIX}{session_key}"))
+        expired = [pk for (pk, _), exists in zip(chunk, pipeline.execute()) if not exists]
+        AuthenticatedSession.objects.filter(pk__in=expired).delete()
+        amount += len(expired)
+    return amount
 
 
 @CELERY_APP.task(bind=True, base=MonitoredTask)
@@ -23,22 +75,12 @@ def clean_expired_models(self: MonitoredTask):
     messages = []
     for cls in ExpiringModel.__subclasses__():
         cls: ExpiringModel
-        objects = (
-            cls.objects.all().exclude(expiring=False).exclude(expiring=True, expires__gt=now())
-        )
-        for obj in objects:
-            obj.expire_action()
-        amount = objects.count()
+        amount = expire_model(cls)
         LOGGER.debug("Expired models", model=cls, amount=amount)
         messages.append(f"Expired {amount} {cls._meta.verbose_name_plural}")
+        self.set_progress(TaskResult(TaskResultStatus.UNKNOWN, messages))
     # Special case
-    amount = 0
-    for session in AuthenticatedSession.objects.all():
-        cache_key = f"{KEY_PREFIX}{session.session_key}"
-        value = cache.get(cache_key)
-        if not value:
-            session.delete()
-            amount += 1
+    amount = expire_sessions()
     LOGGER.debug("Expired sessions", model=AuthenticatedSession, amount=amount)
     messages.append(f"Expired {amount} {AuthenticatedSession._meta.verbose_name_plural}")
     self.set_status(TaskResult(TaskResultStatus.SUCCESSFUL, messages))
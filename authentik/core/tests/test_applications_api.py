@@ -1,11 +1,15 @@
 """Test Applications API"""
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APITestCase
 
-from authentik.core.models import Application
-from authentik.core.tests.utils import create_test_admin_user
+from authentik.core.api.applications import user_app_cache_key
+from authentik.core.models import Application, Group
+from authentik.core.tests.utils import create_test_admin_user, create_test_flow
+from authentik.lib.generators import generate_id
 from authentik.policies.dummy.models import DummyPolicy
 from authentik.policies.models import PolicyBinding
+from authentik.providers.oauth2.models import OAuth2Provider
 
 
 class TestApplicationsAPI(APITestCase):
@@ -17,9 +21,10 @@ class TestApplicationsAPI(APITestCase):
             name="allowed", slug="allowed", meta_launch_url="https://goauthentik.io/%(username)s"
         )
         self.denied = Application.objects.create(name="denied", slug="denied")
+        self.policy = DummyPolicy.objects.create(name="deny", result=False, wait_min=1, wait_max=2)
         PolicyBinding.objects.create(
             target=self.denied,
-            policy=DummyPolicy.objects.create(name="deny", result=False, wait_min=1, wait_max=2),
+            policy=self.policy,
             order=0,
         )
 
@@ -77,6 +82,48 @@ class TestApplicationsAPI(APITestCase):
             },
         )
 
+    def test_list_cache(self):
+        """Test cached application list being invalidated by its dependencies"""
+        group = Group.objects.create(name=generate_id())
+        other_user = create_test_admin_user()
+        self.client.force_login(self.user)
+        key = user_app_cache_key(self.user.pk)
+        self.client.get(reverse("authentik_api:application-list"))
+        self.assertEqual(cache.get(key), [self.allowed])
+        # Unrelated changes keep the list
+        DummyPolicy.objects.create(name=generate_id(), result=True)
+        group.users.add(other_user)
+        self.assertEqual(cache.get(key), [self.allowed])
+        # Changes to the user's groups or a policy the list depends on don't
+        group.users.add(self.user)
+        self.assertIsNone(cache.get(key))
+        self.client.get(reverse("authentik_api:application-list"))
+        self.assertEqual(cache.get(key), [self.allowed])
+        self.policy.result = True
+        self.policy.save()
+        self.assertIsNone(cache.get(key))
+        response = self.client.get(reverse("authentik_api:application-list"))
+        self.assertEqual(response.json()["pagination"]["count"], 2)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_list_cache_provider(self):
+        """Test cached application list being invalidated by provider changes"""
+        provider = OAuth2Provider.objects.create(
+            name=generate_id(),
+            authorization_flow=create_test_flow(),
+        )
+        self.allowed.provider = provider
+        self.allowed.save()
+        self.client.force_login(self.user)
+        key = user_app_cache_key(self.user.pk)
+        self.client.get(reverse("authentik_api:application-list"))
+        self.assertIsNotNone(cache.get(key))
+        # Deleting the provider only nulls the application's foreign key with an update
+        provider.delete()
+        self.assertIsNone(cache.get(key))
+        response = self.client.get(reverse("authentik_api:application-list"))
+        self.assertIsNone(response.json()["results"][0]["provider"])
+
     def test_list_superuser_full_list(self):
         """Test list operation with superuser_full_list"""
         self.client.force_login(self.user)
@@ -0,0 +1,59 @@
+"""Test core tasks"""
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.sessions.backends.cache import KEY_PREFIX
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils.timezone import now
+
+from authentik.core.models import AuthenticatedSession, Token, TokenIntents
+from authentik.core.tasks import clean_expired_models
+from authentik.core.tests.utils import create_test_admin_user
+from authentik.events.monitored_tasks import TaskInfo, TaskResultStatus
+from authentik.lib.generators import generate_id
+
+
+class TestTasks(TestCase):
+    """Test core tasks"""
+
+    def setUp(self) -> None:
+        self.user = create_test_admin_user()
+
+    def test_clean_expired_models(self):
+        """Test expired objects and sessions being removed in chunks"""
+        expired = now() - timedelta(hours=1)
+        tokens = [
+            Token.objects.create(
+                identifier=generate_id(),
+                expires=expired,
+                user=self.user,
+                intent=TokenIntents.INTENT_RECOVERY,
+            )
+            for _ in range(3)
+        ]
+        api_token = Token.objects.create(
+            identifier=generate_id(),
+            expires=expired,
+            user=self.user,
+            intent=TokenIntents.INTENT_API,
+        )
+        sessions = [
+            AuthenticatedSession.objects.create(user=self.user, session_key=generate_id(32))
+            for _ in range(3)
+        ]
+        cache.set(f"{KEY_PREFIX}{sessions[1].session_key}", {"foo": "bar"})
+        with patch("authentik.core.tasks.EXPIRY_CHUNK_SIZE", 2):
+            clean_expired_models.delay().get()
+        self.assertFalse(Token.objects.filter(pk__in=[token.pk for token in tokens]).exists())
+        # API tokens are rotated instead of being deleted
+        api_token.refresh_from_db()
+        self.assertGreater(api_token.expires, now())
+        self.assertEqual(
+            list(AuthenticatedSession.objects.filter(user=self.user)),
+            [sessions[1]],
+        )
+        info = TaskInfo.by_name("clean_expired_models")
+        self.assertEqual(info.result.status, TaskResultStatus.SUCCESSFUL)
+        self.assertIn("Expired 4 Tokens", info.result.messages)
+        self.assertIn("Expired 2 Authenticated Sessions", info.result.messages)
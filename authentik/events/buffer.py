@@ -0,0 +1,65 @@
+"""Buffered event writer"""
+from pickle import dumps, loads  # nosec
+
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from structlog.stdlib import get_logger
+
+from authentik.events.models import Event
+from authentik.lib.config import CONFIG
+
+LOGGER = get_logger()
+CACHE_KEY_EVENT_BUFFER = "authentik_events_buffer"
+CACHE_KEY_EVENT_BUFFER_FLUSH = "authentik_events_buffer_flush"
+
+
+class EventBuffer:
+    """Collect events in a Redis list instead of saving them in the request path. Buffered
+    events are written in batches by `event_buffer_flush`, which is triggered once `size`
+    events are buffered and periodically."""
+
+    enabled: bool
+    size: int
+
+    def __init__(self, enabled: bool, size: int):
+        self.enabled = enabled
+        self.size = size
+
+    def add(self, event: Event):
+        """Buffer `event`, or save it directly if the buffer can't be reached"""
+        try:
+            redis = get_redis_connection()
+            length = redis.rpush(CACHE_KEY_EVENT_BUFFER, dumps(event))
+            if length >= self.size and redis.set(CACHE_KEY_EVENT_BUFFER_FLUSH, 1, nx=True, ex=60):
+                from authentik.events.tasks import event_buffer_flush
+
+                event_buffer_flush.delay()
+        except RedisError as exc:
+            LOGGER.warning("Failed to buffer event", exc=exc)
+            event.save()
+
+    def pop(self) -> list[Event]:
+        """Remove and return up to `size` buffered events"""
+        redis = get_redis_connection()
+        pipeline = redis.pipeline()
+        pipeline.lrange(CACHE_KEY_EVENT_BUFFER, 0, self.size - 1)
+        pipeline.ltrim(CACHE_KEY_EVENT_BUFFER, self.size, -1)
+        values, _ = pipeline.execute()
+        return [loads(value) for value in values]  # nosec
+
+    def requeue(self, events: list[Event]):
+        """Put `events`, which were popped but couldn't be written, back at the front
+        of the buffer"""
+        get_redis_connection().lpush(
+            CACHE_KEY_EVENT_BUFFER, *[dumps(event) for event in reversed(events)]
+        )
+
+    def release(self):
+        """Allow the next full buffer to trigger a flush"""
+        get_redis_connection().delete(CACHE_KEY_EVENT_BUFFER_FLUSH)
+
+
+EVENT_BUFFER = EventBuffer(
+    CONFIG.y_bool("events.buffer.enabled", False),
+    max(int(CONFIG.y("events.buffer.size", 100)), 1),
+)
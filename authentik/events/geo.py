@@ -2,6 +2,7 @@
 from os import stat
 from typing import Optional, TypedDict
 
+from django.http import HttpRequest
 from geoip2.database import Reader
 from geoip2.errors import GeoIP2Error
 from geoip2.models import City
@@ -9,8 +10,11 @@ from sentry_sdk.hub import Hub
 from structlog.stdlib import get_logger
 
 from authentik.lib.config import CONFIG
+from authentik.lib.utils.http import get_client_ip
 
 LOGGER = get_logger()
+# Attribute of requests the GeoIP data of the client is stored in
+GEOIP_ATTRIBUTE = "_authentik_geoip"
 
 
 class GeoIPDict(TypedDict):
@@ -76,9 +80,24 @@ class GeoIPReader:
             except (GeoIP2Error, ValueError):
                 return None
 
+    def city_for_request(self, request: HttpRequest) -> Optional[City]:
+        """Wrapper for self.city with the client IP of `request`, which is only looked up
+        once per request"""
+        if not hasattr(request, GEOIP_ATTRIBUTE):
+            setattr(request, GEOIP_ATTRIBUTE, self.city(get_client_ip(request)))
+        return getattr(request, GEOIP_ATTRIBUTE)
+
     def city_dict(self, ip_address: str) -> Optional[GeoIPDict]:
         """Wrapper for self.city that returns a dict"""
-        city = self.city(ip_address)
+        return self.to_dict(self.city(ip_address))
+
+    def city_dict_for_request(self, request: HttpRequest) -> Optional[GeoIPDict]:
+        """Wrapper for self.city_for_request that returns a dict"""
+        return self.to_dict(self.city_for_request(request))
+
+    @staticmethod
+    def to_dict(city: Optional[City]) -> Optional[GeoIPDict]:
+        """Convert GeoIP data to a dict"""
         if not city:
             return None
         city_dict: GeoIPDict = {
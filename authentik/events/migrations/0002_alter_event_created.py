@@ -0,0 +1,19 @@
+# Generated by Django 4.0.3 on 2026-10-18 18:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentik_events", "0001_squashed_0019_alter_notificationtransport_webhook_url"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="event",
+            name="created",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -19,7 +19,7 @@ from django.http import HttpRequest
 from django.http.request import QueryDict
 from django.utils.timezone import now
 from django.utils.translation import gettext as _
-from requests import RequestException
+from requests import RequestException, Session
 from structlog.stdlib import get_logger
 
 from authentik import __version__
@@ -174,7 +174,8 @@ class Event(ExpiringModel):
     app = models.TextField()
     context = models.JSONField(default=dict, blank=True)
     client_ip = models.GenericIPAddressField(null=True)
-    created = models.DateTimeField(auto_now_add=True)
+    # Set when the event is created instead of when it's saved, as events may be buffered
+    created = models.DateTimeField(default=now, editable=False)
     tenant = models.JSONField(default=default_tenant, blank=True)
 
     # Shadow the expires attribute from ExpiringModel to override the default duration
@@ -245,16 +246,24 @@ class Event(ExpiringModel):
         # User 255.255.255.255 as fallback if IP cannot be determined
         self.client_ip = get_client_ip(request)
         # Apply GeoIP Data, when enabled
-        self.with_geoip()
+        self.with_geoip(request)
         # If there's no app set, we get it from the requests too
         if not self.app:
             self.app = Event._get_app_from_request(request)
-        self.save()
+        from authentik.events.buffer import EVENT_BUFFER
+
+        if EVENT_BUFFER.enabled:
+            EVENT_BUFFER.add(self)
+        else:
+            self.save()
         return self
 
-    def with_geoip(self):  # pragma: no cover
-        """Apply GeoIP Data, when enabled"""
-        city = GEOIP_READER.city_dict(self.client_ip)
+    def with_geoip(self, request: Optional[HttpRequest] = None):  # pragma: no cover
+        """Apply GeoIP Data, when enabled. The lookup is shared with other users of `request`"""
+        if request:
+            city = GEOIP_READER.city_dict_for_request(request)
+        else:
+            city = GEOIP_READER.city_dict(self.client_ip)
         if not city:
             return
         self.context["geo"] = city
@@ -313,17 +322,40 @@ class NotificationTransport(models.Model):
         ),
     )
 
-    def send(self, notification: "Notification") -> list[str]:
+    def send(self, notification: "Notification", session: Optional[Session] = None) -> list[str]:
         """Send notification to user, called from async task"""
         if self.mode == TransportMode.WEBHOOK:
-            return self.send_webhook(notification)
+            return self.send_webhook(notification, session)
         if self.mode == TransportMode.WEBHOOK_SLACK:
-            return self.send_webhook_slack(notification)
+            return self.send_webhook_slack(notification, session)
         if self.mode == TransportMode.EMAIL:
             return self.send_email(notification)
         raise ValueError(f"Invalid mode {self.mode} set")
 
-    def send_webhook(self, notification: "Notification") -> list[str]:
+    def send_batch(self, notifications: list["Notification"]) -> list["Notification"]:
+        """Send multiple notifications, reusing a single SMTP connection or HTTP session.
+        Returns the notifications which couldn't be sent."""
+        if self.mode == TransportMode.EMAIL:
+            from authentik.stages.email.tasks import send_mails_connection
+
+            messages = {
+                notification: self.email_message(notification) for notification in notifications
+            }
+            unsent = send_mails_connection(list(messages.values()))
+            return [notification for notification, mail in messages.items() if mail in unsent]
+        failed = []
+        with get_http_session() as session:
+            for notification in notifications:
+                try:
+                    self.send(notification, session)
+                except NotificationTransportError as exc:
+                    LOGGER.warning("Failed to send notification", exc=exc, transport=self)
+                    failed.append(notification)
+        return failed
+
+    def send_webhook(
+        self, notification: "Notification", session: Optional[Session] = None
+    ) -> list[str]:
         """Send notification to generic webhook"""
         default_body = {
             "body": notification.body,
@@ -338,19 +370,22 @@ class NotificationTransport(models.Model):
                 notification=notification,
             )
         try:
-            response = get_http_session().post(
+            response = (session or get_http_session()).post(
                 self.webhook_url,
                 json=default_body,
             )
             response.raise_for_status()
         except RequestException as exc:
-            raise NotificationTransportError(exc.response.text) from exc
+            text = exc.response.text if exc.response is not None else str(exc)
+            raise NotificationTransportError(text) from exc
         return [
             response.status_code,
             response.text,
         ]
 
-    def send_webhook_slack(self, notification: "Notification") -> list[str]:
+    def send_webhook_slack(
+        self, notification: "Notification", session: Optional[Session] = None
+    ) -> list[str]:
         """Send notification to slack or slack-compatible endpoints"""
         fields = [
             {
@@ -390,18 +425,18 @@ class NotificationTransport(models.Model):
         if notification.event:
             body["attachments"][0]["title"] = notification.event.action
         try:
-            response = get_http_session().post(self.webhook_url, json=body)
+            response = (session or get_http_session()).post(self.webhook_url, json=body)
             response.raise_for_status()
         except RequestException as exc:
-            text = exc.response.text if exc.response else str(exc)
+            text = exc.response.text if exc.response is not None else str(exc)
             raise NotificationTransportError(text) from exc
         return [
             response.status_code,
             response.text,
         ]
 
-    def send_email(self, notification: "Notification") -> list[str]:
-        """Send notification via global email configuration"""
+    def email_message(self, notification: "Notification") -> TemplateEmailMessage:
+        """Build the email for a notification"""
         subject = "authentik Notification: "
         key_value = {}
         if notification.event:
@@ -412,7 +447,7 @@ class NotificationTransport(models.Model):
                 key_value[key] = value
         else:
             subject += notification.body[:75]
-        mail = TemplateEmailMessage(
+        return TemplateEmailMessage(
             subject=subject,
             template_name="email/generic.html",
             to=[notification.user.email],
@@ -422,6 +457,10 @@ class NotificationTransport(models.Model):
                 "key_value": key_value,
             },
         )
+
+    def send_email(self, notification: "Notification") -> list[str]:
+        """Send notification via global email configuration"""
+        mail = self.email_message(notification)
         # Email is sent directly here, as the call to send() should have been from a task.
         try:
             from authentik.stages.email.tasks import send_mail
@@ -12,6 +12,7 @@ from prometheus_client import Gauge
 from structlog.stdlib import get_logger
 
 from authentik.events.models import Event, EventAction
+from authentik.lib.utils.cache import CacheNamespace
 from authentik.lib.utils.errors import exception_to_string
 
 GAUGE_TASKS = Gauge(
@@ -21,6 +22,7 @@ GAUGE_TASKS = Gauge(
 )
 
 LOGGER = get_logger()
+TASK_CACHE = CacheNamespace("task")
 
 
 class TaskResultStatus(Enum):
@@ -76,7 +78,7 @@ class TaskInfo:
     @staticmethod
     def all() -> dict[str, "TaskInfo"]:
         """Get all TaskInfo objects"""
-        return cache.get_many(cache.keys("task_*"))
+        return TASK_CACHE.get_many()
 
     @staticmethod
     def by_name(name: str) -> Optional["TaskInfo"]:
@@ -85,7 +87,7 @@ class TaskInfo:
 
     def delete(self):
         """Delete task info from cache"""
-        return cache.delete(f"task_{self.task_name}")
+        return TASK_CACHE.delete(f"task_{self.task_name}")
 
     def set_prom_metrics(self):
         """Update prometheus metrics"""
@@ -109,7 +111,7 @@ class TaskInfo:
             key += f"_{self.result.uid}"
             self.task_name += f"_{self.result.uid}"
         self.set_prom_metrics()
-        cache.set(key, self, timeout=timeout_hours * 60 * 60)
+        TASK_CACHE.set(key, self, timeout=timeout_hours * 60 * 60)
 
 
 class MonitoredTask(Task):
@@ -138,30 +140,14 @@ class MonitoredTask(Task):
         """Set result for current run, will overwrite previous result."""
         self._result = result
 
-    # pylint: disable=too-many-arguments
-    def after_return(self, status, retval, task_id, args: list[Any], kwargs: dict[str, Any], einfo):
-        if self._result:
-            if not self._result.uid:
-                self._result.uid = self._uid
-            if self.save_on_success:
-                TaskInfo(
-                    task_name=self.__name__,
-                    task_description=self.__doc__,
-                    start_timestamp=self.start,
-                    finish_timestamp=default_timer(),
-                    finish_time=datetime.now(),
-                    result=self._result,
-                    task_call_module=self.__module__,
-                    task_call_func=self.__name__,
-                    task_call_args=args,
-                    task_call_kwargs=kwargs,
-                ).save(self.result_timeout_hours)
-        return super().after_return(status, retval, task_id, args, kwargs, einfo=einfo)
+    def set_progress(self, result: TaskResult):
+        """Set and save the result for the current run while it's still running,
+        so the progress of long-running tasks can be followed."""
+        self.set_status(result)
+        self._save_info(self.request.args or [], self.request.kwargs or {})
 
-    # pylint: disable=too-many-arguments
-    def on_failure(self, exc, task_id, args, kwargs, einfo):
-        if not self._result:
-            self._result = TaskResult(status=TaskResultStatus.ERROR, messages=[str(exc)])
+    def _save_info(self, args: list[Any], kwargs: dict[str, Any]):
+        """Save the current result to the cache"""
         if not self._result.uid:
             self._result.uid = self._uid
         TaskInfo(
@@ -176,6 +162,18 @@ class MonitoredTask(Task):
             task_call_args=args,
             task_call_kwargs=kwargs,
         ).save(self.result_timeout_hours)
+
+    # pylint: disable=too-many-arguments
+    def after_return(self, status, retval, task_id, args: list[Any], kwargs: dict[str, Any], einfo):
+        if self._result and self.save_on_success:
+            self._save_info(args, kwargs)
+        return super().after_return(status, retval, task_id, args, kwargs, einfo=einfo)
+
+    # pylint: disable=too-many-arguments
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        if not self._result:
+            self._result = TaskResult(status=TaskResultStatus.ERROR, messages=[str(exc)])
+        self._save_info(args, kwargs)
         Event.new(
             EventAction.SYSTEM_TASK_EXCEPTION,
             message=(f"Task {self.__name__} encountered an error: {exception_to_string(exc)}"),
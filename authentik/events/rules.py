@@ -0,0 +1,101 @@
+"""Notification rule index"""
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Optional
+from uuid import UUID, uuid4
+
+from django.core.cache import cache
+from django.db import connection
+
+from authentik.events.models import Event, NotificationRule
+from authentik.policies.event_matcher.models import EventMatcherPolicy
+from authentik.policies.models import PolicyBinding
+
+CACHE_KEY_NOTIFICATION_RULES_VERSION = "authentik_events_notification_rules_version"
+# Event fields compared by EventMatcherPolicy
+MATCHER_FIELDS = ["action", "app", "client_ip"]
+
+
+@dataclass
+class NotificationRuleSet:
+    """Snapshot of all notification rules, indexed by the event values they can match"""
+
+    # Rules which can match any event, as they have bindings which aren't an EventMatcherPolicy
+    wildcard: set[UUID] = field(default_factory=set)
+    # Rules which can only match events with the given (field, value)
+    keyed: dict[tuple[str, Any], set[UUID]] = field(default_factory=dict)
+    # Policies bound to any notification rule
+    policies: set[UUID] = field(default_factory=set)
+
+    def candidates(self, event: Event) -> set[UUID]:
+        """Get the primary keys of all rules which can match `event`"""
+        rules = set(self.wildcard)
+        for name in MATCHER_FIELDS:
+            rules.update(self.keyed.get((name, getattr(event, name)), set()))
+        return rules
+
+    def is_loop(self, event: Event) -> bool:
+        """Check if `event` was created by a policy bound to a notification rule. Notifications
+        are never created for these events, as that could cause an infinite loop."""
+        if "policy_uuid" not in event.context:
+            return False
+        try:
+            return UUID(str(event.context["policy_uuid"])) in self.policies
+        except ValueError:
+            return False
+
+
+class NotificationRuleIndex:
+    """Per-process index of notification rules, so events are only checked against rules
+    which can match them. The index is rebuilt when the version stored in the cache changes,
+    which happens whenever a rule, a binding or an event matcher policy is saved or deleted."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version: Optional[str] = None
+        self._rules = NotificationRuleSet()
+
+    def _build(self) -> NotificationRuleSet:
+        """Load all rules and their bindings. Rules without a group never create notifications,
+        and rules without enabled bindings never match, so neither are candidates."""
+        rules = NotificationRuleSet()
+        groups = dict(NotificationRule.objects.values_list("pk", "group_id"))
+        bindings = list(
+            PolicyBinding.objects.filter(target__in=groups.keys()).values_list(
+                "target_id", "policy_id", "enabled", "negate"
+            )
+        )
+        rules.policies = {policy for _, policy, _, _ in bindings if policy}
+        matchers = {
+            values[0]: values[1:]
+            for values in EventMatcherPolicy.objects.filter(pk__in=rules.policies).values_list(
+                "pk", *MATCHER_FIELDS
+            )
+        }
+        for target, policy, enabled, negate in bindings:
+            if not enabled or not groups[target]:
+                continue
+            # A negated matcher, a group or user binding or any other policy can match any event
+            if negate or policy not in matchers:
+                rules.wildcard.add(target)
+                continue
+            for name, value in zip(MATCHER_FIELDS, matchers[policy]):
+                rules.keyed.setdefault((name, value), set()).add(target)
+        return rules
+
+    def get(self) -> NotificationRuleSet:
+        """Get the current set of notification rules"""
+        rules = self._rules
+        version = cache.get_or_set(
+            CACHE_KEY_NOTIFICATION_RULES_VERSION, lambda: uuid4().hex, timeout=None
+        )
+        if version != self._version or connection.in_atomic_block:
+            rules = self._build()
+            # An index built from uncommitted data isn't kept, as it might be rolled back
+            if not connection.in_atomic_block:
+                with self._lock:
+                    self._rules, self._version = rules, version
+        return rules
+
+
+NOTIFICATION_RULE_INDEX = NotificationRuleIndex()
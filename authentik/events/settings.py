@@ -0,0 +1,13 @@
+"""Event Settings"""
+from datetime import timedelta
+
+from authentik.lib.config import CONFIG
+
+CELERY_BEAT_SCHEDULE = {}
+
+if CONFIG.y_bool("events.buffer.enabled", False):
+    CELERY_BEAT_SCHEDULE["events_buffer_flush"] = {
+        "task": "authentik.events.tasks.event_buffer_flush",
+        "schedule": timedelta(seconds=int(CONFIG.y("events.buffer.interval", 5))),
+        "options": {"queue": "authentik_events"},
+    }
@@ -1,18 +1,24 @@
 """authentik events signal listener"""
 from threading import Thread
 from typing import Any, Optional
+from uuid import uuid4
 
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
-from django.db.models.signals import post_save, pre_delete
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.http import HttpRequest
 
 from authentik.core.models import User
 from authentik.core.signals import password_changed
-from authentik.events.models import Event, EventAction
+from authentik.events.models import Event, EventAction, NotificationRule
+from authentik.events.rules import CACHE_KEY_NOTIFICATION_RULES_VERSION
 from authentik.events.tasks import event_notification_handler, gdpr_cleanup
 from authentik.flows.planner import PLAN_CONTEXT_SOURCE, FlowPlan
 from authentik.flows.views.executor import SESSION_KEY_PLAN
+from authentik.policies.event_matcher.models import EventMatcherPolicy
+from authentik.policies.models import PolicyBinding
 from authentik.stages.invitation.models import Invitation
 from authentik.stages.invitation.signals import invitation_used
 from authentik.stages.password.stage import PLAN_CONTEXT_METHOD, PLAN_CONTEXT_METHOD_ARGS
@@ -110,6 +116,20 @@ def event_post_save_notification(sender, instance: Event, **_):
     event_notification_handler.delay(instance.event_uuid.hex)
 
 
+@receiver(post_save, sender=NotificationRule)
+@receiver(post_delete, sender=NotificationRule)
+@receiver(post_save, sender=PolicyBinding)
+@receiver(post_delete, sender=PolicyBinding)
+@receiver(post_save, sender=EventMatcherPolicy)
+@receiver(post_delete, sender=EventMatcherPolicy)
+# pylint: disable=unused-argument
+def invalidate_notification_rule_index(sender, instance, **_):
+    """Rebuild the notification rule index of all processes once the change is committed"""
+    transaction.on_commit(
+        lambda: cache.set(CACHE_KEY_NOTIFICATION_RULES_VERSION, uuid4().hex, timeout=None)
+    )
+
+
 @receiver(pre_delete, sender=User)
 # pylint: disable=unused-argument
 def event_user_pre_delete_cleanup(sender, instance: User, **_):
@@ -3,6 +3,7 @@ from guardian.shortcuts import get_anonymous_user
 from structlog.stdlib import get_logger
 
 from authentik.core.models import User
+from authentik.events.buffer import EVENT_BUFFER
 from authentik.events.models import (
     Event,
     Notification,
@@ -11,45 +12,99 @@ from authentik.events.models import (
     NotificationTransportError,
 )
 from authentik.events.monitored_tasks import MonitoredTask, TaskResult, TaskResultStatus
+from authentik.events.rules import NOTIFICATION_RULE_INDEX
 from authentik.policies.engine import PolicyEngine
-from authentik.policies.models import PolicyBinding, PolicyEngineMode
+from authentik.policies.models import PolicyEngineMode
 from authentik.root.celery import CELERY_APP
 
 LOGGER = get_logger()
+# Amount of notifications sent by a single transport task
+NOTIFICATION_BATCH_SIZE = 100
 
 
 @CELERY_APP.task()
-def event_notification_handler(event_uuid: str):
-    """Start task for each trigger definition"""
-    for trigger in NotificationRule.objects.all():
-        event_trigger_handler.apply_async(args=[event_uuid, trigger.name], queue="authentik_events")
+def event_notification_handler(*event_uuids: str):
+    """Check all notification rules which can match the given events"""
+    rule_set = NOTIFICATION_RULE_INDEX.get()
+    events = list(Event.objects.filter(event_uuid__in=event_uuids))
+    if len(events) < len(event_uuids):
+        LOGGER.warning("event doesn't exist yet or anymore", event_uuids=event_uuids)
+    candidates = []
+    for event in events:
+        if rule_set.is_loop(event):
+            # If policy that caused this event to be created is attached
+            # to *any* NotificationRule, we skip the event.
+            # This is the most effective way to prevent infinite loops.
+            LOGGER.debug("e(trigger): attempting to prevent infinite loop", event=event)
+            continue
+        candidates.append((event, rule_set.candidates(event)))
+    rule_pks = set().union(*[pks for _, pks in candidates])
+    if not rule_pks:
+        return
+    rules = {
+        rule.pk: rule
+        for rule in NotificationRule.objects.filter(pk__in=rule_pks).select_related("group")
+    }
+    for event, pks in candidates:
+        for pk in pks:
+            if pk not in rules:
+                continue
+            # Errors of a single rule don't stop the remaining rules and events
+            try:
+                event_trigger_process(event, rules[pk])
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.warning(
+                    "e(trigger): failed to process rule",
+                    rule=rules[pk],
+                    event_uuid=event.event_uuid.hex,
+                    exc=exc,
+                )
+
+
+@CELERY_APP.task()
+def event_buffer_flush():
+    """Write buffered events in batches, notification rules are checked once per batch.
+    Batches which fail to be written are put back into the buffer for the next flush."""
+    try:
+        while events := EVENT_BUFFER.pop():
+            for event in events:
+                LOGGER.debug(
+                    "Created Event",
+                    action=event.action,
+                    context=event.context,
+                    client_ip=event.client_ip,
+                    user=event.user,
+                )
+            try:
+                Event.objects.bulk_create(events, ignore_conflicts=True)
+            except Exception:
+                EVENT_BUFFER.requeue(events)
+                raise
+            event_notification_handler.delay(*[event.event_uuid.hex for event in events])
+    finally:
+        EVENT_BUFFER.release()
 
 
 @CELERY_APP.task()
 def event_trigger_handler(event_uuid: str, trigger_name: str):
     """Check if policies attached to NotificationRule match event"""
-    events = Event.objects.filter(event_uuid=event_uuid)
-    if not events.exists():
+    event: Event = Event.objects.filter(event_uuid=event_uuid).first()
+    if not event:
         LOGGER.warning("event doesn't exist yet or anymore", event_uuid=event_uuid)
         return
-    event: Event = events.first()
-    triggers: NotificationRule = NotificationRule.objects.filter(name=trigger_name)
-    if not triggers.exists():
+    trigger: NotificationRule = (
+        NotificationRule.objects.filter(name=trigger_name).select_related("group").first()
+    )
+    if not trigger:
         return
-    trigger = triggers.first()
-
-    if "policy_uuid" in event.context:
-        policy_uuid = event.context["policy_uuid"]
-        if PolicyBinding.objects.filter(
-            target__in=NotificationRule.objects.all().values_list("pbm_uuid", flat=True),
-            policy=policy_uuid,
-        ).exists():
-            # If policy that caused this event to be created is attached
-            # to *any* NotificationRule, we return early.
-            # This is the most effective way to prevent infinite loops.
-            LOGGER.debug("e(trigger): attempting to prevent infinite loop", trigger=trigger)
-            return
+    if NOTIFICATION_RULE_INDEX.get().is_loop(event):
+        LOGGER.debug("e(trigger): attempting to prevent infinite loop", trigger=trigger)
+        return
+    event_trigger_process(event, trigger)
 
+
+def event_trigger_process(event: Event, trigger: NotificationRule):
+    """Check if policies attached to `trigger` match `event`, and create notifications if so"""
     if not trigger.group:
         LOGGER.debug("e(trigger): trigger has no group", trigger=trigger)
         return
@@ -64,6 +119,7 @@ def event_trigger_handler(event_uuid: str, trigger_name: str):
     policy_engine.mode = PolicyEngineMode.MODE_ANY
     policy_engine.empty_result = False
     policy_engine.use_cache = False
+    policy_engine.short_circuit = True
     policy_engine.request.context["event"] = event
     policy_engine.build()
     result = policy_engine.result
@@ -72,17 +128,37 @@ def event_trigger_handler(event_uuid: str, trigger_name: str):
 
     LOGGER.debug("e(trigger): event trigger matched", trigger=trigger)
     # Create the notification objects
+    users = list(trigger.group.users.all())
     for transport in trigger.transports.all():
-        for user in trigger.group.users.all():
-            LOGGER.debug("created notification")
-            notification = Notification.objects.create(
-                severity=trigger.severity, body=event.summary, event=event, user=user
-            )
-            notification_transport.apply_async(
-                args=[notification.pk, transport.pk], queue="authentik_events"
+        notifications = Notification.objects.bulk_create(
+            [
+                Notification(severity=trigger.severity, body=event.summary, event=event, user=user)
+                for user in (users[:1] if transport.send_once else users)
+            ]
+        )
+        LOGGER.debug("created notifications", count=len(notifications), transport=transport)
+        for idx in range(0, len(notifications), NOTIFICATION_BATCH_SIZE):
+            batch = notifications[idx : idx + NOTIFICATION_BATCH_SIZE]
+            notification_transport_batch.apply_async(
+                args=[[notification.pk for notification in batch], transport.pk],
+                queue="authentik_events",
             )
-            if transport.send_once:
-                break
+
+
+@CELERY_APP.task()
+def notification_transport_batch(notification_pks: list[str], transport_pk: str):
+    """Send multiple notifications over specified transport, notifications which
+    couldn't be sent are retried individually"""
+    transport = NotificationTransport.objects.filter(pk=transport_pk).first()
+    if not transport:
+        return
+    notifications = list(
+        Notification.objects.filter(pk__in=notification_pks).select_related("event", "user")
+    )
+    for notification in transport.send_batch(notifications):
+        notification_transport.apply_async(
+            args=[notification.pk, transport.pk], queue="authentik_events"
+        )
 
 
 @CELERY_APP.task(
@@ -1,11 +1,20 @@
 """event tests"""
+from unittest.mock import patch
 
 from django.contrib.contenttypes.models import ContentType
-from django.test import TestCase
+from django.db import DatabaseError
+from django.test import RequestFactory, TestCase
+from django_redis import get_redis_connection
 from guardian.shortcuts import get_anonymous_user
 
 from authentik.core.models import Group
+from authentik.events.buffer import (
+    CACHE_KEY_EVENT_BUFFER,
+    CACHE_KEY_EVENT_BUFFER_FLUSH,
+    EVENT_BUFFER,
+)
 from authentik.events.models import Event
+from authentik.events.tasks import event_buffer_flush
 from authentik.policies.dummy.models import DummyPolicy
 
 
@@ -40,3 +49,38 @@ class TestEvents(TestCase):
         model_content_type = ContentType.objects.get_for_model(temp_model)
         self.assertEqual(event.context.get("model").get("app"), model_content_type.app_label)
         self.assertEqual(event.context.get("model").get("pk"), temp_model.pk.hex)
+
+    def test_buffer(self):
+        """Test events being buffered and written in batches"""
+        get_redis_connection().delete(CACHE_KEY_EVENT_BUFFER, CACHE_KEY_EVENT_BUFFER_FLUSH)
+        request = RequestFactory().get("/")
+        with (
+            patch.object(EVENT_BUFFER, "enabled", True),
+            patch.object(EVENT_BUFFER, "size", 2),
+            patch("authentik.events.tasks.event_notification_handler.delay") as notify,
+        ):
+            first = Event.new("unittest", app="authentik.events").from_http(request)
+            self.assertFalse(Event.objects.filter(pk=first.pk).exists())
+            second = Event.new("unittest", app="authentik.events").from_http(request)
+        self.assertEqual(Event.objects.filter(pk__in=[first.pk, second.pk]).count(), 2)
+        self.assertEqual(Event.objects.get(pk=first.pk).created, first.created)
+        notify.assert_called_once_with(first.event_uuid.hex, second.event_uuid.hex)
+
+    def test_buffer_error(self):
+        """Test events being kept in the buffer when they can't be written"""
+        get_redis_connection().delete(CACHE_KEY_EVENT_BUFFER, CACHE_KEY_EVENT_BUFFER_FLUSH)
+        request = RequestFactory().get("/")
+        with (
+            patch.object(EVENT_BUFFER, "enabled", True),
+            patch.object(EVENT_BUFFER, "size", 3),
+        ):
+            first = Event.new("unittest", app="authentik.events").from_http(request)
+            second = Event.new("unittest", app="authentik.events").from_http(request)
+            with patch(
+                "authentik.events.models.Event.objects.bulk_create", side_effect=DatabaseError
+            ):
+                with self.assertRaises(DatabaseError):
+                    event_buffer_flush()
+            self.assertEqual(
+                [event.pk for event in EVENT_BUFFER.pop()], [first.pk, second.pk]
+            )
@@ -1,8 +1,11 @@
 """Notification tests"""
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, PropertyMock, patch
 
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
 from django.test import TestCase
+from requests_mock import Mocker
 
 from authentik.core.models import Group, User
 from authentik.events.models import (
@@ -11,7 +14,11 @@ from authentik.events.models import (
     Notification,
     NotificationRule,
     NotificationTransport,
+    NotificationTransportError,
+    TransportMode,
 )
+from authentik.events.rules import NOTIFICATION_RULE_INDEX
+from authentik.events.tasks import notification_transport_batch
 from authentik.policies.event_matcher.models import EventMatcherPolicy
 from authentik.policies.exceptions import PolicyException
 from authentik.policies.models import PolicyBinding
@@ -106,3 +113,91 @@ class TestEventsNotifications(TestCase):
         with patch("authentik.events.models.NotificationTransport.send", execute_mock):
             Event.new(EventAction.CUSTOM_PREFIX).save()
         self.assertEqual(Notification.objects.count(), 1)
+
+    def test_rule_index(self):
+        """Test rules which can't match an event being skipped"""
+        NotificationRule.objects.filter(name__startswith="default").delete()
+        login = NotificationRule.objects.create(name="login", group=self.group)
+        matcher = EventMatcherPolicy.objects.create(name="matcher", action=EventAction.LOGIN)
+        PolicyBinding.objects.create(target=login, policy=matcher, order=0)
+        group = NotificationRule.objects.create(name="group", group=self.group)
+        PolicyBinding.objects.create(target=group, group=self.group, order=0)
+        negated = NotificationRule.objects.create(name="negated", group=self.group)
+        PolicyBinding.objects.create(target=negated, policy=matcher, negate=True, order=0)
+        no_group = NotificationRule.objects.create(name="no-group")
+        PolicyBinding.objects.create(target=no_group, group=self.group, order=0)
+
+        rule_set = NOTIFICATION_RULE_INDEX.get()
+        self.assertEqual(
+            rule_set.candidates(Event.new(EventAction.LOGIN)), {login.pk, group.pk, negated.pk}
+        )
+        self.assertEqual(
+            rule_set.candidates(Event.new(EventAction.CUSTOM_PREFIX)), {group.pk, negated.pk}
+        )
+        self.assertTrue(rule_set.is_loop(Event.new("foo", policy_uuid=matcher.pk.hex)))
+
+        process = MagicMock()
+        with patch("authentik.events.tasks.event_trigger_process", process):
+            Event.new(EventAction.CUSTOM_PREFIX).save()
+        self.assertEqual(
+            {call.args[1].pk for call in process.call_args_list}, {group.pk, negated.pk}
+        )
+
+    def test_rule_error(self):
+        """Test errors of a rule not preventing other rules from being processed"""
+        NotificationRule.objects.filter(name__startswith="default").delete()
+        for name in ["first", "second"]:
+            rule = NotificationRule.objects.create(name=name, group=self.group)
+            PolicyBinding.objects.create(target=rule, group=self.group, order=0)
+
+        process = MagicMock(side_effect=[ValueError, None])
+        with patch("authentik.events.tasks.event_trigger_process", process):
+            Event.new(EventAction.CUSTOM_PREFIX).save()
+        self.assertEqual(process.call_count, 2)
+
+    def test_transport_batch(self):
+        """Test notifications being created in bulk and sent in batches"""
+        for idx in range(2):
+            self.group.users.add(User.objects.create(username=f"test-batch-{idx}"))
+        NotificationRule.objects.filter(name__startswith="default").delete()
+        webhook = NotificationTransport.objects.create(
+            name="webhook", mode=TransportMode.WEBHOOK, webhook_url="http://localhost"
+        )
+        email = NotificationTransport.objects.create(name="email", mode=TransportMode.EMAIL)
+        trigger = NotificationRule.objects.create(name="trigger", group=self.group)
+        trigger.transports.add(webhook, email)
+        matcher = EventMatcherPolicy.objects.create(
+            name="matcher", action=EventAction.CUSTOM_PREFIX
+        )
+        PolicyBinding.objects.create(target=trigger, policy=matcher, order=0)
+
+        send = MagicMock()
+        batch = MagicMock(wraps=notification_transport_batch.apply_async)
+        with patch(
+            "authentik.stages.email.models.EmailStage.backend_class",
+            PropertyMock(return_value=EmailBackend),
+        ):
+            with patch("authentik.events.models.NotificationTransport.send", send):
+                with patch("authentik.events.tasks.NOTIFICATION_BATCH_SIZE", 2):
+                    with patch(
+                        "authentik.events.tasks.notification_transport_batch.apply_async", batch
+                    ):
+                        Event.new(EventAction.CUSTOM_PREFIX).save()
+        self.assertEqual(Notification.objects.count(), 6)
+        self.assertEqual(batch.call_count, 4)
+        # Webhooks in the same batch share a session
+        sessions = [call.args[1] for call in send.call_args_list]
+        self.assertEqual(len(sessions), 3)
+        self.assertIs(sessions[0], sessions[1])
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_transport_webhook_error(self):
+        """Test error responses of webhooks being reported with their body"""
+        transport = NotificationTransport.objects.create(
+            name="webhook", mode=TransportMode.WEBHOOK, webhook_url="http://localhost"
+        )
+        notification = Notification.objects.create(user=self.user, body="foo")
+        with Mocker() as mocker:
+            mocker.post("http://localhost", status_code=500, text="bar")
+            with self.assertRaisesRegex(NotificationTransportError, "^bar$"):
+                transport.send(notification)
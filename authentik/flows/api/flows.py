@@ -1,7 +1,6 @@
 """Flow API Views"""
 from dataclasses import dataclass
 
-from django.core.cache import cache
 from django.db.models import Model
 from django.http.response import HttpResponseBadRequest, JsonResponse
 from django.urls import reverse
@@ -28,7 +27,7 @@ from authentik.core.api.utils import (
 )
 from authentik.flows.exceptions import FlowNonApplicableException
 from authentik.flows.models import Flow
-from authentik.flows.planner import PLAN_CONTEXT_PENDING_USER, FlowPlanner, cache_key
+from authentik.flows.planner import FLOW_CACHE, PLAN_CONTEXT_PENDING_USER, FlowPlanner, flow_cache
 from authentik.flows.transfer.common import DataclassEncoder
 from authentik.flows.transfer.exporter import FlowExporter
 from authentik.flows.transfer.importer import FlowImporter
@@ -49,7 +48,7 @@ class FlowSerializer(ModelSerializer):
 
     def get_cache_count(self, flow: Flow) -> int:
         """Get count of cached flows"""
-        return len(cache.keys(f"{cache_key(flow)}*"))
+        return flow_cache(flow).count()
 
     def get_export_url(self, flow: Flow) -> str:
         """Get export URL for flow"""
@@ -117,7 +116,7 @@ class FlowViewSet(UsedByMixin, ModelViewSet):
     @action(detail=False, pagination_class=None, filter_backends=[])
     def cache_info(self, request: Request) -> Response:
         """Info about cached flows"""
-        return Response(data={"count": len(cache.keys("flow_*"))})
+        return Response(data={"count": FLOW_CACHE.count()})
 
     @permission_required(None, ["authentik_flows.clear_flow_cache"])
     @extend_schema(
@@ -130,9 +129,8 @@ class FlowViewSet(UsedByMixin, ModelViewSet):
     @action(detail=False, methods=["POST"])
     def cache_clear(self, request: Request) -> Response:
         """Clear flow cache"""
-        keys = cache.keys("flow_*")
-        cache.delete_many(keys)
-        LOGGER.debug("Cleared flow cache", keys=len(keys))
+        keys = FLOW_CACHE.clear()
+        LOGGER.debug("Cleared flow cache", keys=keys)
         return Response(status=204)
 
     @permission_required(
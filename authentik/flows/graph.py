@@ -0,0 +1,117 @@
+"""Flow graphs, in-process cache of the bindings of flows"""
+from collections import defaultdict
+from typing import Optional
+from uuid import UUID, uuid4
+
+from django.core.cache import cache
+from django.db.models import Q
+from structlog.stdlib import get_logger
+
+from authentik.flows.models import Flow, FlowStageBinding, Stage
+from authentik.policies.models import PolicyBinding, PolicyBindingModel
+
+LOGGER = get_logger()
+FLOW_GRAPH_VERSION_KEY = "flow_graph_version"
+
+
+class FlowGraph:
+    """Stage bindings of a single flow with their concrete stages, and the policy bindings
+    of the flow and its stage bindings with their concrete policies. Graphs are loaded
+    with a few queries, independent of the amount of stages."""
+
+    flow_pk: str
+    version: str
+    bindings: list[FlowStageBinding]
+    # Plans depend on the user when any binding has policies which are evaluated during
+    # planning, otherwise a single plan is shared by all users
+    user_dependent: bool
+
+    def __init__(self, flow_pk: str, version: str):
+        self.flow_pk = flow_pk
+        self.version = version
+        self.bindings = list(
+            FlowStageBinding.objects.filter(target__pk=flow_pk)
+            .order_by("order")
+            .select_related("target")
+        )
+        stages = Stage.objects.filter(
+            pk__in=[binding.stage_id for binding in self.bindings]
+        ).select_subclasses()
+        stages = {stage.pk: stage for stage in stages}
+        for binding in self.bindings:
+            binding.stage = stages[binding.stage_id]
+        self._by_pk = {binding.pk.hex: binding for binding in self.bindings}
+        self._policy_bindings: dict[UUID, list[PolicyBinding]] = defaultdict(list)
+        for policy_binding in (
+            PolicyBinding.objects.filter(
+                Q(target__flow__pk=flow_pk) | Q(target__flowstagebinding__target__pk=flow_pk),
+                enabled=True,
+            )
+            .order_by("order")
+            .select_related("group", "user")
+            .prefetch_related("policy")
+        ):
+            self._policy_bindings[policy_binding.target_id].append(policy_binding)
+        self.user_dependent = any(
+            self._policy_bindings[binding.pbm_uuid]
+            for binding in self.bindings
+            if binding.evaluate_on_plan
+        )
+
+    def binding(self, pk: str) -> Optional[FlowStageBinding]:
+        """Get a binding of this flow by its primary key"""
+        return self._by_pk.get(pk, None)
+
+    def policy_bindings(self, pbm: PolicyBindingModel) -> Optional[list[PolicyBinding]]:
+        """Get the enabled policy bindings of `pbm`, which is either the flow or one of its
+        stage bindings. Returns None for other objects."""
+        if isinstance(pbm, Flow) and pbm.pk.hex == self.flow_pk:
+            return self._policy_bindings[pbm.pbm_uuid]
+        if isinstance(pbm, FlowStageBinding) and pbm.pk.hex in self._by_pk:
+            return self._policy_bindings[pbm.pbm_uuid]
+        return None
+
+
+class FlowGraphs:
+    """Flow graphs used by this process. All graphs are rebuilt once the shared version
+    changes, which happens whenever a flow, binding, stage, policy or policy binding
+    is changed."""
+
+    def __init__(self):
+        self._graphs: dict[str, FlowGraph] = {}
+
+    @staticmethod
+    def version() -> str:
+        """Get the current version of all graphs"""
+        version = cache.get(FLOW_GRAPH_VERSION_KEY, None)
+        if version is None:
+            cache.add(FLOW_GRAPH_VERSION_KEY, uuid4().hex, None)
+            version = cache.get(FLOW_GRAPH_VERSION_KEY)
+        return version
+
+    def get(self, flow_pk: str) -> FlowGraph:
+        """Get the graph of the flow with `flow_pk`, which is built if it's outdated"""
+        version = self.version()
+        graph = self._graphs.get(flow_pk, None)
+        if graph and graph.version == version:
+            return graph
+        graph = FlowGraph(flow_pk, version)
+        LOGGER.debug("Built flow graph", flow_pk=flow_pk, bindings=len(graph.bindings))
+        self._graphs[flow_pk] = graph
+        return graph
+
+    def binding(self, flow_pk: str, pk: str) -> Optional[FlowStageBinding]:
+        """Get a binding by its primary key, from the graph of `flow_pk` or the database if
+        it belongs to another flow. Returns None if the binding was deleted."""
+        binding = self.get(flow_pk).binding(pk)
+        if binding:
+            return binding
+        return FlowStageBinding.objects.filter(pk=pk).first()
+
+    @staticmethod
+    def invalidate():
+        """Rebuild all graphs in all processes on their next use"""
+        cache.set(FLOW_GRAPH_VERSION_KEY, uuid4().hex, None)
+
+
+FLOW_GRAPHS = FlowGraphs()
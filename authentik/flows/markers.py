@@ -44,6 +44,7 @@ class ReevaluateMarker(StageMarker):
         http_request: HttpRequest,
     ) -> Optional[FlowStageBinding]:
         """Re-evaluate policies bound to stage, and if they fail, remove from plan"""
+        from authentik.flows.graph import FLOW_GRAPHS
         from authentik.flows.planner import PLAN_CONTEXT_PENDING_USER
 
         LOGGER.debug(
@@ -55,6 +56,7 @@ class ReevaluateMarker(StageMarker):
             self.binding, plan.context.get(PLAN_CONTEXT_PENDING_USER, http_request.user)
         )
         engine.use_cache = False
+        engine.bindings = FLOW_GRAPHS.get(plan.flow_pk).policy_bindings(self.binding)
         engine.request.set_http_request(http_request)
         engine.request.context = plan.context
         engine.build()
@@ -1,6 +1,6 @@
 """Flows Planner"""
-from dataclasses import dataclass, field
-from typing import Any, Optional
+from dataclasses import dataclass, field, fields, is_dataclass, replace
+from typing import Any, Optional, Union
 
 from django.core.cache import cache
 from django.http import HttpRequest
@@ -11,10 +11,13 @@ from structlog.stdlib import BoundLogger, get_logger
 
 from authentik.core.models import User
 from authentik.events.models import cleanse_dict
+from authentik.events.utils import sanitize_dict
 from authentik.flows.exceptions import EmptyFlowException, FlowNonApplicableException
+from authentik.flows.graph import FLOW_GRAPHS
 from authentik.flows.markers import ReevaluateMarker, StageMarker
 from authentik.flows.models import Flow, FlowDesignation, FlowStageBinding, Stage
 from authentik.lib.config import CONFIG
+from authentik.lib.utils.cache import CacheNamespace
 from authentik.policies.engine import PolicyEngine
 
 LOGGER = get_logger()
@@ -36,6 +39,7 @@ HIST_FLOWS_PLAN_TIME = Histogram(
     ["flow_slug"],
 )
 CACHE_TIMEOUT = int(CONFIG.y("redis.cache_timeout_flows"))
+FLOW_CACHE = CacheNamespace("flow")
 
 
 def cache_key(flow: Flow, user: Optional[User] = None) -> str:
@@ -46,6 +50,64 @@ def cache_key(flow: Flow, user: Optional[User] = None) -> str:
     return prefix
 
 
+def flow_cache(flow: Flow) -> CacheNamespace:
+    """Cache namespace containing all cached plans of `flow`"""
+    return FLOW_CACHE.child(flow.pk.hex)
+
+
+@dataclass(frozen=True)
+class BindingReference:
+    """Primary key of a saved binding, which is pickled instead of the binding itself"""
+
+    pk: str
+
+
+def binding_reference(binding: Any) -> Any:
+    """Replace `binding` with a reference if it's saved. Bindings of in-memory stages
+    are kept as they are."""
+    # pylint: disable=protected-access
+    if isinstance(binding, FlowStageBinding) and not binding._state.adding:
+        return BindingReference(binding.pk.hex)
+    return binding
+
+
+def resolve_binding(flow_pk: str, binding: Any) -> Any:
+    """Load the binding `binding` refers to, None if it was deleted"""
+    if isinstance(binding, BindingReference):
+        return FLOW_GRAPHS.binding(flow_pk, binding.pk)
+    return binding
+
+
+def marker_reference(marker: StageMarker) -> Optional[StageMarker]:
+    """Replace the bindings of `marker` with references, plain markers are replaced by None"""
+    if marker.__class__ is StageMarker:
+        return None
+    if not is_dataclass(marker):
+        return marker
+    return replace(
+        marker,
+        **{
+            marker_field.name: binding_reference(getattr(marker, marker_field.name))
+            for marker_field in fields(marker)
+        },
+    )
+
+
+def resolve_marker(flow_pk: str, marker: Optional[StageMarker]) -> Optional[StageMarker]:
+    """Load the bindings `marker` refers to, None if any of them were deleted"""
+    if marker is None:
+        return StageMarker()
+    if not is_dataclass(marker):
+        return marker
+    resolved = {}
+    for marker_field in fields(marker):
+        value = getattr(marker, marker_field.name)
+        resolved[marker_field.name] = resolve_binding(flow_pk, value)
+        if resolved[marker_field.name] is None and value is not None:
+            return None
+    return replace(marker, **resolved)
+
+
 @dataclass
 class FlowPlan:
     """This data-class is the output of a FlowPlanner. It holds a flat list
@@ -101,6 +163,53 @@ class FlowPlan:
         """Check if there are any stages left in this plan"""
         return len(self.markers) + len(self.bindings) > 0
 
+    def snapshot(self) -> "FlowPlanSnapshot":
+        """Lightweight copy of the current state, for the flow inspector's history"""
+        return FlowPlanSnapshot(
+            flow_pk=self.flow_pk,
+            references=[binding_reference(binding) for binding in self.bindings[:2]],
+            context=sanitize_dict(self.context),
+        )
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Pickle saved bindings as references, which are loaded from the in-process
+        flow graph when the plan is unpickled"""
+        state = self.__dict__.copy()
+        state["bindings"] = [binding_reference(binding) for binding in self.bindings]
+        state["markers"] = [marker_reference(marker) for marker in self.markers]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        bindings = []
+        markers = []
+        for binding, marker in zip(state["bindings"], state["markers"]):
+            resolved_binding = resolve_binding(state["flow_pk"], binding)
+            resolved_marker = resolve_marker(state["flow_pk"], marker)
+            if resolved_binding is None or resolved_marker is None:
+                LOGGER.warning("f(plan_inst): binding was deleted, removing from plan")
+                continue
+            bindings.append(resolved_binding)
+            markers.append(resolved_marker)
+        state["bindings"] = bindings
+        state["markers"] = markers
+        self.__dict__.update(state)
+
+
+@dataclass
+class FlowPlanSnapshot:
+    """State of a plan after a stage was completed, containing the current and next binding
+    and a sanitized copy of the context"""
+
+    flow_pk: str
+    references: list[Union[BindingReference, FlowStageBinding]]
+    context: dict[str, Any]
+
+    @property
+    def bindings(self) -> list[FlowStageBinding]:
+        """The current and next binding which still exist"""
+        bindings = [resolve_binding(self.flow_pk, binding) for binding in self.references]
+        return [binding for binding in bindings if binding]
+
 
 class FlowPlanner:
     """Execute all policies to plan out a flat list of all Stages
@@ -142,9 +251,11 @@ class FlowPlanner:
             if PLAN_CONTEXT_PENDING_USER not in default_context:
                 default_context[PLAN_CONTEXT_PENDING_USER] = request.user
             user = default_context[PLAN_CONTEXT_PENDING_USER]
+            graph = FLOW_GRAPHS.get(self.flow.pk.hex)
             # First off, check the flow's direct policy bindings
             # to make sure the user even has access to the flow
             engine = PolicyEngine(self.flow, user, request)
+            engine.bindings = graph.policy_bindings(self.flow)
             span.set_data("default_context", cleanse_dict(default_context))
             engine.request.context = default_context
             engine.build()
@@ -153,8 +264,9 @@ class FlowPlanner:
                 exc = FlowNonApplicableException(",".join(result.messages))
                 exc.policy_result = result
                 raise exc
-            # User is passing so far, check if we have a cached plan
-            cached_plan_key = cache_key(self.flow, user)
+            # User is passing so far, check if we have a cached plan. Plans are only
+            # cached per user when the flow's stage bindings have policies
+            cached_plan_key = cache_key(self.flow, user if graph.user_dependent else None)
             cached_plan = cache.get(cached_plan_key, None)
             if self.flow.designation not in [FlowDesignation.STAGE_CONFIGURATION]:
                 if cached_plan and self.use_cache:
@@ -169,7 +281,12 @@ class FlowPlanner:
                 "f(plan): building plan",
             )
             plan = self._build_plan(user, request, default_context)
-            cache.set(cache_key(self.flow, user), plan, CACHE_TIMEOUT)
+            # The context isn't cached, as it's replaced when the plan is taken from the cache
+            flow_cache(self.flow).set(
+                cached_plan_key,
+                FlowPlan(self.flow.pk.hex, bindings=plan.bindings, markers=plan.markers),
+                CACHE_TIMEOUT,
+            )
             if not plan.bindings and not self.allow_empty_flows:
                 raise EmptyFlowException()
             return plan
@@ -194,11 +311,9 @@ class FlowPlanner:
             plan = FlowPlan(flow_pk=self.flow.pk.hex)
             if default_context:
                 plan.context = default_context
+            graph = FLOW_GRAPHS.get(self.flow.pk.hex)
             # Check Flow policies
-            for binding in FlowStageBinding.objects.filter(target__pk=self.flow.pk).order_by(
-                "order"
-            ):
-                binding: FlowStageBinding
+            for binding in graph.bindings:
                 stage = binding.stage
                 marker = StageMarker()
                 if binding.evaluate_on_plan:
@@ -207,6 +322,7 @@ class FlowPlanner:
                         stage=binding.stage,
                     )
                     engine = PolicyEngine(binding, user, request)
+                    engine.bindings = graph.policy_bindings(binding)
                     engine.request.context = plan.context
                     engine.build()
                     if engine.passing:
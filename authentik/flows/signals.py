@@ -1,27 +1,34 @@
 """authentik flow signals"""
-from django.core.cache import cache
-from django.db.models.signals import post_save, pre_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from structlog.stdlib import get_logger
 
-from authentik.flows.planner import GAUGE_FLOWS_CACHED
+from authentik.flows.planner import FLOW_CACHE, GAUGE_FLOWS_CACHED
 from authentik.root.monitoring import monitoring_set
 
 LOGGER = get_logger()
 
 
-def delete_cache_prefix(prefix: str) -> int:
-    """Delete keys prefixed with `prefix` and return count of deleted keys."""
-    keys = cache.keys(prefix)
-    cache.delete_many(keys)
-    return len(keys)
-
-
 @receiver(monitoring_set)
 # pylint: disable=unused-argument
 def monitoring_set_flows(sender, **kwargs):
     """set flow gauges"""
-    GAUGE_FLOWS_CACHED.set(len(cache.keys("flow_*") or []))
+    GAUGE_FLOWS_CACHED.set(FLOW_CACHE.count())
+
+
+@receiver(post_save)
+@receiver(post_delete)
+# pylint: disable=unused-argument
+def invalidate_flow_graphs(sender, instance, **_):
+    """Rebuild flow graphs once the change is committed, otherwise a graph built concurrently
+    from the previous state would be kept until the next change"""
+    from authentik.flows.graph import FLOW_GRAPHS
+    from authentik.flows.models import Flow, FlowStageBinding, Stage
+    from authentik.policies.models import Policy, PolicyBinding
+
+    if isinstance(instance, (Flow, FlowStageBinding, Stage, Policy, PolicyBinding)):
+        transaction.on_commit(FLOW_GRAPHS.invalidate)
 
 
 @receiver(post_save)
@@ -30,17 +37,28 @@ def monitoring_set_flows(sender, **kwargs):
 def invalidate_flow_cache(sender, instance, **_):
     """Invalidate flow cache when flow is updated"""
     from authentik.flows.models import Flow, FlowStageBinding, Stage
-    from authentik.flows.planner import cache_key
+    from authentik.flows.planner import flow_cache
+    from authentik.policies.models import PolicyBinding
 
     if isinstance(instance, Flow):
-        total = delete_cache_prefix(f"{cache_key(instance)}*")
+        total = flow_cache(instance).clear()
         LOGGER.debug("Invalidating Flow cache", flow=instance, len=total)
     if isinstance(instance, FlowStageBinding):
-        total = delete_cache_prefix(f"{cache_key(instance.target)}*")
+        total = flow_cache(instance.target).clear()
         LOGGER.debug("Invalidating Flow cache from FlowStageBinding", binding=instance, len=total)
     if isinstance(instance, Stage):
         total = 0
         for binding in FlowStageBinding.objects.filter(stage=instance):
-            prefix = cache_key(binding.target)
-            total += delete_cache_prefix(f"{prefix}*")
+            total += flow_cache(binding.target).clear()
         LOGGER.debug("Invalidating Flow cache from Stage", stage=instance, len=total)
+    if isinstance(instance, PolicyBinding):
+        # Policies of stage bindings decide if plans are cached per user
+        binding = (
+            FlowStageBinding.objects.filter(pbm_uuid=instance.target_id)
+            .select_related("target")
+            .first()
+        )
+        if not binding:
+            return
+        total = flow_cache(binding.target).clear()
+        LOGGER.debug("Invalidating Flow cache from PolicyBinding", binding=instance, len=total)
@@ -1,4 +1,5 @@
 """flow planner tests"""
+from pickle import dumps, loads  # nosec
 from unittest.mock import MagicMock, Mock, PropertyMock, patch
 
 from django.contrib.sessions.middleware import SessionMiddleware
@@ -9,14 +10,17 @@ from guardian.shortcuts import get_anonymous_user
 
 from authentik.core.models import User
 from authentik.flows.exceptions import EmptyFlowException, FlowNonApplicableException
+from authentik.flows.graph import FLOW_GRAPHS
 from authentik.flows.markers import ReevaluateMarker, StageMarker
-from authentik.flows.models import Flow, FlowDesignation, FlowStageBinding
-from authentik.flows.planner import PLAN_CONTEXT_PENDING_USER, FlowPlanner, cache_key
+from authentik.flows.models import Flow, FlowDesignation, FlowStageBinding, in_memory_stage
+from authentik.flows.planner import PLAN_CONTEXT_PENDING_USER, FlowPlan, FlowPlanner, cache_key
+from authentik.lib.generators import generate_id
 from authentik.lib.tests.utils import dummy_get_response
 from authentik.policies.dummy.models import DummyPolicy
 from authentik.policies.models import PolicyBinding
 from authentik.policies.types import PolicyResult
 from authentik.stages.dummy.models import DummyStage
+from authentik.stages.dummy.stage import DummyStageView
 
 POLICY_RETURN_FALSE = PropertyMock(return_value=PolicyResult(False))
 CACHE_MOCK = Mock(wraps=cache)
@@ -67,6 +71,7 @@ class TestFlowPlanner(TestCase):
             planner.plan(request)
 
     @patch("authentik.flows.planner.cache", CACHE_MOCK)
+    @patch("authentik.lib.utils.cache.cache", CACHE_MOCK)
     def test_planner_cache(self):
         """Test planner cache"""
         flow = Flow.objects.create(
@@ -97,9 +102,15 @@ class TestFlowPlanner(TestCase):
             slug="test-default-context",
             designation=FlowDesignation.AUTHENTICATION,
         )
-        FlowStageBinding.objects.create(
+        binding = FlowStageBinding.objects.create(
             target=flow, stage=DummyStage.objects.create(name="dummy"), order=0
         )
+        # Plans are only cached per user when stage bindings have policies
+        PolicyBinding.objects.create(
+            policy=DummyPolicy.objects.create(result=True, wait_min=0, wait_max=1),
+            target=binding,
+            order=0,
+        )
 
         user = User.objects.create(username="test-user")
         request = self.request_factory.get(
@@ -111,6 +122,42 @@ class TestFlowPlanner(TestCase):
         key = cache_key(flow, user)
         self.assertTrue(cache.get(key) is not None)
 
+    def test_planner_cache_shared(self):
+        """Test plans of flows without stage binding policies being shared between users"""
+        flow = Flow.objects.create(
+            name=generate_id(),
+            slug=generate_id(),
+            designation=FlowDesignation.AUTHENTICATION,
+        )
+        binding = FlowStageBinding.objects.create(
+            target=flow, stage=DummyStage.objects.create(name=generate_id()), order=0
+        )
+        request = self.request_factory.get(
+            reverse("authentik_api:flow-executor", kwargs={"flow_slug": flow.slug}),
+        )
+        request.user = get_anonymous_user()
+        user = User.objects.create(username=generate_id())
+
+        FlowPlanner(flow).plan(request)
+        self.assertIsNotNone(cache.get(cache_key(flow)))
+        with patch("authentik.flows.planner.FlowPlanner._build_plan") as build_plan:
+            plan = FlowPlanner(flow).plan(request, {PLAN_CONTEXT_PENDING_USER: user})
+            build_plan.assert_not_called()
+        self.assertEqual(plan.bindings, [binding])
+        self.assertEqual(plan.context[PLAN_CONTEXT_PENDING_USER], user)
+
+        # Adding a policy clears the cache, plans are now cached per user
+        with self.captureOnCommitCallbacks(execute=True):
+            PolicyBinding.objects.create(
+                policy=DummyPolicy.objects.create(result=True, wait_min=0, wait_max=1),
+                target=binding,
+                order=0,
+            )
+        self.assertIsNone(cache.get(cache_key(flow)))
+        FlowPlanner(flow).plan(request, {PLAN_CONTEXT_PENDING_USER: user})
+        self.assertIsNone(cache.get(cache_key(flow)))
+        self.assertIsNotNone(cache.get(cache_key(flow, user)))
+
     def test_planner_marker_reevaluate(self):
         """Test that the planner creates the proper marker"""
         flow = Flow.objects.create(
@@ -176,3 +223,106 @@ class TestFlowPlanner(TestCase):
 
             self.assertIsInstance(plan.markers[0], StageMarker)
             self.assertIsInstance(plan.markers[1], ReevaluateMarker)
+
+    def test_plan_pickle(self):
+        """Test plans being pickled with references to their bindings"""
+        flow = Flow.objects.create(
+            name=generate_id(),
+            slug=generate_id(),
+            designation=FlowDesignation.AUTHENTICATION,
+        )
+        binding = FlowStageBinding.objects.create(
+            target=flow, stage=DummyStage.objects.create(name=generate_id()), order=0
+        )
+        binding2 = FlowStageBinding.objects.create(
+            target=flow,
+            stage=DummyStage.objects.create(name=generate_id()),
+            order=1,
+            re_evaluate_policies=True,
+        )
+        plan = FlowPlan(flow_pk=flow.pk.hex)
+        plan.append(binding)
+        plan.append(binding2, ReevaluateMarker(binding=binding2))
+        plan.append_stage(in_memory_stage(DummyStageView))
+
+        data = dumps(plan)
+        self.assertNotIn(binding.stage.name.encode(), data)
+        restored: FlowPlan = loads(data)
+        self.assertEqual(restored.bindings[:2], [binding, binding2])
+        self.assertIsInstance(restored.bindings[0].stage, DummyStage)
+        self.assertIs(restored.markers[1].binding, restored.bindings[1])
+        self.assertEqual(restored.bindings[2].stage.type, DummyStageView)
+
+        # Bindings which were deleted in the meantime are removed from the plan
+        with self.captureOnCommitCallbacks(execute=True):
+            binding2.delete()
+        restored = loads(data)
+        self.assertEqual(len(restored.bindings), 2)
+        self.assertEqual(len(restored.markers), 2)
+        self.assertEqual(restored.bindings[0], binding)
+
+    def test_plan_snapshot(self):
+        """Test history snapshots of plans"""
+        flow = Flow.objects.create(
+            name=generate_id(),
+            slug=generate_id(),
+            designation=FlowDesignation.AUTHENTICATION,
+        )
+        plan = FlowPlan(flow_pk=flow.pk.hex)
+        for order in range(3):
+            plan.append(
+                FlowStageBinding.objects.create(
+                    target=flow, stage=DummyStage.objects.create(name=generate_id()), order=order
+                )
+            )
+        plan.context[PLAN_CONTEXT_PENDING_USER] = get_anonymous_user()
+        snapshot = loads(dumps(plan.snapshot()))
+        self.assertEqual(snapshot.bindings, plan.bindings[:2])
+        self.assertEqual(
+            snapshot.context[PLAN_CONTEXT_PENDING_USER]["username"],
+            get_anonymous_user().username,
+        )
+
+    def test_planner_queries(self):
+        """Test planning with a preloaded flow graph not querying bindings and policies"""
+        flow = Flow.objects.create(
+            name=generate_id(),
+            slug=generate_id(),
+            designation=FlowDesignation.AUTHENTICATION,
+        )
+        PolicyBinding.objects.create(
+            policy=DummyPolicy.objects.create(result=True, wait_min=0, wait_max=1),
+            target=flow,
+            order=0,
+        )
+        for order in range(10):
+            binding = FlowStageBinding.objects.create(
+                target=flow, stage=DummyStage.objects.create(name=generate_id()), order=order
+            )
+            PolicyBinding.objects.create(
+                policy=DummyPolicy.objects.create(result=True, wait_min=0, wait_max=1),
+                target=binding,
+                order=0,
+            )
+        request = self.request_factory.get(
+            reverse("authentik_api:flow-executor", kwargs={"flow_slug": flow.slug}),
+        )
+        request.user = get_anonymous_user()
+
+        graph = FLOW_GRAPHS.get(flow.pk.hex)
+        self.assertTrue(graph.user_dependent)
+        self.assertIsInstance(graph.bindings[0].stage, DummyStage)
+        self.assertIsInstance(graph.policy_bindings(flow)[0].policy, DummyPolicy)
+        planner = FlowPlanner(flow)
+        planner.use_cache = False
+        with self.assertNumQueries(0):
+            plan = planner.plan(request)
+        self.assertEqual(len(plan.bindings), 10)
+
+        # Graphs are only rebuilt once changes are committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            binding.delete()
+            self.assertIs(FLOW_GRAPHS.get(flow.pk.hex), graph)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(FLOW_GRAPHS.get(flow.pk.hex).bindings), 9)
@@ -1,11 +1,9 @@
 """authentik multi-stage authentication engine"""
-from copy import deepcopy
 from traceback import format_tb
 from typing import Any, Optional
 
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.cache import cache
 from django.http import Http404, HttpRequest, HttpResponse, HttpResponseRedirect
 from django.http.request import QueryDict
 from django.shortcuts import get_object_or_404, redirect
@@ -43,6 +41,7 @@ from authentik.flows.models import (
     Stage,
 )
 from authentik.flows.planner import (
+    FLOW_CACHE,
     PLAN_CONTEXT_IS_RESTORED,
     PLAN_CONTEXT_PENDING_USER,
     PLAN_CONTEXT_REDIRECT,
@@ -64,6 +63,8 @@ SESSION_KEY_APPLICATION_PRE = "authentik_flows_application_pre"
 SESSION_KEY_GET = "authentik_flows_get"
 SESSION_KEY_POST = "authentik_flows_post"
 SESSION_KEY_HISTORY = "authentik_flows_history"
+# Amount of completed stages kept in the history for the flow inspector
+HISTORY_LENGTH = 20
 QS_KEY_TOKEN = "flow_token"  # nosec
 
 
@@ -206,8 +207,7 @@ class FlowExecutorView(APIView):
                 self._logger.warning(
                     "f(exec): found incompatible flow plan, invalidating run", exc=exc
                 )
-                keys = cache.keys("flow_*")
-                cache.delete_many(keys)
+                FLOW_CACHE.clear()
                 return self.stage_invalid()
             if not next_binding:
                 self._logger.debug("f(exec): no more stages, flow is done.")
@@ -339,8 +339,7 @@ class FlowExecutorView(APIView):
             # from the cache. If there are errors, just delete all cached flows
             _ = plan.has_stages
         except Exception:  # pylint: disable=broad-except
-            keys = cache.keys("flow_*")
-            cache.delete_many(keys)
+            FLOW_CACHE.clear()
             return self._initiate_plan()
         return plan
 
@@ -379,7 +378,9 @@ class FlowExecutorView(APIView):
             "f(exec): Stage ok",
             stage_class=class_to_path(self.current_stage_view.__class__),
         )
-        self.request.session.get(SESSION_KEY_HISTORY, []).append(deepcopy(self.plan))
+        history = self.request.session.get(SESSION_KEY_HISTORY, [])
+        history.append(self.plan.snapshot())
+        self.request.session[SESSION_KEY_HISTORY] = history[-HISTORY_LENGTH:]
         self.plan.pop()
         self.request.session[SESSION_KEY_PLAN] = self.plan
         if self.plan.bindings:
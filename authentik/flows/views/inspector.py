@@ -1,6 +1,6 @@
 """Flow Inspector"""
 from hashlib import sha256
-from typing import Any
+from typing import Any, Union
 
 from django.conf import settings
 from django.http.request import HttpRequest
@@ -21,9 +21,12 @@ from authentik.core.api.utils import PassiveSerializer
 from authentik.events.utils import sanitize_dict
 from authentik.flows.api.bindings import FlowStageBindingSerializer
 from authentik.flows.models import Flow
-from authentik.flows.planner import FlowPlan
+from authentik.flows.planner import FlowPlan, FlowPlanSnapshot
 from authentik.flows.views.executor import SESSION_KEY_HISTORY, SESSION_KEY_PLAN
 
+# The active plan, or a snapshot of a previous state from the history
+InspectedPlan = Union[FlowPlan, FlowPlanSnapshot]
+
 
 class FlowInspectorPlanSerializer(PassiveSerializer):
     """Serializer for an active FlowPlan"""
@@ -33,22 +36,22 @@ class FlowInspectorPlanSerializer(PassiveSerializer):
     plan_context = SerializerMethodField()
     session_id = SerializerMethodField()
 
-    def get_current_stage(self, plan: FlowPlan) -> FlowStageBindingSerializer:
+    def get_current_stage(self, plan: InspectedPlan) -> FlowStageBindingSerializer:
         """Get the current stage"""
         return FlowStageBindingSerializer(instance=plan.bindings[0]).data
 
-    def get_next_planned_stage(self, plan: FlowPlan) -> FlowStageBindingSerializer:
+    def get_next_planned_stage(self, plan: InspectedPlan) -> FlowStageBindingSerializer:
         """Get the next planned stage"""
         if len(plan.bindings) < 2:
             return FlowStageBindingSerializer().data
         return FlowStageBindingSerializer(instance=plan.bindings[1]).data
 
-    def get_plan_context(self, plan: FlowPlan) -> dict[str, Any]:
+    def get_plan_context(self, plan: InspectedPlan) -> dict[str, Any]:
         """Get the plan's context, sanitized"""
         return sanitize_dict(plan.context)
 
     # pylint: disable=unused-argument
-    def get_session_id(self, plan: FlowPlan) -> str:
+    def get_session_id(self, plan: InspectedPlan) -> str:
         """Get a unique session ID"""
         request: Request = self.context["request"]
         return sha256(
@@ -1,9 +1,14 @@
 """authentik expression policy evaluator"""
 import re
+from collections import OrderedDict
+from hashlib import sha256
 from textwrap import indent
+from threading import Lock
+from types import CodeType
 from typing import Any, Iterable, Optional
 
 from django.core.exceptions import FieldError
+from prometheus_client import Counter
 from rest_framework.serializers import ValidationError
 from sentry_sdk.hub import Hub
 from sentry_sdk.tracing import Span
@@ -13,6 +18,61 @@ from authentik.core.models import User
 from authentik.lib.utils.http import get_http_session
 
 LOGGER = get_logger()
+COUNTER_EXPRESSION_CACHE_HITS = Counter(
+    "authentik_expression_cache_hits",
+    "Expressions evaluated with already compiled code",
+)
+COUNTER_EXPRESSION_CACHE_MISSES = Counter(
+    "authentik_expression_cache_misses",
+    "Expressions which had to be compiled before evaluation",
+)
+
+
+class CompiledExpressionCache:
+    """Process-wide LRU cache of compiled expressions. Keys are derived from the hash of the
+    expression source, so changed expressions are never served from stale entries."""
+
+    max_size: int
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = Lock()
+        self._entries: OrderedDict[tuple[str, tuple[str, ...], str], CodeType] = OrderedDict()
+
+    @staticmethod
+    def key(expression: str, params: Iterable[str], filename: str) -> tuple:
+        """Cache key for `expression` wrapped with handler signature `params`"""
+        return (sha256(expression.encode()).hexdigest(), tuple(params), filename)
+
+    def get(self, key: tuple) -> Optional[CodeType]:
+        """Get compiled code and mark it as most recently used"""
+        with self._lock:
+            code = self._entries.get(key)
+            if code is None:
+                COUNTER_EXPRESSION_CACHE_MISSES.inc()
+                return None
+            self._entries.move_to_end(key)
+        COUNTER_EXPRESSION_CACHE_HITS.inc()
+        return code
+
+    def set(self, key: tuple, code: CodeType):
+        """Save compiled code, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = code
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+EXPRESSION_CACHE = CompiledExpressionCache(1000)
 
 
 class BaseEvaluator:
@@ -95,17 +155,23 @@ class BaseEvaluator:
             span.description = self._filename
             span.set_data("expression", expression_source)
             param_keys = self._context.keys()
+            key = EXPRESSION_CACHE.key(expression_source, param_keys, self._filename)
+            ast_obj = EXPRESSION_CACHE.get(key)
+            if not ast_obj:
+                try:
+                    ast_obj = compile(
+                        self.wrap_expression(expression_source, param_keys),
+                        self._filename,
+                        "exec",
+                    )
+                except (SyntaxError, ValueError) as exc:
+                    self.handle_error(exc, expression_source)
+                    raise exc
+                EXPRESSION_CACHE.set(key, ast_obj)
             try:
-                ast_obj = compile(
-                    self.wrap_expression(expression_source, param_keys),
-                    self._filename,
-                    "exec",
-                )
-            except (SyntaxError, ValueError) as exc:
-                self.handle_error(exc, expression_source)
-                raise exc
-            try:
-                _locals = self._context
+                # Use a copy of the context so the names defined by the wrapped expression
+                # don't become parameters of the next evaluation
+                _locals = dict(self._context)
                 # Yes this is an exec, yes it is potentially bad. Since we limit what variables are
                 # available here, and these policies can only be edited by admins, this is a risk
                 # we're willing to take.
@@ -2,7 +2,11 @@
 from django.test import TestCase
 
 from authentik.core.tests.utils import create_test_admin_user
-from authentik.lib.expression.evaluator import BaseEvaluator
+from authentik.lib.expression.evaluator import (
+    EXPRESSION_CACHE,
+    BaseEvaluator,
+    CompiledExpressionCache,
+)
 
 
 class TestEvaluator(TestCase):
@@ -27,3 +31,27 @@ class TestEvaluator(TestCase):
     def test_is_group_member(self):
         """Test expr_is_group_member"""
         self.assertFalse(BaseEvaluator.expr_is_group_member(create_test_admin_user(), name="test"))
+
+    def test_compiled_cache(self):
+        """Test compiled expressions being re-used"""
+        EXPRESSION_CACHE.clear()
+        evaluator = BaseEvaluator()
+        evaluator._context = {"foo": "bar"}
+        self.assertEqual(evaluator.evaluate("return foo"), "bar")
+        self.assertEqual(len(EXPRESSION_CACHE), 1)
+        self.assertEqual(evaluator.evaluate("return foo"), "bar")
+        self.assertEqual(len(EXPRESSION_CACHE), 1)
+        # Different parameters result in a different handler signature
+        evaluator._context = {"foo": "bar", "baz": "qux"}
+        self.assertEqual(evaluator.evaluate("return foo"), "bar")
+        self.assertEqual(len(EXPRESSION_CACHE), 2)
+
+    def test_compiled_cache_eviction(self):
+        """Test least recently used compiled expressions being evicted"""
+        cache = CompiledExpressionCache(2)
+        keys = [cache.key(f"return {x}", [], "test") for x in range(3)]
+        for key in keys:
+            cache.set(key, compile("", "test", "exec"))
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
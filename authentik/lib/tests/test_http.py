@@ -1,9 +1,19 @@
 """Test HTTP Helpers"""
+from unittest.mock import patch
+
 from django.test import RequestFactory, TestCase
+from requests.adapters import HTTPAdapter
+from requests.models import Response
 
 from authentik.core.models import USER_ATTRIBUTE_CAN_OVERRIDE_IP, Token, TokenIntents
 from authentik.core.tests.utils import create_test_admin_user
-from authentik.lib.utils.http import OUTPOST_REMOTE_IP_HEADER, OUTPOST_TOKEN_HEADER, get_client_ip
+from authentik.lib.utils.http import (
+    HTTP_ADAPTER,
+    OUTPOST_REMOTE_IP_HEADER,
+    OUTPOST_TOKEN_HEADER,
+    get_client_ip,
+    get_http_session,
+)
 from authentik.lib.views import bad_request_message
 
 
@@ -63,3 +73,66 @@ class TestHTTP(TestCase):
             },
         )
         self.assertEqual(get_client_ip(request), "1.2.3.4")
+
+    def test_client_ip_cached(self):
+        """Test client IP being resolved once per request, and override checks being cached"""
+        token = Token.objects.create(
+            identifier="test", user=self.user, intent=TokenIntents.INTENT_API
+        )
+        self.user.attributes[USER_ATTRIBUTE_CAN_OVERRIDE_IP] = True
+        self.user.save()
+        request = self.factory.get(
+            "/",
+            **{
+                OUTPOST_REMOTE_IP_HEADER: "1.2.3.4",
+                OUTPOST_TOKEN_HEADER: token.key,
+            },
+        )
+        self.assertEqual(get_client_ip(request), "1.2.3.4")
+        request.META[OUTPOST_REMOTE_IP_HEADER] = "1.2.3.5"
+        self.assertEqual(get_client_ip(request), "1.2.3.4")
+        request = self.factory.get(
+            "/",
+            **{
+                OUTPOST_REMOTE_IP_HEADER: "1.2.3.5",
+                OUTPOST_TOKEN_HEADER: token.key,
+            },
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(get_client_ip(request), "1.2.3.5")
+        # Logging in keeps the cached checks
+        self.user.save(update_fields=["last_login"])
+        request = self.factory.get(
+            "/",
+            **{
+                OUTPOST_REMOTE_IP_HEADER: "1.2.3.5",
+                OUTPOST_TOKEN_HEADER: token.key,
+            },
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(get_client_ip(request), "1.2.3.5")
+        # Deleting the token revokes the override immediately
+        token.delete()
+        request = self.factory.get(
+            "/",
+            **{
+                OUTPOST_REMOTE_IP_HEADER: "1.2.3.5",
+                OUTPOST_TOKEN_HEADER: token.key,
+            },
+        )
+        self.assertEqual(get_client_ip(request), "127.0.0.1")
+
+    def test_http_session(self):
+        """Test sessions sharing the pooled adapter, and default timeouts"""
+        response = Response()
+        response.status_code = 200
+        with patch.object(HTTPAdapter, "send", return_value=response) as send:
+            with patch.object(HTTP_ADAPTER, "close") as close, get_http_session() as session:
+                self.assertIs(session.get_adapter("https://goauthentik.io"), HTTP_ADAPTER)
+                session.get("https://goauthentik.io")
+                session.get("https://goauthentik.io", timeout=5)
+            # Closing a session keeps the shared connections open
+            close.assert_not_called()
+            self.assertEqual(send.call_args_list[0].args[2], HTTP_ADAPTER.timeout)
+            self.assertEqual(send.call_args_list[1].args[2], 5)
+        self.assertIs(get_http_session().get_adapter("http://goauthentik.io"), HTTP_ADAPTER)
@@ -0,0 +1,65 @@
+"""Test cache namespaces"""
+from django.core.cache import cache
+from django.test import TestCase
+from django_redis import get_redis_connection
+
+from authentik.lib.generators import generate_id
+from authentik.lib.utils.cache import CacheNamespace
+
+
+class TestCacheNamespace(TestCase):
+    """Test cache namespaces"""
+
+    def setUp(self) -> None:
+        self.namespace = CacheNamespace(generate_id())
+        self.child = self.namespace.child("child")
+
+    def test_set_delete(self):
+        """Test keys being indexed and removed"""
+        self.namespace.set("foo", "bar")
+        self.child.set("baz", "qux")
+        self.assertEqual(sorted(self.namespace.keys()), ["baz", "foo"])
+        self.assertEqual(self.child.keys(), ["baz"])
+        self.assertEqual(self.namespace.get_many(), {"foo": "bar", "baz": "qux"})
+        self.child.delete("baz")
+        self.assertIsNone(cache.get("baz"))
+        self.assertEqual(self.namespace.count(), 1)
+        self.assertEqual(self.child.count(), 0)
+
+    def test_expiry(self):
+        """Test expired keys not being counted"""
+        self.namespace.set("foo", "bar", timeout=-1)
+        self.namespace.set("baz", "qux", timeout=None)
+        self.assertEqual(self.namespace.keys(), ["baz"])
+
+    def test_index_expiry(self):
+        """Test indexes expiring with their last key"""
+        redis = get_redis_connection()
+        self.child.set("foo", "bar", timeout=60)
+        self.namespace.set("baz", "qux", timeout=30)
+        for key in [self.child.index_key, self.namespace.index_key, self.namespace.children_key]:
+            self.assertTrue(55 < redis.ttl(key) <= 61)
+        self.child.set("quux", "corge", timeout=None)
+        self.assertEqual(redis.ttl(self.namespace.index_key), -1)
+        self.assertEqual(redis.ttl(self.namespace.children_key), -1)
+
+    def test_clear(self):
+        """Test clearing a namespace and its children"""
+        self.namespace.set("foo", "bar")
+        self.child.set("baz", "qux")
+        other = self.namespace.child("other")
+        other.set("quux", "corge")
+        self.assertEqual(other.clear(), 1)
+        self.assertEqual(self.namespace.count(), 2)
+        self.assertEqual(self.namespace.clear(), 2)
+        self.assertEqual(cache.get_many(["foo", "baz", "quux"]), {})
+        self.assertEqual(self.child.count(), 0)
+
+    def test_clear_nested(self):
+        """Test clearing a namespace clearing the indexes of all of its descendants"""
+        grandchild = self.child.child("grandchild")
+        grandchild.set("foo", "bar")
+        self.assertEqual(self.namespace.clear(), 1)
+        self.assertIsNone(cache.get("foo"))
+        self.assertEqual(grandchild.count(), 0)
+        self.assertFalse(get_redis_connection().exists(self.child.children_key))
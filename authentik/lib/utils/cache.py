@@ -0,0 +1,160 @@
+"""Cache key namespaces"""
+from time import time
+from typing import Any, Optional
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from structlog.stdlib import get_logger
+
+LOGGER = get_logger()
+# Expire the index of a namespace and the set of its children with the last key of the index
+EXPIRE_INDEX_SCRIPT = """
+local last = redis.call("ZRANGE", KEYS[1], -1, -1, "WITHSCORES")
+if #last == 0 then
+    return
+end
+if last[2] == "inf" then
+    redis.call("PERSIST", KEYS[1])
+    redis.call("PERSIST", KEYS[2])
+else
+    local expires = math.ceil(tonumber(last[2]))
+    redis.call("EXPIREAT", KEYS[1], expires)
+    redis.call("EXPIREAT", KEYS[2], expires)
+end
+"""
+
+
+class CacheNamespace:
+    """Group of cache keys, indexed in a sorted set scored by each key's expiry. This allows
+    keys to be counted, listed and deleted without scanning the keyspace with KEYS.
+
+    Keys are still read with the normal cache API. Keys added to a namespace are also added to
+    its `parent`, and clearing the parent clears all of its children. Indexes expire with
+    their last key."""
+
+    name: str
+    parent: Optional["CacheNamespace"]
+
+    def __init__(self, name: str, parent: Optional["CacheNamespace"] = None):
+        self.name = name
+        self.parent = parent
+
+    def child(self, name: str) -> "CacheNamespace":
+        """Get a namespace whose keys are also part of this namespace"""
+        return CacheNamespace(f"{self.name}_{name}", parent=self)
+
+    @property
+    def index_key(self) -> str:
+        """Key of the sorted set containing all keys of this namespace"""
+        return cache.make_key(f"authentik_cache_namespace_{self.name}")
+
+    @property
+    def children_key(self) -> str:
+        """Key of the set containing the names of all child namespaces"""
+        return cache.make_key(f"authentik_cache_namespace_{self.name}_children")
+
+    def _namespaces(self) -> list["CacheNamespace"]:
+        """This namespace and all of its parents"""
+        namespaces = [self]
+        while namespaces[-1].parent:
+            namespaces.append(namespaces[-1].parent)
+        return namespaces
+
+    def add(self, key: str, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        """Add `key`, which was set with `timeout`, to this namespace"""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = cache.default_timeout
+        expires = "+inf" if timeout is None else time() + timeout
+        try:
+            redis = get_redis_connection()
+            expire_index = redis.register_script(EXPIRE_INDEX_SCRIPT)
+            pipeline = redis.pipeline(transaction=False)
+            for namespace in self._namespaces():
+                pipeline.zremrangebyscore(namespace.index_key, "-inf", time())
+                pipeline.zadd(namespace.index_key, {key: expires})
+                if namespace.parent:
+                    pipeline.sadd(namespace.parent.children_key, namespace.name)
+                expire_index(
+                    keys=[namespace.index_key, namespace.children_key], client=pipeline
+                )
+            pipeline.execute()
+        except RedisError as exc:
+            LOGGER.warning("Failed to index cache key", key=key, exc=exc)
+
+    def set(self, key: str, value: Any, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        """Set `key` in the cache and add it to this namespace"""
+        cache.set(key, value, timeout)
+        self.add(key, timeout)
+
+    def delete(self, key: str) -> bool:
+        """Delete `key` from the cache and this namespace"""
+        deleted = cache.delete(key)
+        try:
+            pipeline = get_redis_connection().pipeline(transaction=False)
+            for namespace in self._namespaces():
+                pipeline.zrem(namespace.index_key, key)
+            pipeline.execute()
+        except RedisError as exc:
+            LOGGER.warning("Failed to remove cache key from index", key=key, exc=exc)
+        return deleted
+
+    def keys(self) -> list[str]:
+        """Get all keys of this namespace which haven't expired yet"""
+        try:
+            pipeline = get_redis_connection().pipeline(transaction=False)
+            pipeline.zremrangebyscore(self.index_key, "-inf", time())
+            pipeline.zrange(self.index_key, 0, -1)
+            _, keys = pipeline.execute()
+        except RedisError as exc:
+            LOGGER.warning("Failed to get cache keys from index", exc=exc)
+            return []
+        return [key.decode() for key in keys]
+
+    def count(self) -> int:
+        """Count all keys of this namespace which haven't expired yet"""
+        try:
+            pipeline = get_redis_connection().pipeline(transaction=False)
+            pipeline.zremrangebyscore(self.index_key, "-inf", time())
+            pipeline.zcard(self.index_key)
+            _, count = pipeline.execute()
+        except RedisError as exc:
+            LOGGER.warning("Failed to count cache keys", exc=exc)
+            return 0
+        return count
+
+    def get_many(self) -> dict[str, Any]:
+        """Get the values of all keys of this namespace"""
+        return cache.get_many(self.keys())
+
+    def _descendants(self) -> list["CacheNamespace"]:
+        """All children of this namespace, and their children"""
+        redis = get_redis_connection()
+        descendants = []
+        pending = [self]
+        while pending:
+            for name in redis.smembers(pending.pop().children_key):
+                child = CacheNamespace(name.decode())
+                descendants.append(child)
+                pending.append(child)
+        return descendants
+
+    def clear(self) -> int:
+        """Delete all keys of this namespace and its children from the cache,
+        returns the amount of deleted keys"""
+        keys = self.keys()
+        cache.delete_many(keys)
+        try:
+            index_keys = []
+            for namespace in [self] + self._descendants():
+                index_keys.extend([namespace.index_key, namespace.children_key])
+            pipeline = get_redis_connection().pipeline(transaction=False)
+            pipeline.delete(*index_keys)
+            if keys:
+                for namespace in self._namespaces()[1:]:
+                    pipeline.zrem(namespace.index_key, *keys)
+            pipeline.execute()
+        except RedisError as exc:
+            LOGGER.warning("Failed to clear cache index", exc=exc)
+        return len(keys)
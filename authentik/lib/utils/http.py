@@ -1,17 +1,42 @@
 """http helpers"""
+from hashlib import sha256
+from os import getpid
+from time import perf_counter
 from typing import Any, Optional
 
+from django.core.cache import cache
 from django.http import HttpRequest
+from prometheus_client import Counter, Histogram
+from requests.adapters import HTTPAdapter
+from requests.models import PreparedRequest, Response
 from requests.sessions import Session
 from sentry_sdk.hub import Hub
 from structlog.stdlib import get_logger
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
 
 from authentik import get_full_version
+from authentik.lib.config import CONFIG
+from authentik.lib.utils.cache import CacheNamespace
 
 OUTPOST_REMOTE_IP_HEADER = "HTTP_X_AUTHENTIK_REMOTE_IP"
 OUTPOST_TOKEN_HEADER = "HTTP_X_AUTHENTIK_OUTPOST_TOKEN"  # nosec
 DEFAULT_IP = "255.255.255.255"
+# Attribute of requests the resolved client IP is stored in
+CLIENT_IP_ATTRIBUTE = "_authentik_client_ip"
+CACHE_TIMEOUT_IP_OVERRIDE = int(CONFIG.y("redis.cache_timeout_ip_override", 60))
+IP_OVERRIDE_CACHE = CacheNamespace("ip_override")
 LOGGER = get_logger()
+HIST_HTTP_REQUEST_DURATION = Histogram(
+    "authentik_outgoing_http_request_duration",
+    "Duration of outgoing HTTP requests, including retries",
+    ["method", "status"],
+)
+COUNTER_HTTP_CONNECTIONS = Counter(
+    "authentik_outgoing_http_connections",
+    "Connections opened for outgoing HTTP requests, requests which don't open a new "
+    "connection re-use a pooled one",
+)
 
 
 def _get_client_ip_from_meta(meta: dict[str, Any]) -> str:
@@ -29,28 +54,53 @@ def _get_client_ip_from_meta(meta: dict[str, Any]) -> str:
     return DEFAULT_IP
 
 
-def _get_outpost_override_ip(request: HttpRequest) -> Optional[str]:
-    """Get the actual remote IP when set by an outpost. Only
-    allowed when the request is authenticated, by a user with USER_ATTRIBUTE_CAN_OVERRIDE_IP set
-    to outpost"""
+def ip_override_cache_key(token_key: str) -> str:
+    """Cache key where the IP override permission of a token is saved"""
+    return f"ip_override_{sha256(token_key.encode()).hexdigest()}"
+
+
+def ip_override_cache(user_pk: int) -> CacheNamespace:
+    """Cache namespace containing the IP override permissions of all tokens of a user"""
+    return IP_OVERRIDE_CACHE.child(f"user_{user_pk}")
+
+
+def _can_override_ip(token_key: str, fake_ip: str) -> bool:
+    """Check if the token `token_key` belongs to a user that may override the remote IP.
+    Decisions are cached shortly, as outposts send the same token with every request."""
     from authentik.core.models import USER_ATTRIBUTE_CAN_OVERRIDE_IP, Token, TokenIntents
 
-    if OUTPOST_REMOTE_IP_HEADER not in request.META or OUTPOST_TOKEN_HEADER not in request.META:
-        return None
-    fake_ip = request.META[OUTPOST_REMOTE_IP_HEADER]
-    tokens = Token.filter_not_expired(
-        key=request.META.get(OUTPOST_TOKEN_HEADER), intent=TokenIntents.INTENT_API
+    key = ip_override_cache_key(token_key)
+    allowed = cache.get(key, None)
+    if allowed is not None:
+        return allowed
+    token = (
+        Token.filter_not_expired(key=token_key, intent=TokenIntents.INTENT_API)
+        .select_related("user")
+        .first()
     )
-    if not tokens.exists():
+    if not token:
         LOGGER.warning("Attempted remote-ip override without token", fake_ip=fake_ip)
-        return None
-    user = tokens.first().user
-    if not user.group_attributes().get(USER_ATTRIBUTE_CAN_OVERRIDE_IP, False):
+        cache.set(key, False, timeout=CACHE_TIMEOUT_IP_OVERRIDE)
+        return False
+    allowed = token.user.group_attributes().get(USER_ATTRIBUTE_CAN_OVERRIDE_IP, False)
+    if not allowed:
         LOGGER.warning(
             "Remote-IP override: user doesn't have permission",
-            user=user,
+            user=token.user,
             fake_ip=fake_ip,
         )
+    ip_override_cache(token.user_id).set(key, allowed, timeout=CACHE_TIMEOUT_IP_OVERRIDE)
+    return allowed
+
+
+def _get_outpost_override_ip(request: HttpRequest) -> Optional[str]:
+    """Get the actual remote IP when set by an outpost. Only
+    allowed when the request is authenticated, by a user with USER_ATTRIBUTE_CAN_OVERRIDE_IP set
+    to outpost"""
+    if OUTPOST_REMOTE_IP_HEADER not in request.META or OUTPOST_TOKEN_HEADER not in request.META:
+        return None
+    fake_ip = request.META[OUTPOST_REMOTE_IP_HEADER]
+    if not _can_override_ip(request.META[OUTPOST_TOKEN_HEADER], fake_ip):
         return None
     # Update sentry scope to include correct IP
     user = Hub.current.scope._user
@@ -63,13 +113,18 @@ def _get_outpost_override_ip(request: HttpRequest) -> Optional[str]:
 
 def get_client_ip(request: Optional[HttpRequest]) -> str:
     """Attempt to get the client's IP by checking common HTTP Headers.
-    Returns none if no IP Could be found"""
+    Returns none if no IP Could be found. The result is stored on the request"""
     if not request:
         return DEFAULT_IP
-    override = _get_outpost_override_ip(request)
-    if override:
-        return override
-    return _get_client_ip_from_meta(request.META)
+    client_ip = getattr(request, CLIENT_IP_ATTRIBUTE, None)
+    if client_ip:
+        return client_ip
+    client_ip = _get_outpost_override_ip(request)
+    if not client_ip:
+        client_ip = _get_client_ip_from_meta(request.META)
+    # The IP is resolved once per request, as it's used by logging, events, policies, etc
+    setattr(request, CLIENT_IP_ATTRIBUTE, client_ip)
+    return client_ip
 
 
 def authentik_user_agent() -> str:
@@ -77,8 +132,99 @@ def authentik_user_agent() -> str:
     return f"authentik@{get_full_version()}"
 
 
+class MonitoredHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP connection pool which counts opened connections"""
+
+    def _new_conn(self):
+        COUNTER_HTTP_CONNECTIONS.inc()
+        return super()._new_conn()
+
+
+class MonitoredHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool which counts opened connections"""
+
+    def _new_conn(self):
+        COUNTER_HTTP_CONNECTIONS.inc()
+        return super()._new_conn()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTP Adapter shared by all sessions of a process, which keeps connections to each host
+    open, applies a default timeout and retries failed requests"""
+
+    timeout: float
+
+    def __init__(self):
+        self.timeout = float(CONFIG.y("http.timeout", 30))
+        self._pid = getpid()
+        super().__init__(
+            pool_connections=int(CONFIG.y("http.pool_hosts", 10)),
+            pool_maxsize=int(CONFIG.y("http.pool_connections_per_host", 10)),
+            # Only idempotent requests are retried after they've been sent,
+            # connection errors are retried for all requests
+            max_retries=Retry(
+                total=int(CONFIG.y("http.retries", 3)),
+                backoff_factor=float(CONFIG.y("http.retry_backoff", 0.5)),
+                status_forcelist=(502, 503, 504),
+                raise_on_status=False,
+            ),
+        )
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": MonitoredHTTPConnectionPool,
+            "https": MonitoredHTTPSConnectionPool,
+        }
+
+    # pylint: disable=too-many-arguments
+    def send(
+        self,
+        request: PreparedRequest,
+        stream=False,
+        timeout=None,
+        verify=True,
+        cert=None,
+        proxies=None,
+    ) -> Response:
+        if self._pid != getpid():
+            # Connections opened before forking belong to the parent process
+            self.init_poolmanager(self._pool_connections, self._pool_maxsize, self._pool_block)
+            self._pid = getpid()
+        if timeout is None:
+            timeout = self.timeout
+        start = perf_counter()
+        status = "error"
+        try:
+            response = super().send(request, stream, timeout, verify, cert, proxies)
+            status = str(response.status_code)
+            return response
+        finally:
+            HIST_HTTP_REQUEST_DURATION.labels(
+                method=request.method,
+                status=status,
+            ).observe(perf_counter() - start)
+
+
+class PooledSession(Session):
+    """Session using the adapter shared by all sessions of this process"""
+
+    def __init__(self):
+        super().__init__()
+        self.mount("http://", HTTP_ADAPTER)
+        self.mount("https://", HTTP_ADAPTER)
+
+    def close(self):
+        # The adapter is shared with other sessions, so its connections are kept open
+        pass
+
+
+HTTP_ADAPTER = PooledHTTPAdapter()
+
+
 def get_http_session() -> Session:
-    """Get a requests session with common headers"""
-    session = Session()
+    """Get a requests session with common headers. Sessions are cheap to create, as they share
+    the pooled connections of this process"""
+    session = PooledSession()
     session.headers["User-Agent"] = authentik_user_agent()
     return session
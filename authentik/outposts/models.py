@@ -30,6 +30,7 @@ from authentik.events.models import Event, EventAction
 from authentik.lib.config import CONFIG
 from authentik.lib.models import InheritanceForeignKey
 from authentik.lib.sentry import SentryIgnoredException
+from authentik.lib.utils.cache import CacheNamespace
 from authentik.lib.utils.errors import exception_to_string
 from authentik.managed.models import ManagedModel
 from authentik.outposts.controllers.k8s.utils import get_namespace
@@ -268,6 +269,11 @@ class Outpost(ManagedModel):
         """Key by which the outposts status is saved"""
         return f"outpost_{self.uuid.hex}_state"
 
+    @property
+    def state_cache(self) -> CacheNamespace:
+        """Cache namespace containing the state of all instances of this outpost"""
+        return CacheNamespace(self.state_cache_prefix)
+
     @property
     def state(self) -> list["OutpostState"]:
         """Get outpost's health status"""
@@ -421,11 +427,8 @@ class OutpostState:
     @staticmethod
     def for_outpost(outpost: Outpost) -> list["OutpostState"]:
         """Get all states for an outpost"""
-        keys = cache.keys(f"{outpost.state_cache_prefix}_*")
-        if not keys:
-            return []
         states = []
-        for key in keys:
+        for key in outpost.state_cache.keys():
             instance_uid = key.replace(f"{outpost.state_cache_prefix}_", "")
             states.append(OutpostState.for_instance_uid(outpost, instance_uid))
         return states
@@ -447,9 +450,9 @@ class OutpostState:
     def save(self, timeout=OUTPOST_HELLO_INTERVAL):
         """Save current state to cache"""
         full_key = f"{self._outpost.state_cache_prefix}_{self.uid}"
-        return cache.set(full_key, asdict(self), timeout=timeout)
+        return self._outpost.state_cache.set(full_key, asdict(self), timeout=timeout)
 
     def delete(self):
         """Manually delete from cache, used on channel disconnect"""
         full_key = f"{self._outpost.state_cache_prefix}_{self.uid}"
-        cache.delete(full_key)
+        self._outpost.state_cache.delete(full_key)
@@ -0,0 +1,201 @@
+"""authentik batch policy engine"""
+from collections import defaultdict
+from copy import copy
+from pickle import PicklingError  # nosec
+from typing import Any, Iterable, Optional, Union
+
+from django.core.cache import cache
+from django.http import HttpRequest
+from sentry_sdk.hub import Hub
+from structlog.stdlib import get_logger
+
+from authentik.core.models import User
+from authentik.policies.models import (
+    Policy,
+    PolicyBinding,
+    PolicyBindingModel,
+    PolicyDependency,
+    PolicyEngineMode,
+)
+from authentik.policies.pool import POLICY_POOL, PolicyWorkerTask
+from authentik.policies.process import PolicyProcess, cache_key, cache_result
+from authentik.policies.types import PolicyRequest, PolicyResult
+
+LOGGER = get_logger()
+
+
+class BatchEvaluation:
+    """A single policy evaluation, whose result is used by all `bindings`"""
+
+    bindings: list[tuple[PolicyBinding, PolicyRequest]]
+    task: Optional[PolicyWorkerTask]
+    result: Optional[PolicyResult]
+
+    def __init__(self):
+        self.bindings = []
+        self.task = None
+        self.result = None
+
+    def result_for(self, binding: PolicyBinding) -> PolicyResult:
+        """Get the result for `binding`, based on the result of the first binding"""
+        source, _ = self.bindings[0]
+        if binding == source:
+            return self.result
+        result = copy(self.result)
+        result.passing = self.result.passing ^ source.negate ^ binding.negate
+        result.source_binding = binding
+        return result
+
+
+class BatchPolicyEngine:
+    """Check the policies of multiple PolicyBindingModels for a single user at once.
+
+    All bindings are loaded with a single query and cached results are fetched at once.
+    Policies whose result only depends on the user are evaluated once, even when they're bound
+    to multiple objects. Evaluations run concurrently on the policy worker pool when it's
+    enabled. Results match those of a `PolicyEngine` per object."""
+
+    use_cache: bool
+    # Allow objects with no policies attached to pass
+    empty_result: bool
+    # Enabled bindings and results by primary key of each object
+    bindings: dict[Any, list[PolicyBinding]]
+    results: dict[Any, PolicyResult]
+
+    def __init__(self, pbms: Iterable[PolicyBindingModel], user: User, request: HttpRequest = None):
+        self.pbms = list(pbms)
+        self.use_cache = True
+        self.empty_result = True
+        self.bindings = {}
+        self.results = {}
+        self.__request = PolicyRequest(user)
+        if request:
+            self.__request.set_http_request(request)
+
+    def _request(self, pbm: PolicyBindingModel) -> PolicyRequest:
+        """Create a policy request for `pbm`, the HTTP request is only loaded once"""
+        request = copy(self.__request)
+        request.context = dict(self.__request.context)
+        request.obj = pbm
+        return request
+
+    def _bindings(self) -> dict[Any, list[PolicyBinding]]:
+        """Load all enabled bindings of all objects"""
+        bindings = defaultdict(list)
+        for binding in (
+            PolicyBinding.objects.filter(target__in=[pbm.pk for pbm in self.pbms], enabled=True)
+            .order_by("order")
+            .select_related("group", "user")
+            .prefetch_related("policy")
+        ):
+            if binding.policy is not None and binding.policy.__class__ == Policy:
+                raise TypeError(f"Policy '{binding.policy}' is root type")
+            bindings[binding.target_id].append(binding)
+        return bindings
+
+    @staticmethod
+    def _is_decided(mode: PolicyEngineMode, results: Iterable[PolicyResult]) -> bool:
+        """Check if `results` already decide the outcome for `mode`"""
+        if mode == PolicyEngineMode.MODE_ALL:
+            return any(not x.passing for x in results)
+        return any(x.passing for x in results)
+
+    @staticmethod
+    def _evaluation_key(binding: PolicyBinding) -> tuple[str, Any]:
+        """Bindings whose results only depend on the user share a single evaluation"""
+        if binding.dependency != PolicyDependency.USER:
+            return ("binding", binding.pk)
+        if binding.policy_id:
+            return ("policy", binding.policy_id)
+        if binding.group_id:
+            return ("group", binding.group_id)
+        return ("user", binding.user_id)
+
+    def _evaluate(self, evaluations: list[BatchEvaluation]):
+        """Evaluate all `evaluations`, concurrently when the policy worker pool is enabled"""
+        for evaluation in evaluations:
+            binding, request = evaluation.bindings[0]
+            if not POLICY_POOL.enabled:
+                continue
+            try:
+                evaluation.task = POLICY_POOL.submit(binding, request)
+            except (PicklingError, TypeError, AttributeError) as exc:
+                LOGGER.debug("P_ENG(batch): Failed to submit to pool", binding=binding, exc=exc)
+        for evaluation in evaluations:
+            binding, request = evaluation.bindings[0]
+            if evaluation.task:
+                evaluation.result = evaluation.task.wait()
+                continue
+            try:
+                evaluation.result = PolicyProcess(binding, request, None).profiling_wrapper()
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.warning(str(exc))
+                evaluation.result = PolicyResult(False, str(exc))
+
+    def _result(self, pbm: PolicyBindingModel, results: list[PolicyResult]) -> PolicyResult:
+        """Combine the results of all bindings of `pbm`, like `PolicyEngine.result`"""
+        if len(results) == 0:
+            return PolicyResult(self.empty_result)
+        passing = False
+        if pbm.policy_engine_mode == PolicyEngineMode.MODE_ALL:
+            passing = all(x.passing for x in results)
+        if pbm.policy_engine_mode == PolicyEngineMode.MODE_ANY:
+            passing = any(x.passing for x in results)
+        result = PolicyResult(passing)
+        result.source_results = results
+        result.messages = tuple(y for x in results for y in x.messages)
+        return result
+
+    def build(self) -> "BatchPolicyEngine":
+        """Evaluate the policies of all objects"""
+        with Hub.current.start_span(op="authentik.policy.engine.batch"):
+            self.bindings = bindings = self._bindings()
+            requests = {pbm.pk: self._request(pbm) for pbm in self.pbms}
+            keys = {
+                binding.pk: cache_key(binding, requests[pbm.pk])
+                for pbm in self.pbms
+                for binding in bindings[pbm.pk]
+            }
+            cached = {}
+            if self.use_cache:
+                cached = cache.get_many([key for key in keys.values() if key])
+            # Results of each object's bindings, in binding order
+            results: dict[Any, list[Union[PolicyResult, BatchEvaluation]]] = {}
+            evaluations: dict[tuple[str, Any], BatchEvaluation] = {}
+            for pbm in self.pbms:
+                cached_results = [
+                    cached[keys[binding.pk]]
+                    for binding in bindings[pbm.pk]
+                    if keys[binding.pk] in cached
+                ]
+                if self._is_decided(pbm.policy_engine_mode, cached_results):
+                    results[pbm.pk] = cached_results
+                    continue
+                results[pbm.pk] = []
+                for binding in bindings[pbm.pk]:
+                    if keys[binding.pk] in cached:
+                        results[pbm.pk].append(cached[keys[binding.pk]])
+                        continue
+                    evaluation = evaluations.setdefault(
+                        self._evaluation_key(binding), BatchEvaluation()
+                    )
+                    evaluation.bindings.append((binding, requests[pbm.pk]))
+                    results[pbm.pk].append(evaluation)
+            LOGGER.debug(
+                "P_ENG(batch): Evaluating policies",
+                objects=len(self.pbms),
+                cached=len(cached),
+                evaluations=len(evaluations),
+            )
+            self._evaluate(list(evaluations.values()))
+            for evaluation in evaluations.values():
+                for binding, request in evaluation.bindings[1:]:
+                    if not request.debug:
+                        cache_result(binding, request, evaluation.result_for(binding))
+            for pbm in self.pbms:
+                pbm_results = [
+                    result.result_for(binding) if isinstance(result, BatchEvaluation) else result
+                    for binding, result in zip(bindings[pbm.pk], results[pbm.pk])
+                ]
+                self.results[pbm.pk] = self._result(pbm, pbm_results)
+            return self
@@ -7,7 +7,7 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework.serializers import BaseSerializer
 from structlog.stdlib import get_logger
 
-from authentik.policies.models import Policy
+from authentik.policies.models import Policy, PolicyDependency
 from authentik.policies.types import PolicyRequest, PolicyResult
 
 LOGGER = get_logger()
@@ -23,6 +23,8 @@ class DummyPolicy(Policy):
     wait_min = models.IntegerField(default=5)
     wait_max = models.IntegerField(default=30)
 
+    dependency = PolicyDependency.USER
+
     @property
     def serializer(self) -> BaseSerializer:
         from authentik.policies.dummy.api import DummyPolicySerializer
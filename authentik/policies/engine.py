@@ -1,7 +1,8 @@
 """authentik policy engine"""
 from multiprocessing import Pipe, current_process
-from multiprocessing.connection import Connection
-from typing import Iterator, Optional
+from multiprocessing.connection import Connection, wait
+from pickle import PicklingError  # nosec
+from typing import Iterator, Optional, Union
 
 from django.core.cache import cache
 from django.http import HttpRequest
@@ -12,6 +13,7 @@ from structlog.stdlib import BoundLogger, get_logger
 
 from authentik.core.models import User
 from authentik.policies.models import Policy, PolicyBinding, PolicyBindingModel, PolicyEngineMode
+from authentik.policies.pool import POLICY_POOL, PolicyWorkerTask
 from authentik.policies.process import PolicyProcess, cache_key
 from authentik.policies.types import PolicyRequest, PolicyResult
 
@@ -41,17 +43,37 @@ class PolicyProcessInfo:
         self.binding = binding
         self.result = None
 
+    def wait(self) -> PolicyResult:
+        """Wait for the process to finish and receive its result"""
+        if self.process.is_alive():
+            self.process.join(self.binding.timeout)
+        # Only call .recv() if no result is saved, otherwise we just deadlock here
+        if not self.result:
+            self.result = self.connection.recv()
+        return self.result
+
+    def cancel(self):
+        """Terminate the process if it's still running"""
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
 
 class PolicyEngine:
     """Orchestrate policy checking, launch tasks and return result"""
 
     use_cache: bool
+    # Stop evaluating as soon as the result is decided by `mode`. Only the messages
+    # of the policies evaluated until then are returned.
+    short_circuit: bool
     request: PolicyRequest
 
     logger: BoundLogger
     mode: PolicyEngineMode
     # Allow objects with no policies attached to pass
     empty_result: bool
+    # Enabled bindings of the object in order, when they were already loaded
+    bindings: Optional[list[PolicyBinding]]
 
     def __init__(self, pbm: PolicyBindingModel, user: User, request: HttpRequest = None):
         self.logger = get_logger().bind()
@@ -67,12 +89,16 @@ class PolicyEngine:
         if request:
             self.request.set_http_request(request)
         self.__cached_policies: list[PolicyResult] = []
-        self.__processes: list[PolicyProcessInfo] = []
+        self.__processes: list[Union[PolicyProcessInfo, PolicyWorkerTask]] = []
         self.use_cache = True
+        self.short_circuit = False
+        self.bindings = None
         self.__expected_result_count = 0
 
     def _iter_bindings(self) -> Iterator[PolicyBinding]:
         """Make sure all Policies are their respective classes"""
+        if self.bindings is not None:
+            return iter(self.bindings)
         return (
             PolicyBinding.objects.filter(target=self.__pbm, enabled=True)
             .order_by("order")
@@ -85,6 +111,43 @@ class PolicyEngine:
         if binding.policy is not None and binding.policy.__class__ == Policy:
             raise TypeError(f"Policy '{binding.policy}' is root type")
 
+    def _is_decided(self) -> bool:
+        """Check if the results collected so far already decide the outcome for `self.mode`"""
+        results = self.__cached_policies + [x.result for x in self.__processes if x.result]
+        if self.mode == PolicyEngineMode.MODE_ALL:
+            return any(not x.passing for x in results)
+        if self.mode == PolicyEngineMode.MODE_ANY:
+            return any(x.passing for x in results)
+        return False
+
+    def _collect(self):
+        """Receive results in the order processes finish. When short-circuiting, cancel the
+        remaining processes once the outcome is decided."""
+        pending = {x.connection: x for x in self.__processes if not x.result}
+        while pending:
+            if self.short_circuit and self._is_decided():
+                for proc_info in pending.values():
+                    self.logger.debug("P_ENG: Cancelling policy", binding=proc_info.binding)
+                    proc_info.cancel()
+                    self.__processes.remove(proc_info)
+                    self.__expected_result_count -= 1
+                return
+            # Don't wait longer than pool tasks allow, so tasks whose result is never
+            # delivered fail instead of blocking the engine
+            timeout = min(
+                (x.remaining for x in pending.values() if isinstance(x, PolicyWorkerTask)),
+                default=None,
+            )
+            ready = wait(list(pending.keys()), timeout)
+            if not ready:
+                ready = [
+                    connection
+                    for connection, x in pending.items()
+                    if isinstance(x, PolicyWorkerTask) and x.remaining <= 0
+                ]
+            for connection in ready:
+                pending.pop(connection).wait()
+
     def build(self) -> "PolicyEngine":
         """Build wrapper which monitors performance"""
         with Hub.current.start_span(
@@ -99,11 +162,14 @@ class PolicyEngine:
             span.set_data("pbm", self.__pbm)
             span.set_data("request", self.request)
             for binding in self._iter_bindings():
+                if self.short_circuit and self._is_decided():
+                    self.logger.debug("P_ENG: Result decided, skipping remaining policies")
+                    break
                 self.__expected_result_count += 1
 
                 self._check_policy_type(binding)
                 key = cache_key(binding, self.request)
-                cached_policy = cache.get(key, None)
+                cached_policy = cache.get(key, None) if key else None
                 if cached_policy and self.use_cache:
                     self.logger.debug(
                         "P_ENG: Taking result from cache",
@@ -114,24 +180,29 @@ class PolicyEngine:
                     self.__cached_policies.append(cached_policy)
                     continue
                 self.logger.debug("P_ENG: Evaluating policy", binding=binding, request=self.request)
+                if POLICY_POOL.enabled:
+                    try:
+                        self.__processes.append(POLICY_POOL.submit(binding, self.request))
+                        continue
+                    except (PicklingError, TypeError, AttributeError) as exc:
+                        self.logger.debug(
+                            "P_ENG: Failed to submit to pool, evaluating inline",
+                            binding=binding,
+                            exc=exc,
+                        )
                 our_end, task_end = Pipe(False)
                 task = PolicyProcess(binding, self.request, task_end)
                 task.daemon = False
                 self.logger.debug("P_ENG: Starting Process", binding=binding, request=self.request)
+                proc_info = PolicyProcessInfo(process=task, connection=our_end, binding=binding)
+                self.__processes.append(proc_info)
                 if not CURRENT_PROCESS._config.get("daemon"):
                     task.run()
+                    proc_info.wait()
                 else:
                     task.start()
-                self.__processes.append(
-                    PolicyProcessInfo(process=task, connection=our_end, binding=binding)
-                )
             # If all policies are cached, we have an empty list here.
-            for proc_info in self.__processes:
-                if proc_info.process.is_alive():
-                    proc_info.process.join(proc_info.binding.timeout)
-                # Only call .recv() if no result is saved, otherwise we just deadlock here
-                if not proc_info.result:
-                    proc_info.result = proc_info.connection.recv()
+            self._collect()
             return self
 
     @property
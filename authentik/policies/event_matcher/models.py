@@ -5,7 +5,7 @@ from django.utils.translation import gettext as _
 from rest_framework.serializers import BaseSerializer
 
 from authentik.events.models import Event, EventAction
-from authentik.policies.models import Policy
+from authentik.policies.models import Policy, PolicyDependency
 from authentik.policies.types import PolicyRequest, PolicyResult
 
 
@@ -53,6 +53,8 @@ class EventMatcherPolicy(Policy):
         ),
     )
 
+    dependency = PolicyDependency.CONTEXT
+
     @property
     def serializer(self) -> BaseSerializer:
         from authentik.policies.event_matcher.api import EventMatcherPolicySerializer
@@ -0,0 +1,118 @@
+"""authentik HIBP lookups"""
+from mmap import ACCESS_READ, mmap
+from os import replace, stat, unlink
+from struct import Struct
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+from structlog.stdlib import get_logger
+
+from authentik.lib.config import CONFIG
+from authentik.lib.utils.http import get_http_session
+
+LOGGER = get_logger()
+CACHE_TIMEOUT = int(CONFIG.y("policies.hibp.cache_timeout", 86400))
+# SHA1 digest and count of a single hash in a corpus
+RECORD = Struct(">20sI")
+
+
+def range_counts(prefix: str) -> dict[str, int]:
+    """Get the counts of all hashes starting with `prefix` from the HIBP API, keyed by the
+    remaining characters of the hash. Only `prefix` is sent to the API, and responses are cached,
+    as they're the same for all passwords whose hash starts with `prefix`."""
+    key = f"hibp_range_{prefix}"
+    counts = cache.get(key, None)
+    if counts is not None:
+        return counts
+    response = get_http_session().get(f"https://api.pwnedpasswords.com/range/{prefix}")
+    response.raise_for_status()
+    counts = {}
+    for line in response.text.splitlines():
+        suffix, _, count = line.partition(":")
+        counts[suffix.lower()] = int(count)
+    cache.set(key, counts, CACHE_TIMEOUT)
+    return counts
+
+
+class HIBPCorpus:
+    """Local copy of the HIBP password hashes, imported with the `import_hibp_corpus` command.
+    The corpus consists of fixed-size records sorted by digest, which are looked up with a binary
+    search on the memory-mapped file. The file is mapped again when it's replaced, for example
+    by an import in another container. Replaced mappings aren't closed, as other threads might
+    still be searching them, they're unmapped once they're no longer referenced."""
+
+    path: str
+    # Mapped file and the inode and modification time it was mapped at
+    _mapping: Optional[tuple[mmap, tuple[int, int]]]
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mapping = None
+
+    @property
+    def enabled(self) -> bool:
+        """Check if a corpus is configured"""
+        return self.path != ""
+
+    def _map(self) -> mmap:
+        """Map the corpus into memory, the mapping is shared with forked processes"""
+        corpus_stat = stat(self.path)
+        identity = (corpus_stat.st_ino, corpus_stat.st_mtime_ns)
+        mapping = self._mapping
+        if mapping is None or mapping[1] != identity:
+            with open(self.path, "rb") as corpus:
+                mapping = (mmap(corpus.fileno(), 0, access=ACCESS_READ), identity)
+            self._mapping = mapping
+        return mapping[0]
+
+    def count(self, pw_hash: str) -> int:
+        """Get the count of the hex encoded SHA1 `pw_hash`, 0 if it's not in the corpus"""
+        data = self._map()
+        digest = bytes.fromhex(pw_hash)
+        low, high = 0, len(data) // RECORD.size
+        while low < high:
+            middle = (low + high) // 2
+            record_digest, count = RECORD.unpack_from(data, middle * RECORD.size)
+            if record_digest < digest:
+                low = middle + 1
+            elif record_digest > digest:
+                high = middle
+            else:
+                return count
+        return 0
+
+    def load(self, lines: Iterable[str]) -> int:
+        """Replace the corpus with `lines` in the `HASH:COUNT` format of the HIBP downloads,
+        which must be ordered by hash. Returns the amount of imported hashes."""
+        amount = 0
+        previous = b""
+        try:
+            with open(f"{self.path}.tmp", "wb") as corpus:
+                for line in lines:
+                    line = line.strip()
+                    if line == "":
+                        continue
+                    pw_hash, _, count = line.partition(":")
+                    digest = bytes.fromhex(pw_hash)
+                    if digest <= previous:
+                        raise ValueError(f"Hashes are not ordered by hash, at '{pw_hash}'")
+                    corpus.write(RECORD.pack(digest, int(count)))
+                    previous = digest
+                    amount += 1
+        except (ValueError, OSError):
+            unlink(f"{self.path}.tmp")
+            raise
+        replace(f"{self.path}.tmp", self.path)
+        self._mapping = None
+        return amount
+
+
+CORPUS = HIBPCorpus(CONFIG.y("policies.hibp.corpus", ""))
+
+
+def pwned_count(pw_hash: str) -> int:
+    """Get how often the hex encoded SHA1 `pw_hash` was found in breaches, using the local corpus
+    when it's configured and the HIBP API otherwise"""
+    if CORPUS.enabled:
+        return CORPUS.count(pw_hash)
+    return range_counts(pw_hash[:5]).get(pw_hash[5:], 0)
@@ -0,0 +1,22 @@
+"""Import HIBP password hashes from commandline"""
+from django.core.management.base import BaseCommand, CommandError, no_translations
+
+from authentik.policies.hibp.lookup import CORPUS
+
+
+class Command(BaseCommand):  # pragma: no cover
+    """Import HIBP password hashes from commandline"""
+
+    help = "Import the SHA1 password hashes downloaded from HaveIBeenPwned, ordered by hash."
+
+    @no_translations
+    def handle(self, *args, **options):
+        """Convert the downloaded hashes into the configured corpus"""
+        if not CORPUS.enabled:
+            raise CommandError("No corpus configured, set AUTHENTIK_POLICIES__HIBP__CORPUS")
+        with open(options["hashes"], "r", encoding="utf8") as hashes:
+            amount = CORPUS.load(hashes)
+        self.stdout.write(f"Imported {amount} hashes into {CORPUS.path}")
+
+    def add_arguments(self, parser):
+        parser.add_argument("hashes", type=str)
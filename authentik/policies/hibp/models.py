@@ -6,8 +6,8 @@ from django.utils.translation import gettext as _
 from rest_framework.serializers import BaseSerializer
 from structlog.stdlib import get_logger
 
-from authentik.lib.utils.http import get_http_session
-from authentik.policies.models import Policy, PolicyResult
+from authentik.policies.hibp.lookup import pwned_count
+from authentik.policies.models import Policy, PolicyDependency, PolicyResult
 from authentik.policies.types import PolicyRequest
 
 LOGGER = get_logger()
@@ -15,7 +15,7 @@ LOGGER = get_logger()
 
 class HaveIBeenPwendPolicy(Policy):
     """Check if password is on HaveIBeenPwned's list by uploading the first
-    5 characters of the SHA1 Hash."""
+    5 characters of the SHA1 Hash, or by checking a local copy of the list."""
 
     password_field = models.TextField(
         default="password",
@@ -24,6 +24,8 @@ class HaveIBeenPwendPolicy(Policy):
 
     allowed_count = models.IntegerField(default=0)
 
+    dependency = PolicyDependency.CONTEXT
+
     @property
     def serializer(self) -> BaseSerializer:
         from authentik.policies.hibp.api import HaveIBeenPwendPolicySerializer
@@ -36,7 +38,8 @@ class HaveIBeenPwendPolicy(Policy):
 
     def passes(self, request: PolicyRequest) -> PolicyResult:
         """Check if password is in HIBP DB. Hashes given Password with SHA1, uses the first 5
-        characters of Password in request and checks if full hash is in response. Returns 0
+        characters of Password in request and checks if full hash is in response, or checks the
+        full hash against the local corpus if one is configured. Returns 0
         if Password is not in result otherwise the count of how many times it was used."""
         if self.password_field not in request.context:
             LOGGER.warning(
@@ -48,13 +51,7 @@ class HaveIBeenPwendPolicy(Policy):
         password = str(request.context[self.password_field])
 
         pw_hash = sha1(password.encode("utf-8")).hexdigest()  # nosec
-        url = f"https://api.pwnedpasswords.com/range/{pw_hash[:5]}"
-        result = get_http_session().get(url).text
-        final_count = 0
-        for line in result.split("\r\n"):
-            full_hash, count = line.split(":")
-            if pw_hash[5:] == full_hash.lower():
-                final_count = int(count)
+        final_count = pwned_count(pw_hash)
         LOGGER.debug("got hibp result", count=final_count, hash=pw_hash[:5])
         if final_count > self.allowed_count:
             message = _("Password exists on %(count)d online lists." % {"count": final_count})
@@ -1,8 +1,16 @@
 """HIBP Policy tests"""
+from hashlib import sha1
+from os import path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.test import TestCase
 from guardian.shortcuts import get_anonymous_user
+from requests_mock import Mocker
 
 from authentik.lib.generators import generate_key
+from authentik.policies.hibp.lookup import HIBPCorpus
 from authentik.policies.hibp.models import HaveIBeenPwendPolicy
 from authentik.policies.types import PolicyRequest, PolicyResult
 
@@ -41,3 +49,50 @@ class TestHIBPPolicy(TestCase):
         result: PolicyResult = policy.passes(request)
         self.assertTrue(result.passing)
         self.assertEqual(result.messages, tuple())
+
+    def test_range_cache(self):
+        """Test API responses being cached by hash prefix"""
+        policy = HaveIBeenPwendPolicy.objects.create(
+            name="test_range_cache",
+        )
+        request = PolicyRequest(get_anonymous_user())
+        request.context["password"] = "password"  # nosec
+        pw_hash = sha1(b"password").hexdigest().upper()  # nosec
+        cache.delete(f"hibp_range_{pw_hash[:5].lower()}")
+        with Mocker() as mocker:
+            mocker.get(
+                f"https://api.pwnedpasswords.com/range/{pw_hash[:5].lower()}",
+                text=f"0018A45C4D1DEF81644B54AB7F969B88D65:1\r\n{pw_hash[5:]}:3\r\n",
+            )
+            self.assertFalse(policy.passes(request).passing)
+            self.assertFalse(policy.passes(request).passing)
+            self.assertEqual(mocker.call_count, 1)
+
+    def test_corpus(self):
+        """Test passwords being checked against a local corpus"""
+        policy = HaveIBeenPwendPolicy.objects.create(
+            name="test_corpus",
+        )
+        hashes = sorted(sha1(str(x).encode()).hexdigest().upper() for x in range(100))  # nosec
+        with TemporaryDirectory() as directory:
+            corpus = HIBPCorpus(path.join(directory, "corpus"))
+            self.assertEqual(corpus.load([f"{x}:{i + 1}\r\n" for i, x in enumerate(hashes)]), 100)
+            self.assertEqual(corpus.count(hashes[41].lower()), 42)
+            with self.assertRaises(ValueError):
+                corpus.load([f"{x}:1" for x in reversed(hashes)])
+            with self.assertRaises(ValueError):
+                corpus.load([f"{hashes[0]}:foo"])
+            self.assertFalse(path.exists(f"{corpus.path}.tmp"))
+            # Searches which are still running keep using the previous corpus
+            previous = corpus._map()
+            # Corpora imported by other processes are picked up
+            HIBPCorpus(corpus.path).load([f"{x}:1" for x in hashes])
+            self.assertEqual(corpus.count(hashes[41].lower()), 1)
+            self.assertFalse(previous.closed)
+            with patch("authentik.policies.hibp.lookup.CORPUS", corpus), Mocker() as mocker:
+                request = PolicyRequest(get_anonymous_user())
+                request.context["password"] = "42"  # nosec
+                self.assertFalse(policy.passes(request).passing)
+                request.context["password"] = generate_key()
+                self.assertTrue(policy.passes(request).passing)
+                self.assertEqual(mocker.call_count, 0)
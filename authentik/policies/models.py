@@ -1,4 +1,5 @@
 """Policy base models"""
+from enum import Enum
 from uuid import uuid4
 
 from django.db import models
@@ -25,6 +26,17 @@ class PolicyEngineMode(models.TextChoices):
     MODE_ANY = "any", _("ANY, any policy must pass")  # type: "PolicyEngineMode"
 
 
+class PolicyDependency(Enum):
+    """Inputs the result of a policy depends on, which decide how its results are cached"""
+
+    # Only the user, results are shared between all sessions of the user
+    USER = "user"
+    # The user and the HTTP request, results are cached per session
+    REQUEST = "request"
+    # The context of the request, results are not cached
+    CONTEXT = "context"
+
+
 class PolicyBindingModel(models.Model):
     """Base Model for objects that have policies applied to them."""
 
@@ -107,6 +119,14 @@ class PolicyBinding(SerializerModel):
 
         return PolicyBindingSerializer
 
+    @property
+    def dependency(self) -> PolicyDependency:
+        """Inputs the result of this binding depends on, group and user bindings
+        only depend on the user"""
+        if self.policy:
+            return self.policy.dependency
+        return PolicyDependency.USER
+
     @property
     def target_type(self) -> str:
         """Get the target type this binding is applied to"""
@@ -163,6 +183,10 @@ class Policy(SerializerModel, CreatedUpdatedModel):
 
     objects = InheritanceAutoManager()
 
+    # Inputs the result of this policy depends on, policies which only depend
+    # on the user or on the context of a request should override this
+    dependency = PolicyDependency.REQUEST
+
     @property
     def component(self) -> str:
         """Return component used to edit this object"""
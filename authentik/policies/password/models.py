@@ -6,7 +6,7 @@ from django.utils.translation import gettext as _
 from rest_framework.serializers import BaseSerializer
 from structlog.stdlib import get_logger
 
-from authentik.policies.models import Policy
+from authentik.policies.models import Policy, PolicyDependency
 from authentik.policies.types import PolicyRequest, PolicyResult
 from authentik.stages.prompt.stage import PLAN_CONTEXT_PROMPT
 
@@ -32,6 +32,8 @@ class PasswordPolicy(Policy):
     symbol_charset = models.TextField(default=r"!\"#$%&'()*+,-./:;<=>?@[\]^_`{|}~ ")
     error_message = models.TextField()
 
+    dependency = PolicyDependency.CONTEXT
+
     @property
     def serializer(self) -> BaseSerializer:
         from authentik.policies.password.api import PasswordPolicySerializer
@@ -0,0 +1,321 @@
+"""authentik policy worker pool"""
+from copy import copy
+from importlib import import_module
+from multiprocessing import Pipe
+from multiprocessing.connection import Connection, wait
+from os import getpid
+from pickle import dumps, loads  # nosec
+from threading import Lock, Thread
+from time import monotonic
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest
+from prometheus_client import Gauge
+from structlog.stdlib import get_logger
+
+from authentik.lib.config import CONFIG
+from authentik.lib.utils.http import CLIENT_IP_ATTRIBUTE
+from authentik.policies.models import PolicyBinding
+from authentik.policies.process import PROCESS_CLASS, PolicyProcess
+from authentik.policies.types import PolicyRequest, PolicyResult
+
+LOGGER = get_logger()
+GAUGE_POLICY_POOL_QUEUE = Gauge(
+    "authentik_policies_pool_queue_depth",
+    "Policy evaluations waiting for a free worker",
+)
+GAUGE_POLICY_POOL_UTILISATION = Gauge(
+    "authentik_policies_pool_utilisation",
+    "Ratio of policy workers currently evaluating a policy",
+)
+# Seconds to wait for a result in addition to the binding's timeout, after which the pool
+# is assumed to have failed to deliver it
+POOL_WAIT_MARGIN = 5
+
+
+class PolicyWorker(PROCESS_CLASS):
+    """Long-lived process which evaluates bindings received over a Pipe"""
+
+    connection: Connection
+    evaluations: int
+
+    def __init__(self, connection: Connection):
+        super().__init__(daemon=True)
+        self.connection = connection
+        self.evaluations = 0
+
+    def _detach_database(self):
+        """Don't share the parent's database connections. References to the inherited
+        connections are kept, so they're not closed (and terminated server-side) on
+        garbage collection."""
+        # pylint: disable=attribute-defined-outside-init
+        self._inherited_connections = []
+        for conn in connections.all():
+            self._inherited_connections.append(conn.connection)
+            conn.connection = None
+
+    def run(self):  # pragma: no cover
+        """Evaluate bindings until an empty message is received or the pipe is closed"""
+        self._detach_database()
+        # Daemonic processes can't have children, so nested engines evaluate inline
+        POLICY_POOL.size = 0
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        while True:
+            try:
+                message = self.connection.recv_bytes()
+            except (EOFError, OSError):
+                return
+            if not message:
+                return
+            binding, request, session_key = loads(message)  # nosec
+            if request.http_request and session_key:
+                request.http_request.session = session_store(session_key)
+            PolicyProcess(binding, request, self.connection).run()
+
+
+class PolicyWorkerTask:
+    """Handle for a single binding evaluation scheduled on the pool. `connection` becomes
+    readable once the result is available, so it can be used with `multiprocessing.connection.wait`
+    like the connection of a `PolicyProcess`."""
+
+    pool: "PolicyWorkerPool"
+    binding: PolicyBinding
+    payload: bytes
+    connection: Connection
+    result: Optional[PolicyResult]
+    worker: Optional[PolicyWorker]
+    deadline: Optional[float]
+    expires: float
+
+    def __init__(self, pool: "PolicyWorkerPool", binding: PolicyBinding, payload: bytes):
+        self.pool = pool
+        self.binding = binding
+        self.payload = payload
+        self.result = None
+        self.worker = None
+        self.deadline = None
+        self.expires = monotonic() + binding.timeout + POOL_WAIT_MARGIN
+        self.connection, self._notify = Pipe(False)
+
+    def set_result(self, result: PolicyResult):
+        """Save result and wake up the waiting engine"""
+        self.result = result
+        self._notify.send_bytes(b"")
+
+    @property
+    def remaining(self) -> float:
+        """Seconds until waiting for this task's result is given up"""
+        return max(self.expires - monotonic(), 0)
+
+    def wait(self) -> PolicyResult:
+        """Wait for the result, the pool enforces the binding's timeout. Tasks whose result
+        isn't delivered within the timeout and a margin are cancelled and fail."""
+        if self.result:
+            return self.result
+        if self.connection.poll(self.remaining):
+            self.connection.recv_bytes()
+            return self.result
+        LOGGER.warning("P_POOL: No result received from pool", binding=self.binding)
+        self.cancel()
+        self.result = PolicyResult(False, "Policy timed out")
+        return self.result
+
+    def cancel(self):
+        """Remove this task from the queue if it hasn't been dispatched yet. Tasks which
+        are already running are finished, their result is cached but otherwise discarded."""
+        self.pool.cancel(self)
+
+
+def _detach_http_request(request: HttpRequest) -> HttpRequest:
+    """Create a copy of `request` which can be pickled, containing the parts
+    policies commonly use. The session is re-attached by its key in the worker."""
+    detached = HttpRequest()
+    detached.method = request.method
+    detached.path = request.path
+    detached.path_info = request.path_info
+    detached.META = {
+        key: value
+        for key, value in request.META.items()
+        if isinstance(value, (str, int, float, bool))
+    }
+    detached.GET = request.GET.copy()
+    detached.COOKIES = request.COOKIES.copy()
+    for attr in ["user", "tenant", CLIENT_IP_ATTRIBUTE]:
+        if hasattr(request, attr):
+            setattr(detached, attr, getattr(request, attr))
+    return detached
+
+
+class PolicyWorkerPool:
+    """Bounded pool of pre-forked policy workers. Evaluations are queued and dispatched
+    to idle workers by a background thread, which also enforces binding timeouts
+    and recycles workers after a configured amount of evaluations."""
+
+    size: int
+    max_tasks: int
+
+    def __init__(self, size: int, max_tasks: int):
+        self.size = size
+        self.max_tasks = max_tasks
+        self._pid = None
+        self._start_lock = Lock()
+
+    def _start(self):
+        """Start the dispatcher thread, called on first use and after this process was forked"""
+        # pylint: disable=attribute-defined-outside-init
+        self._pid = getpid()
+        self._lock = Lock()
+        self._queue: list[PolicyWorkerTask] = []
+        self._idle: list[PolicyWorker] = []
+        self._busy: dict[Connection, PolicyWorkerTask] = {}
+        self._wakeup_recv, self._wakeup_send = Pipe(False)
+        self._thread = Thread(target=self._dispatch_loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def enabled(self) -> bool:
+        """Check if the pool should be used"""
+        return self.size > 0
+
+    def submit(self, binding: PolicyBinding, request: PolicyRequest) -> PolicyWorkerTask:
+        """Queue `binding` for evaluation. Raises an exception when
+        `request` cannot be sent to a worker."""
+        session_key = None
+        payload = copy(request)
+        if request.http_request:
+            if hasattr(request.http_request, "session"):
+                session_key = request.http_request.session.session_key
+            payload.http_request = _detach_http_request(request.http_request)
+        task = PolicyWorkerTask(self, binding, dumps((binding, payload, session_key)))
+        with self._start_lock:
+            if self._pid != getpid():
+                self._start()
+        with self._lock:
+            self._queue.append(task)
+            self._update_metrics()
+        self._wakeup_send.send_bytes(b"")
+        return task
+
+    def cancel(self, task: PolicyWorkerTask):
+        """Remove `task` from the queue if it hasn't been dispatched to a worker yet"""
+        with self._lock:
+            if task in self._queue:
+                self._queue.remove(task)
+                self._update_metrics()
+
+    def _update_metrics(self):
+        """Update prometheus gauges, must be called with the lock held"""
+        GAUGE_POLICY_POOL_QUEUE.set(len(self._queue))
+        GAUGE_POLICY_POOL_UTILISATION.set(len(self._busy) / self.size)
+
+    def _spawn(self) -> PolicyWorker:
+        """Start a new worker"""
+        our_end, worker_end = Pipe()
+        worker = PolicyWorker(worker_end)
+        worker.start()
+        worker_end.close()
+        worker.connection = our_end
+        LOGGER.debug("P_POOL: Started worker", pid=worker.pid)
+        return worker
+
+    def _stop(self, worker: PolicyWorker, kill: bool = False):
+        """Stop a worker, either gracefully by sending an empty message or by killing it"""
+        if not kill:
+            try:
+                worker.connection.send_bytes(b"")
+            except OSError:
+                kill = True
+        worker.connection.close()
+        if kill:
+            worker.kill()
+        worker.join()
+        LOGGER.debug("P_POOL: Stopped worker", pid=worker.pid, evaluations=worker.evaluations)
+
+    def _finish(self, task: PolicyWorkerTask, result: PolicyResult, healthy: bool = True):
+        """Return a task's worker to the pool (or recycle it) and hand out the result"""
+        worker = task.worker
+        del self._busy[worker.connection]
+        worker.evaluations += 1
+        if healthy and worker.evaluations < self.max_tasks:
+            self._idle.append(worker)
+        else:
+            self._stop(worker, kill=not healthy)
+        task.set_result(result)
+
+    def _assign(self):
+        """Assign queued tasks to idle workers, starting new ones up to the pool size"""
+        while self._queue and (self._idle or len(self._busy) < self.size):
+            task = self._queue.pop(0)
+            try:
+                worker = self._idle.pop() if self._idle else self._spawn()
+            except OSError as exc:
+                LOGGER.warning("P_POOL: Failed to start worker", exc=exc)
+                task.set_result(PolicyResult(False, str(exc)))
+                continue
+            task.worker = worker
+            task.deadline = monotonic() + task.binding.timeout
+            self._busy[worker.connection] = task
+            try:
+                worker.connection.send_bytes(task.payload)
+            except OSError as exc:
+                self._finish(task, PolicyResult(False, str(exc)), healthy=False)
+
+    def _expire(self):
+        """Fail tasks which exceeded their binding's timeout and kill their workers"""
+        now = monotonic()
+        for task in list(self._busy.values()):
+            if task.deadline <= now:
+                LOGGER.warning("P_POOL: Policy timed out", binding=task.binding)
+                self._finish(task, PolicyResult(False, "Policy timed out"), healthy=False)
+
+    def _fail_all(self, result: PolicyResult):
+        """Fail all queued and running tasks, and kill the workers of running tasks"""
+        with self._lock:
+            for task in self._queue:
+                task.set_result(result)
+            self._queue.clear()
+            for task in list(self._busy.values()):
+                self._finish(task, result, healthy=False)
+            self._update_metrics()
+
+    def _dispatch(self):
+        """Dispatch queued tasks, and wait until a result is received, a task times out
+        or a new task is submitted"""
+        with self._lock:
+            self._assign()
+            self._update_metrics()
+            waiting_on = list(self._busy.keys())
+            deadlines = [task.deadline for task in self._busy.values()]
+        timeout = max(min(deadlines) - monotonic(), 0) if deadlines else None
+        for conn in wait(waiting_on + [self._wakeup_recv], timeout):
+            if conn is self._wakeup_recv:
+                self._wakeup_recv.recv_bytes()
+                continue
+            with self._lock:
+                task = self._busy.get(conn)
+                if not task:
+                    continue
+                try:
+                    self._finish(task, conn.recv())
+                except (EOFError, OSError) as exc:
+                    self._finish(task, PolicyResult(False, str(exc)), healthy=False)
+        with self._lock:
+            self._expire()
+
+    def _dispatch_loop(self):  # pragma: no cover
+        """Background thread dispatching tasks and collecting results. Unexpected errors
+        fail all pending tasks instead of leaving their engines waiting."""
+        while True:
+            try:
+                self._dispatch()
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.warning("P_POOL: Failed to dispatch tasks", exc=exc)
+                self._fail_all(PolicyResult(False, str(exc)))
+
+
+POLICY_POOL = PolicyWorkerPool(
+    int(CONFIG.y("policies.pool_size", 0)),
+    int(CONFIG.y("policies.pool_max_tasks", 100)),
+)
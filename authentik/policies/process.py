@@ -3,7 +3,6 @@ from multiprocessing import get_context
 from multiprocessing.connection import Connection
 from typing import Optional
 
-from django.core.cache import cache
 from prometheus_client import Histogram
 from sentry_sdk.hub import Hub
 from sentry_sdk.tracing import Span
@@ -11,15 +10,18 @@ from structlog.stdlib import get_logger
 
 from authentik.events.models import Event, EventAction
 from authentik.lib.config import CONFIG
+from authentik.lib.utils.cache import CacheNamespace
 from authentik.lib.utils.errors import exception_to_string
 from authentik.policies.exceptions import PolicyException
-from authentik.policies.models import PolicyBinding
+from authentik.policies.models import PolicyBinding, PolicyDependency
 from authentik.policies.types import PolicyRequest, PolicyResult
 
 LOGGER = get_logger()
 
 FORK_CTX = get_context("fork")
 CACHE_TIMEOUT = int(CONFIG.y("redis.cache_timeout_policies"))
+CACHE_TIMEOUT_USER = int(CONFIG.y("redis.cache_timeout_policies_user", 3600))
+POLICY_CACHE = CacheNamespace("policy")
 PROCESS_CLASS = FORK_CTX.Process
 HIST_POLICIES_EXECUTION_TIME = Histogram(
     "authentik_policies_execution_time",
@@ -35,16 +37,48 @@ HIST_POLICIES_EXECUTION_TIME = Histogram(
 )
 
 
-def cache_key(binding: PolicyBinding, request: PolicyRequest) -> str:
-    """Generate Cache key for policy"""
+def cache_key(binding: PolicyBinding, request: PolicyRequest) -> Optional[str]:
+    """Generate Cache key for policy, based on the inputs the binding's result depends on.
+    Returns None if the result can't be cached."""
+    dependency = binding.dependency
+    if dependency == PolicyDependency.CONTEXT:
+        return None
     prefix = f"policy_{binding.policy_binding_uuid.hex}_"
-    if request.http_request and hasattr(request.http_request, "session"):
+    if (
+        dependency == PolicyDependency.REQUEST
+        and request.http_request
+        and hasattr(request.http_request, "session")
+    ):
         prefix += f"_{request.http_request.session.session_key}"
     if request.user:
         prefix += f"#{request.user.pk}"
     return prefix
 
 
+def policy_cache(binding: PolicyBinding) -> CacheNamespace:
+    """Cache namespace containing all cached results of `binding`"""
+    return POLICY_CACHE.child(binding.policy_binding_uuid.hex)
+
+
+def user_policy_cache(user_pk: int) -> CacheNamespace:
+    """Cache namespace containing all cached results for a user"""
+    return POLICY_CACHE.child(f"user_{user_pk}")
+
+
+def cache_result(binding: PolicyBinding, request: PolicyRequest, result: PolicyResult):
+    """Cache the result of `binding`, results which only depend on the user
+    are kept longer, as they're invalidated when the user changes"""
+    key = cache_key(binding, request)
+    if not key:
+        return
+    timeout = CACHE_TIMEOUT
+    if binding.dependency == PolicyDependency.USER:
+        timeout = CACHE_TIMEOUT_USER
+    policy_cache(binding).set(key, result, timeout)
+    if request.user:
+        user_policy_cache(request.user.pk).add(key, timeout)
+
+
 class PolicyProcess(PROCESS_CLASS):
     """Evaluate a single policy within a separate process"""
 
@@ -115,8 +149,7 @@ class PolicyProcess(PROCESS_CLASS):
             policy_result = PolicyResult(False, str(src_exc))
         policy_result.source_binding = self.binding
         if not self.request.debug:
-            key = cache_key(self.binding, self.request)
-            cache.set(key, policy_result, CACHE_TIMEOUT)
+            cache_result(self.binding, self.request, policy_result)
         LOGGER.debug(
             "P_ENG(proc): finished and cached ",
             policy=self.binding.policy,
@@ -9,12 +9,14 @@ from rest_framework.serializers import BaseSerializer
 from structlog import get_logger
 
 from authentik.lib.models import SerializerModel
+from authentik.lib.utils.cache import CacheNamespace
 from authentik.lib.utils.http import get_client_ip
 from authentik.policies.models import Policy
 from authentik.policies.types import PolicyRequest, PolicyResult
 
 LOGGER = get_logger()
 CACHE_KEY_PREFIX = "goauthentik.io/policies/reputation/scores/"
+REPUTATION_CACHE = CacheNamespace("reputation")
 
 
 class ReputationPolicy(Policy):
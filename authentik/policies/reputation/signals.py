@@ -7,7 +7,7 @@ from structlog.stdlib import get_logger
 
 from authentik.lib.config import CONFIG
 from authentik.lib.utils.http import get_client_ip
-from authentik.policies.reputation.models import CACHE_KEY_PREFIX
+from authentik.policies.reputation.models import CACHE_KEY_PREFIX, REPUTATION_CACHE
 from authentik.policies.reputation.tasks import save_reputation
 from authentik.stages.identification.signals import identification_failed
 
@@ -27,7 +27,7 @@ def update_score(request: HttpRequest, identifier: str, amount: int):
             CACHE_TIMEOUT,
         )
         score["score"] += amount
-        cache.set(CACHE_KEY_PREFIX + remote_ip + identifier, score)
+        REPUTATION_CACHE.set(CACHE_KEY_PREFIX + remote_ip + identifier, score)
     except ValueError as exc:
         LOGGER.warning("failed to set reputation", exc=exc)
 
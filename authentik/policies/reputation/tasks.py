@@ -1,5 +1,4 @@
 """Reputation tasks"""
-from django.core.cache import cache
 from structlog.stdlib import get_logger
 
 from authentik.events.geo import GEOIP_READER
@@ -9,8 +8,7 @@ from authentik.events.monitored_tasks import (
     TaskResultStatus,
     prefill_task,
 )
-from authentik.policies.reputation.models import Reputation
-from authentik.policies.reputation.signals import CACHE_KEY_PREFIX
+from authentik.policies.reputation.models import REPUTATION_CACHE, Reputation
 from authentik.root.celery import CELERY_APP
 
 LOGGER = get_logger()
@@ -21,7 +19,7 @@ LOGGER = get_logger()
 def save_reputation(self: MonitoredTask):
     """Save currently cached reputation to database"""
     objects_to_update = []
-    for _, score in cache.get_many(cache.keys(CACHE_KEY_PREFIX + "*")).items():
+    for _, score in REPUTATION_CACHE.get_many().items():
         rep, _ = Reputation.objects.get_or_create(
             ip=score["ip"],
             identifier=score["identifier"],
@@ -1,11 +1,16 @@
 """authentik policy signals"""
-from django.core.cache import cache
-from django.db.models.signals import post_save
+from typing import Optional
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from structlog.stdlib import get_logger
 
-from authentik.core.api.applications import user_app_cache_key
+from authentik.core.api.applications import USER_APP_CACHE, policy_app_cache, user_app_cache
+from authentik.core.models import Group, User
+from authentik.lib.expression.evaluator import EXPRESSION_CACHE
 from authentik.policies.engine import GAUGE_POLICIES_CACHED
+from authentik.policies.models import PolicyBinding
+from authentik.policies.process import POLICY_CACHE, policy_cache, user_policy_cache
 from authentik.root.monitoring import monitoring_set
 
 LOGGER = get_logger()
@@ -15,23 +20,76 @@ LOGGER = get_logger()
 # pylint: disable=unused-argument
 def monitoring_set_policies(sender, **kwargs):
     """set policy gauges"""
-    GAUGE_POLICIES_CACHED.set(len(cache.keys("policy_*") or []))
+    GAUGE_POLICIES_CACHED.set(POLICY_CACHE.count())
 
 
 @receiver(post_save)
 # pylint: disable=unused-argument
 def invalidate_policy_cache(sender, instance, **_):
     """Invalidate Policy cache when policy is updated"""
-    from authentik.policies.models import Policy, PolicyBinding
+    from authentik.policies.expression.models import ExpressionPolicy
+    from authentik.policies.models import Policy
 
+    if isinstance(instance, ExpressionPolicy):
+        EXPRESSION_CACHE.clear()
     if isinstance(instance, Policy):
         total = 0
         for binding in PolicyBinding.objects.filter(policy=instance):
-            prefix = f"policy_{binding.policy_binding_uuid.hex}_{binding.policy.pk.hex}*"
-            keys = cache.keys(prefix)
-            total += len(keys)
-            cache.delete_many(keys)
+            total += policy_cache(binding).clear()
         LOGGER.debug("Invalidating policy cache", policy=instance, keys=total)
-    # Also delete user application cache
-    keys = cache.keys(user_app_cache_key("*")) or []
-    cache.delete_many(keys)
+        # Also delete application lists which depend on this policy
+        policy_app_cache(instance.pk).clear()
+
+
+@receiver(post_save, sender=PolicyBinding)
+@receiver(post_delete, sender=PolicyBinding)
+# pylint: disable=unused-argument
+def invalidate_policy_binding_cache(sender, instance: PolicyBinding, **_):
+    """Invalidate cached results of a binding when it's updated"""
+    policy_cache(instance).clear()
+    # Bindings can change the access of any user to their target
+    USER_APP_CACHE.clear()
+
+
+@receiver(post_save, sender=User)
+# pylint: disable=unused-argument
+def invalidate_user_policy_cache(
+    sender, instance: User, update_fields: Optional[frozenset[str]] = None, **_
+):
+    """Invalidate cached results for a user when the user is updated. Logins only update
+    the user's last login, which policies can't depend on, so they keep the results."""
+    if update_fields and update_fields <= {"last_login"}:
+        return
+    user_policy_cache(instance.pk).clear()
+    user_app_cache(instance.pk).clear()
+
+
+@receiver(m2m_changed, sender=User.ak_groups.through)
+# pylint: disable=unused-argument
+def invalidate_membership_policy_cache(
+    sender, instance: User | Group, action: str, pk_set: Optional[set[int]], **_
+):
+    """Invalidate cached results for users whose group memberships changed"""
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if isinstance(instance, User):
+        user_policy_cache(instance.pk).clear()
+        user_app_cache(instance.pk).clear()
+        return
+    if pk_set is None:
+        POLICY_CACHE.clear()
+        USER_APP_CACHE.clear()
+        return
+    for user_pk in pk_set:
+        user_policy_cache(user_pk).clear()
+        user_app_cache(user_pk).clear()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+# pylint: disable=unused-argument
+def invalidate_group_policy_cache(sender, instance: Group, **_):
+    """Invalidate all cached results when a group is updated, as the
+    group's attributes and hierarchy can affect the results of any user"""
+    POLICY_CACHE.clear()
+    USER_APP_CACHE.clear()
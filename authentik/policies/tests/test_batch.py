@@ -0,0 +1,87 @@
+"""batch policy engine tests"""
+from unittest.mock import patch
+
+from django.test import RequestFactory, TestCase
+
+from authentik.core.models import User
+from authentik.policies.batch import BatchPolicyEngine
+from authentik.policies.dummy.models import DummyPolicy
+from authentik.policies.expression.models import ExpressionPolicy
+from authentik.policies.models import PolicyBinding, PolicyBindingModel, PolicyEngineMode
+from authentik.policies.pool import PolicyWorkerPool
+from authentik.policies.process import PolicyProcess
+from authentik.policies.tests.test_process import clear_policy_cache
+
+
+class TestBatchPolicyEngine(TestCase):
+    """BatchPolicyEngine tests"""
+
+    def setUp(self):
+        clear_policy_cache()
+        self.user = User.objects.create_user(username="policyuser")
+        self.policy_false = DummyPolicy.objects.create(result=False, wait_min=0, wait_max=1)
+        self.policy_true = DummyPolicy.objects.create(result=True, wait_min=0, wait_max=1)
+
+    def test_results(self):
+        """Test results matching a PolicyEngine per object"""
+        empty = PolicyBindingModel.objects.create()
+        mode_all = PolicyBindingModel.objects.create(policy_engine_mode=PolicyEngineMode.MODE_ALL)
+        PolicyBinding.objects.create(target=mode_all, policy=self.policy_false, order=0)
+        PolicyBinding.objects.create(target=mode_all, policy=self.policy_true, order=1)
+        mode_any = PolicyBindingModel.objects.create(policy_engine_mode=PolicyEngineMode.MODE_ANY)
+        PolicyBinding.objects.create(target=mode_any, policy=self.policy_false, order=0)
+        PolicyBinding.objects.create(target=mode_any, policy=self.policy_true, order=1)
+        negated = PolicyBindingModel.objects.create()
+        PolicyBinding.objects.create(target=negated, policy=self.policy_false, negate=True, order=0)
+        user = PolicyBindingModel.objects.create()
+        PolicyBinding.objects.create(target=user, user=self.user, order=0)
+        raises = PolicyBindingModel.objects.create()
+        PolicyBinding.objects.create(
+            target=raises,
+            policy=ExpressionPolicy.objects.create(name="raises", expression="{{ 0/0 }}"),
+            order=0,
+        )
+        pbms = [empty, mode_all, mode_any, negated, user, raises]
+        results = BatchPolicyEngine(pbms, self.user).build().results
+        self.assertEqual(
+            [results[pbm.pk].passing for pbm in pbms],
+            [True, False, True, True, True, False],
+        )
+        self.assertEqual(results[mode_all.pk].messages, ("dummy", "dummy"))
+
+    def test_deduplicate(self):
+        """Test policies bound to multiple objects being evaluated once"""
+        pbms = [PolicyBindingModel.objects.create() for _ in range(3)]
+        for pbm in pbms:
+            PolicyBinding.objects.create(target=pbm, policy=self.policy_false, order=0)
+        PolicyBinding.objects.create(target=pbms[0], policy=self.policy_true, order=1)
+        PolicyBinding.objects.create(target=pbms[1], policy=self.policy_false, negate=True, order=1)
+        with patch.object(
+            PolicyProcess,
+            "profiling_wrapper",
+            autospec=True,
+            side_effect=PolicyProcess.profiling_wrapper,
+        ) as wrapper:
+            results = BatchPolicyEngine(pbms, self.user).build().results
+            self.assertEqual(wrapper.call_count, 2)
+        self.assertEqual([results[pbm.pk].passing for pbm in pbms], [True, True, False])
+        self.assertEqual(
+            [x.passing for x in results[pbms[1].pk].source_results],
+            [False, True],
+        )
+        # Results of all bindings are cached, and decided objects are skipped
+        with patch.object(PolicyProcess, "profiling_wrapper") as wrapper:
+            results = BatchPolicyEngine(pbms, self.user).build().results
+            wrapper.assert_not_called()
+        self.assertEqual([results[pbm.pk].passing for pbm in pbms], [True, True, False])
+
+    def test_pool(self):
+        """Test evaluations being dispatched to the pool"""
+        pool = PolicyWorkerPool(2, 100)
+        pbms = [PolicyBindingModel.objects.create() for _ in range(2)]
+        PolicyBinding.objects.create(target=pbms[0], policy=self.policy_false, order=0)
+        PolicyBinding.objects.create(target=pbms[1], policy=self.policy_true, order=0)
+        with patch("authentik.policies.batch.POLICY_POOL", pool):
+            results = BatchPolicyEngine(pbms, self.user, RequestFactory().get("/")).build().results
+        self.assertEqual([results[pbm.pk].passing for pbm in pbms], [False, True])
+        self.assertEqual(results[pbms[1].pk].messages, ("dummy",))
@@ -1,10 +1,12 @@
 """policy engine tests"""
+from django.contrib.sessions.backends.cache import SessionStore
 from django.core.cache import cache
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 
 from authentik.core.models import User
 from authentik.policies.dummy.models import DummyPolicy
 from authentik.policies.engine import PolicyEngine
+from authentik.policies.event_matcher.models import EventMatcherPolicy
 from authentik.policies.expression.models import ExpressionPolicy
 from authentik.policies.models import Policy, PolicyBinding, PolicyBindingModel, PolicyEngineMode
 from authentik.policies.tests.test_process import clear_policy_cache
@@ -106,3 +108,60 @@ class TestPolicyEngine(TestCase):
         self.assertEqual(len(cache.keys(f"policy_{binding.policy_binding_uuid.hex}*")), 1)
         self.assertEqual(engine.build().passing, False)
         self.assertEqual(len(cache.keys(f"policy_{binding.policy_binding_uuid.hex}*")), 1)
+
+    def test_engine_cache_dependency(self):
+        """Test results being cached based on the policy's dependencies"""
+        pbm = PolicyBindingModel.objects.create()
+        binding = PolicyBinding.objects.create(target=pbm, policy=self.policy_true, order=0)
+        matcher = EventMatcherPolicy.objects.create(name="matcher")
+        context = PolicyBinding.objects.create(target=pbm, policy=matcher, negate=True, order=1)
+        factory = RequestFactory()
+        for session_key in ["foo", "bar"]:
+            request = factory.get("/")
+            request.session = SessionStore(session_key)
+            engine = PolicyEngine(pbm, self.user, request)
+            self.assertEqual(engine.build().passing, True)
+        # Results of policies which only depend on the user are shared between sessions
+        self.assertEqual(
+            cache.keys(f"policy_{binding.policy_binding_uuid.hex}*"),
+            [f"policy_{binding.policy_binding_uuid.hex}_#{self.user.pk}"],
+        )
+        self.assertEqual(cache.keys(f"policy_{context.policy_binding_uuid.hex}*"), [])
+        # and invalidated when the user is changed, other than by logging in
+        self.user.save(update_fields=["last_login"])
+        self.assertNotEqual(cache.keys(f"policy_{binding.policy_binding_uuid.hex}*"), [])
+        self.user.save()
+        self.assertEqual(cache.keys(f"policy_{binding.policy_binding_uuid.hex}*"), [])
+
+    def test_engine_short_circuit_any(self):
+        """Ensure evaluation stops after the first passing policy in MODE_ANY"""
+        pbm = PolicyBindingModel.objects.create(policy_engine_mode=PolicyEngineMode.MODE_ANY)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_true, order=0)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_false, order=1)
+        engine = PolicyEngine(pbm, self.user)
+        engine.short_circuit = True
+        result = engine.build().result
+        self.assertEqual(result.passing, True)
+        self.assertEqual(len(result.source_results), 1)
+
+    def test_engine_short_circuit_all(self):
+        """Ensure evaluation stops after the first failing policy in MODE_ALL"""
+        pbm = PolicyBindingModel.objects.create(policy_engine_mode=PolicyEngineMode.MODE_ALL)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_false, order=0)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_raises, order=1)
+        engine = PolicyEngine(pbm, self.user)
+        engine.short_circuit = True
+        result = engine.build().result
+        self.assertEqual(result.passing, False)
+        self.assertEqual(result.messages, ("dummy",))
+
+    def test_engine_short_circuit_undecided(self):
+        """Ensure all policies are evaluated when the result isn't decided early"""
+        pbm = PolicyBindingModel.objects.create(policy_engine_mode=PolicyEngineMode.MODE_ALL)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_true, order=0)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_false, order=1)
+        engine = PolicyEngine(pbm, self.user)
+        engine.short_circuit = True
+        result = engine.build().result
+        self.assertEqual(result.passing, False)
+        self.assertEqual(len(result.source_results), 2)
@@ -0,0 +1,101 @@
+"""policy worker pool tests"""
+from unittest.mock import patch
+
+from django.test import RequestFactory, TestCase
+
+from authentik.core.models import User
+from authentik.policies.dummy.models import DummyPolicy
+from authentik.policies.engine import PolicyEngine
+from authentik.policies.models import PolicyBinding, PolicyBindingModel, PolicyEngineMode
+from authentik.policies.pool import PolicyWorkerPool
+from authentik.policies.tests.test_process import clear_policy_cache
+from authentik.policies.types import PolicyRequest
+
+
+class TestPolicyWorkerPool(TestCase):
+    """PolicyWorkerPool tests"""
+
+    def setUp(self):
+        clear_policy_cache()
+        self.user = User.objects.create_user(username="policyuser")
+        self.policy_false = DummyPolicy.objects.create(result=False, wait_min=0, wait_max=1)
+        self.policy_true = DummyPolicy.objects.create(result=True, wait_min=0, wait_max=1)
+
+    def test_engine_pool(self):
+        """Test engine dispatching bindings to the pool"""
+        pool = PolicyWorkerPool(2, 100)
+        pbm = PolicyBindingModel.objects.create(policy_engine_mode=PolicyEngineMode.MODE_ALL)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_false, order=0)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_true, order=1)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_true, order=2)
+        with patch("authentik.policies.engine.POLICY_POOL", pool):
+            engine = PolicyEngine(pbm, self.user, RequestFactory().get("/"))
+            result = engine.build().result
+        self.assertEqual(result.passing, False)
+        self.assertEqual(result.messages, ("dummy", "dummy", "dummy"))
+        self.assertLessEqual(len(pool._idle), 2)
+
+    def test_recycle(self):
+        """Test workers being replaced after max_tasks evaluations"""
+        pool = PolicyWorkerPool(1, 1)
+        binding = PolicyBinding(policy=self.policy_true, order=0)
+        request = PolicyRequest(self.user)
+        request.obj = PolicyBindingModel()
+        for _ in range(2):
+            result = pool.submit(binding, request).wait()
+            self.assertEqual(result.passing, True)
+        self.assertEqual(pool._idle, [])
+
+    def test_timeout(self):
+        """Test binding timeout killing the worker"""
+        pool = PolicyWorkerPool(1, 100)
+        policy = DummyPolicy.objects.create(result=True, wait_min=5, wait_max=6)
+        binding = PolicyBinding(policy=policy, order=0, timeout=0)
+        request = PolicyRequest(self.user)
+        request.obj = PolicyBindingModel()
+        result = pool.submit(binding, request).wait()
+        self.assertEqual(result.passing, False)
+        self.assertEqual(result.messages, ("Policy timed out",))
+        self.assertEqual(pool._idle, [])
+
+    def test_spawn_error(self):
+        """Test tasks failing when no worker can be started"""
+        pool = PolicyWorkerPool(1, 100)
+        binding = PolicyBinding(policy=self.policy_true, order=0)
+        request = PolicyRequest(self.user)
+        request.obj = PolicyBindingModel()
+        with patch.object(pool, "_spawn", side_effect=OSError("foo")):
+            result = pool.submit(binding, request).wait()
+        self.assertEqual(result.passing, False)
+        self.assertEqual(result.messages, ("foo",))
+
+    def test_wait_timeout(self):
+        """Test waiting for a result which is never delivered"""
+        pool = PolicyWorkerPool(1, 100)
+        binding = PolicyBinding(policy=self.policy_true, order=0, timeout=0)
+        request = PolicyRequest(self.user)
+        request.obj = PolicyBindingModel()
+        with (
+            patch("authentik.policies.pool.POOL_WAIT_MARGIN", 0.1),
+            patch.object(pool, "_assign"),
+        ):
+            task = pool.submit(binding, request)
+            result = task.wait()
+        self.assertEqual(result.passing, False)
+        self.assertEqual(result.messages, ("Policy timed out",))
+        self.assertEqual(pool._queue, [])
+
+    def test_engine_pool_short_circuit(self):
+        """Test remaining bindings being cancelled once the result is decided"""
+        pool = PolicyWorkerPool(1, 100)
+        slow = DummyPolicy.objects.create(result=True, wait_min=5, wait_max=6)
+        pbm = PolicyBindingModel.objects.create(policy_engine_mode=PolicyEngineMode.MODE_ANY)
+        PolicyBinding.objects.create(target=pbm, policy=self.policy_true, order=0)
+        PolicyBinding.objects.create(target=pbm, policy=slow, order=1)
+        with patch("authentik.policies.engine.POLICY_POOL", pool):
+            engine = PolicyEngine(pbm, self.user)
+            engine.short_circuit = True
+            result = engine.build().result
+        self.assertEqual(result.passing, True)
+        self.assertEqual(len(result.source_results), 1)
+        self.assertEqual(pool._queue, [])
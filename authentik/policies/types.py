@@ -9,7 +9,6 @@ from django.http import HttpRequest
 from structlog.stdlib import get_logger
 
 from authentik.events.geo import GEOIP_READER
-from authentik.lib.utils.http import get_client_ip
 
 if TYPE_CHECKING:
     from authentik.core.models import User
@@ -40,10 +39,7 @@ class PolicyRequest:
         self.http_request = request
         if not GEOIP_READER.enabled:
             return
-        client_ip = get_client_ip(request)
-        if not client_ip:
-            return
-        self.context["geoip"] = GEOIP_READER.city(client_ip)
+        self.context["geoip"] = GEOIP_READER.city_for_request(request)
 
     def __repr__(self) -> str:
         return self.__str__()
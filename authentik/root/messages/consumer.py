@@ -1,6 +1,12 @@
 """websocket Message consumer"""
 from channels.generic.websocket import JsonWebsocketConsumer
-from django.core.cache import cache
+
+from authentik.lib.utils.cache import CacheNamespace
+
+
+def session_channels(session_key: str) -> CacheNamespace:
+    """Cache namespace containing the channels of all websocket connections of a session"""
+    return CacheNamespace(f"user_{session_key}_messages")
 
 
 class MessageConsumer(JsonWebsocketConsumer):
@@ -12,11 +18,15 @@ class MessageConsumer(JsonWebsocketConsumer):
     def connect(self):
         self.accept()
         self.session_key = self.scope["session"].session_key
-        cache.set(f"user_{self.session_key}_messages_{self.channel_name}", True, None)
+        session_channels(self.session_key).set(
+            f"user_{self.session_key}_messages_{self.channel_name}", True, None
+        )
 
     # pylint: disable=unused-argument
     def disconnect(self, code):
-        cache.delete(f"user_{self.session_key}_messages_{self.channel_name}")
+        session_channels(self.session_key).delete(
+            f"user_{self.session_key}_messages_{self.channel_name}"
+        )
 
     def event_update(self, event: dict):
         """Event handler which is called by Messages Storage backend"""
@@ -20,6 +20,7 @@ from authentik.sources.ldap.models import LDAPPropertyMapping, LDAPSource
 from authentik.sources.ldap.sync.groups import GroupLDAPSynchronizer
 from authentik.sources.ldap.sync.membership import MembershipLDAPSynchronizer
 from authentik.sources.ldap.sync.users import UserLDAPSynchronizer
+from authentik.sources.ldap.tasks import ldap_sync_shard_count
 
 
 class LDAPSourceSerializer(SourceSerializer):
@@ -104,13 +105,21 @@ class LDAPSourceViewSet(UsedByMixin, ModelViewSet):
         """Get source's sync status"""
         source = self.get_object()
         results = []
+        shard_count = ldap_sync_shard_count()
+        names = []
         for sync_class in [
             UserLDAPSynchronizer,
             GroupLDAPSynchronizer,
             MembershipLDAPSynchronizer,
         ]:
             sync_name = sync_class.__name__.replace("LDAPSynchronizer", "").lower()
-            task = TaskInfo.by_name(f"ldap_sync_{source.slug}_{sync_name}")
+            if shard_count > 1 and sync_class != MembershipLDAPSynchronizer:
+                names.extend(f"ldap_sync_{source.slug}_{sync_name}_{i}" for i in range(shard_count))
+            else:
+                names.append(f"ldap_sync_{source.slug}_{sync_name}")
+        names.append(f"ldap_sync_shards_finished_{source.slug}_shards")
+        for name in names:
+            task = TaskInfo.by_name(name)
             if task:
                 results.append(task)
         return Response(TaskSerializer(results, many=True).data)
@@ -7,7 +7,8 @@ from structlog.stdlib import get_logger
 
 from authentik.core.auth import InbuiltBackend
 from authentik.core.models import User
-from authentik.sources.ldap.models import LDAP_TIMEOUT, LDAPSource
+from authentik.sources.ldap.models import LDAPSource
+from authentik.sources.ldap.pool import LDAP_POOLS
 
 LOGGER = get_logger()
 LDAP_DISTINGUISHED_NAME = "distinguishedName"
@@ -53,18 +54,17 @@ class LDAPBackend(InbuiltBackend):
 
     def auth_user_by_bind(self, source: LDAPSource, user: User, password: str) -> Optional[User]:
         """Attempt authentication by binding to the LDAP server as `user`. This
-        method should be avoided as its slow to do the bind."""
+        method should be avoided as its slow to do the bind. Binds use pooled connections,
+        which are re-bound for every attempt."""
         # Try to bind as new user
         LOGGER.debug("Attempting Binding as user", user=user)
         try:
-            temp_connection = ldap3.Connection(
-                source.server,
-                user=user.attributes.get(LDAP_DISTINGUISHED_NAME),
-                password=password,
-                raise_exceptions=True,
-                receive_timeout=LDAP_TIMEOUT,
-            )
-            temp_connection.bind()
+            with LDAP_POOLS.get(source).bind.connection() as connection:
+                connection.rebind(
+                    user=user.attributes.get(LDAP_DISTINGUISHED_NAME),
+                    password=password,
+                    read_server_info=False,
+                )
             return user
         except ldap3.core.exceptions.LDAPInvalidCredentialsResult as exception:
             LOGGER.debug("LDAPInvalidCredentialsResult", user=user, error=exception)
@@ -0,0 +1,130 @@
+"""authentik LDAP directory metadata"""
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+import ldap3
+from django.core.cache import cache
+from ldap3 import Connection
+from ldap3.core.exceptions import LDAPAttributeError
+from structlog.stdlib import get_logger
+
+from authentik.lib.config import CONFIG
+from authentik.sources.ldap.models import LDAPSource
+from authentik.sources.ldap.pool import LDAP_POOLS
+
+LOGGER = get_logger()
+CACHE_TIMEOUT = int(CONFIG.y("ldap.metadata_cache_timeout", 7200))
+
+
+class LDAPVendor(Enum):
+    """Directory server software, detected from the root DSE"""
+
+    ACTIVE_DIRECTORY = "active_directory"
+    # 389 Directory Server, which FreeIPA is based on
+    FREEIPA = "freeipa"
+    OPENLDAP = "openldap"
+    UNKNOWN = "unknown"
+
+
+@dataclass
+class LDAPDirectoryMetadata:
+    """Information about the directory of a source, which rarely changes and is expensive
+    to fetch, as it requires reading the root DSE, the schema and the domain root."""
+
+    vendor: LDAPVendor
+    naming_contexts: list[str]
+    root_dn: str
+    # pwdProperties of the domain root, only read from Active Directory
+    pwd_properties: Optional[int]
+    # Lower-cased names of all attribute types in the schema, None if the schema is unknown
+    attribute_types: Optional[frozenset[str]]
+
+    def is_vendor(self, vendor: LDAPVendor) -> bool:
+        """Check if the directory might be from `vendor`, which is the case for all vendors
+        when it wasn't detected"""
+        return self.vendor in (vendor, LDAPVendor.UNKNOWN)
+
+    def has_attribute(self, attribute: str) -> bool:
+        """Check if the schema contains `attribute`, assumes it does when the schema is unknown"""
+        return self.attribute_types is None or attribute.lower() in self.attribute_types
+
+    @staticmethod
+    def detect_vendor(connection: Connection) -> LDAPVendor:
+        """Detect the directory server software from the root DSE"""
+        info = connection.server.info
+        if "forestFunctionality" in info.other or "rootDomainNamingContext" in info.other:
+            return LDAPVendor.ACTIVE_DIRECTORY
+        if any("389" in name for name in info.vendor_name or []):
+            return LDAPVendor.FREEIPA
+        if "OpenLDAProotDSE" in info.other.get("objectClass", []):
+            return LDAPVendor.OPENLDAP
+        return LDAPVendor.UNKNOWN
+
+    @staticmethod
+    def fetch_pwd_properties(connection: Connection, root_dn: str) -> Optional[int]:
+        """Read pwdProperties of the domain root"""
+        try:
+            root_attrs = connection.extend.standard.paged_search(
+                search_base=root_dn,
+                search_filter="(objectClass=*)",
+                search_scope=ldap3.BASE,
+                attributes=["pwdProperties"],
+            )
+            root_attrs = list(root_attrs)[0]
+        except (LDAPAttributeError, KeyError, IndexError):
+            return None
+        return root_attrs.get("attributes", {}).get("pwdProperties", None)
+
+    @staticmethod
+    def fetch(connection: Connection) -> "LDAPDirectoryMetadata":
+        """Fetch the metadata of the directory `connection` is connected to"""
+        info = connection.server.info
+        naming_contexts = sorted(info.naming_contexts or [], key=len)
+        # Attempt to get root DN via MS specific fields or generic LDAP fields
+        if "rootDomainNamingContext" in info.other:
+            root_dn = info.other["rootDomainNamingContext"][0]
+        else:
+            root_dn = naming_contexts[0] if naming_contexts else ""
+        vendor = LDAPDirectoryMetadata.detect_vendor(connection)
+        pwd_properties = None
+        if vendor in (LDAPVendor.ACTIVE_DIRECTORY, LDAPVendor.UNKNOWN):
+            pwd_properties = LDAPDirectoryMetadata.fetch_pwd_properties(connection, root_dn)
+        schema = connection.server.schema
+        attribute_types = None
+        if schema:
+            attribute_types = frozenset(name.lower() for name in schema.attribute_types.keys())
+        return LDAPDirectoryMetadata(
+            vendor=vendor,
+            naming_contexts=naming_contexts,
+            root_dn=root_dn,
+            pwd_properties=pwd_properties,
+            attribute_types=attribute_types,
+        )
+
+
+def metadata_cache_key(source: LDAPSource) -> str:
+    """Cache key of the directory metadata of `source`"""
+    return f"ldap_metadata_{source.pk.hex}"
+
+
+def refresh_metadata(source: LDAPSource) -> LDAPDirectoryMetadata:
+    """Fetch the directory metadata of `source` and cache it"""
+    with LDAP_POOLS.get(source).service.connection() as connection:
+        metadata = LDAPDirectoryMetadata.fetch(connection)
+    cache.set(metadata_cache_key(source), metadata, CACHE_TIMEOUT)
+    LOGGER.debug("Refreshed LDAP directory metadata", source=source, vendor=metadata.vendor)
+    return metadata
+
+
+def get_metadata(source: LDAPSource) -> LDAPDirectoryMetadata:
+    """Get the directory metadata of `source`, which is fetched when it isn't cached"""
+    metadata = cache.get(metadata_cache_key(source), None)
+    if metadata is None:
+        metadata = refresh_metadata(source)
+    return metadata
+
+
+def clear_metadata(source: LDAPSource):
+    """Remove the cached directory metadata of `source`, so it's fetched on next use"""
+    cache.delete(metadata_cache_key(source))
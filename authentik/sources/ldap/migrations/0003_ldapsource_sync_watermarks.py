@@ -0,0 +1,18 @@
+# Generated by Django 4.0.3 on 2026-10-18 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentik_sources_ldap", "0002_auto_20211203_0900"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ldapsource",
+            name="sync_watermarks",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
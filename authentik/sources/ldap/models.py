@@ -94,6 +94,8 @@ class LDAPSource(Source):
     sync_parent_group = models.ForeignKey(
         Group, blank=True, null=True, default=None, on_delete=models.SET_DEFAULT
     )
+    # Highest modifyTimestamp/uSNChanged seen per synchronizer, used for incremental syncs
+    sync_watermarks = models.JSONField(default=dict, blank=True)
 
     @property
     def component(self) -> str:
@@ -106,8 +108,15 @@ class LDAPSource(Source):
         return LDAPSourceSerializer
 
     @property
-    def server(self) -> Server:
-        """Get LDAP Server/ServerPool"""
+    def server(self) -> ServerPool:
+        """Get LDAP Server/ServerPool, which is shared by all connections of this process,
+        so the server's info is only read once"""
+        from authentik.sources.ldap.pool import LDAP_POOLS
+
+        return LDAP_POOLS.get(self).server
+
+    def build_server(self) -> ServerPool:
+        """Build LDAP Server/ServerPool"""
         servers = []
         tls = Tls()
         if self.peer_certificate:
@@ -126,7 +135,16 @@ class LDAPSource(Source):
 
     @property
     def connection(self) -> Connection:
-        """Get a fully connected and bound LDAP Connection"""
+        """Get a fully connected and bound LDAP Connection. Prefer
+        `authentik.sources.ldap.pool.LDAP_POOLS` for short operations."""
+        connection = self.open_connection()
+        connection.bind(read_server_info=False)
+        if not connection.server.info:
+            connection.refresh_server_info()
+        return connection
+
+    def open_connection(self) -> Connection:
+        """Open a new connection, which isn't bound yet"""
         connection = Connection(
             self.server,
             raise_exceptions=True,
@@ -134,10 +152,9 @@ class LDAPSource(Source):
             password=self.bind_password,
             receive_timeout=LDAP_TIMEOUT,
         )
-
-        connection.bind()
+        connection.open(read_server_info=False)
         if self.start_tls:
-            connection.start_tls()
+            connection.start_tls(read_server_info=False)
         return connection
 
     class Meta:
@@ -9,7 +9,9 @@ from structlog.stdlib import get_logger
 
 from authentik.core.models import User
 from authentik.sources.ldap.auth import LDAP_DISTINGUISHED_NAME
+from authentik.sources.ldap.metadata import get_metadata
 from authentik.sources.ldap.models import LDAPSource
+from authentik.sources.ldap.pool import LDAP_POOLS
 
 LOGGER = get_logger()
 
@@ -50,27 +52,11 @@ class LDAPPasswordChanger:
 
     def get_domain_root_dn(self) -> str:
         """Attempt to get root DN via MS specific fields or generic LDAP fields"""
-        info = self._source.connection.server.info
-        if "rootDomainNamingContext" in info.other:
-            return info.other["rootDomainNamingContext"][0]
-        naming_contexts = info.naming_contexts
-        naming_contexts.sort(key=len)
-        return naming_contexts[0]
+        return get_metadata(self._source).root_dn
 
     def check_ad_password_complexity_enabled(self) -> bool:
         """Check if DOMAIN_PASSWORD_COMPLEX is enabled"""
-        root_dn = self.get_domain_root_dn()
-        try:
-            root_attrs = self._source.connection.extend.standard.paged_search(
-                search_base=root_dn,
-                search_filter="(objectClass=*)",
-                search_scope=ldap3.BASE,
-                attributes=["pwdProperties"],
-            )
-            root_attrs = list(root_attrs)[0]
-        except (LDAPAttributeError, KeyError, IndexError):
-            return False
-        raw_pwd_properties = root_attrs.get("attributes", {}).get("pwdProperties", None)
+        raw_pwd_properties = get_metadata(self._source).pwd_properties
         if raw_pwd_properties is None:
             return False
 
@@ -86,21 +72,23 @@ class LDAPPasswordChanger:
         if not user_dn:
             LOGGER.info(f"User has no {LDAP_DISTINGUISHED_NAME} set.")
             return
-        try:
-            self._source.connection.extend.microsoft.modify_password(user_dn, password)
-        except LDAPAttributeError:
-            self._source.connection.extend.standard.modify_password(user_dn, new_password=password)
+        with LDAP_POOLS.get(self._source).service.connection() as connection:
+            try:
+                connection.extend.microsoft.modify_password(user_dn, password)
+            except LDAPAttributeError:
+                connection.extend.standard.modify_password(user_dn, new_password=password)
 
     def _ad_check_password_existing(self, password: str, user_dn: str) -> bool:
         """Check if a password contains sAMAccount or displayName"""
-        users = list(
-            self._source.connection.extend.standard.paged_search(
-                search_base=user_dn,
-                search_filter=self._source.user_object_filter,
-                search_scope=ldap3.BASE,
-                attributes=["displayName", "sAMAccountName"],
+        with LDAP_POOLS.get(self._source).service.connection() as connection:
+            users = list(
+                connection.extend.standard.paged_search(
+                    search_base=user_dn,
+                    search_filter=self._source.user_object_filter,
+                    search_scope=ldap3.BASE,
+                    attributes=["displayName", "sAMAccountName"],
+                )
             )
-        )
         if len(users) != 1:
             raise AssertionError()
         user_attributes = users[0]["attributes"]
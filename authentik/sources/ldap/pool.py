@@ -0,0 +1,232 @@
+"""authentik LDAP connection pools"""
+from collections import deque
+from contextlib import contextmanager
+from hashlib import sha256
+from os import getpid
+from threading import Lock
+from time import monotonic
+from typing import Callable, Iterator, Optional
+
+from ldap3 import ANONYMOUS, BASE, SIMPLE, Connection, ServerPool
+from ldap3.core.exceptions import LDAPException, LDAPOperationResult
+from prometheus_client import Gauge, Histogram
+from structlog.stdlib import get_logger
+
+from authentik.lib.config import CONFIG
+from authentik.sources.ldap.models import LDAPSource
+
+LOGGER = get_logger()
+GAUGE_LDAP_POOL_CONNECTIONS = Gauge(
+    "authentik_sources_ldap_pool_connections",
+    "Open pooled LDAP connections",
+    ["source", "pool", "state"],
+)
+HIST_LDAP_POOL_CHECKOUT = Histogram(
+    "authentik_sources_ldap_pool_checkout",
+    "Time taken to get a pooled LDAP connection, including opening new connections",
+    ["source", "pool"],
+)
+
+
+class LDAPConnectionPool:
+    """Connections to the servers of a source, which are kept open for re-use by this process.
+    Connections are used by a single caller at a time, and new connections are opened when
+    all of them are in use. At most `size` idle connections are kept, connections which
+    were idle for a while are checked before they're re-used. `reset` is called before
+    connections are returned to the pool, connections are discarded when it fails."""
+
+    source: LDAPSource
+    name: str
+    size: int
+    health_check_interval: float
+
+    def __init__(
+        self,
+        source: LDAPSource,
+        name: str,
+        opener: Callable[[], Connection],
+        reset: Optional[Callable[[Connection], None]] = None,
+    ):
+        self.source = source
+        self.name = name
+        self.size = int(CONFIG.y("ldap.pool_size", 4))
+        self.health_check_interval = float(CONFIG.y("ldap.pool_health_check_interval", 30))
+        self._opener = opener
+        self._reset = reset
+        self._idle: deque[tuple[Connection, float]] = deque()
+        self._active = 0
+        self._lock = Lock()
+
+    def _update_metrics(self):
+        GAUGE_LDAP_POOL_CONNECTIONS.labels(
+            source=self.source.slug, pool=self.name, state="idle"
+        ).set(len(self._idle))
+        GAUGE_LDAP_POOL_CONNECTIONS.labels(
+            source=self.source.slug, pool=self.name, state="active"
+        ).set(self._active)
+
+    def _is_healthy(self, connection: Connection, idle_since: float) -> bool:
+        """Check if `connection` can be re-used, by reading the root DSE of connections
+        which were idle for longer than the health check interval"""
+        if connection.closed:
+            return False
+        if monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            connection.search("", "(objectClass=*)", BASE, attributes=["1.1"])
+            return True
+        except LDAPException as exc:
+            LOGGER.debug("Discarding unhealthy LDAP connection", source=self.source, exc=exc)
+            return False
+
+    def _close(self, connection: Connection):
+        try:
+            connection.unbind()
+        except LDAPException:
+            pass
+
+    def _checkout(self) -> Connection:
+        """Get an idle, healthy connection or open a new one"""
+        with HIST_LDAP_POOL_CHECKOUT.labels(source=self.source.slug, pool=self.name).time():
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, idle_since = self._idle.pop()
+                if self._is_healthy(connection, idle_since):
+                    with self._lock:
+                        self._active += 1
+                        self._update_metrics()
+                    return connection
+                self._close(connection)
+            connection = self._opener()
+            with self._lock:
+                self._active += 1
+                self._update_metrics()
+            return connection
+
+    def _checkin(self, connection: Connection, reuse: bool):
+        """Return `connection` to the pool, or close it when it can't be re-used or
+        enough connections are idle"""
+        with self._lock:
+            self._active -= 1
+            reuse = reuse and not connection.closed and len(self._idle) < self.size
+            if reuse:
+                self._idle.append((connection, monotonic()))
+            self._update_metrics()
+        if not reuse:
+            self._close(connection)
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """Use a pooled connection. Connections are discarded when they fail with
+        an error other than an operation result sent by the server."""
+        connection = self._checkout()
+        reuse = True
+        try:
+            yield connection
+        except LDAPOperationResult:
+            raise
+        except LDAPException:
+            reuse = False
+            raise
+        finally:
+            if reuse and self._reset:
+                try:
+                    self._reset(connection)
+                except LDAPException as exc:
+                    LOGGER.debug("Failed to reset LDAP connection", source=self.source, exc=exc)
+                    reuse = False
+            self._checkin(connection, reuse)
+
+    def clear(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._update_metrics()
+        for connection, _ in idle:
+            self._close(connection)
+
+
+class LDAPSourcePools:
+    """Server info and connection pools of a single source"""
+
+    source: LDAPSource
+    server: ServerPool
+    # Connections bound with the source's bind credentials
+    service: LDAPConnectionPool
+    # Connections used to verify the credentials of users, which are bound with the
+    # source's bind credentials again before they're returned to the pool
+    bind: LDAPConnectionPool
+
+    def __init__(self, source: LDAPSource):
+        self.source = source
+        self.server = source.build_server()
+        self.service = LDAPConnectionPool(source, "service", lambda: source.connection)
+        self.bind = LDAPConnectionPool(
+            source, "bind", source.open_connection, reset=self._bind_service
+        )
+
+    def _bind_service(self, connection: Connection):
+        """Bind `connection` with the source's bind credentials again after it was used to
+        verify a user's credentials, so they aren't kept in idle connections"""
+        connection.user = self.source.bind_cn
+        connection.password = self.source.bind_password
+        connection.authentication = SIMPLE if self.source.bind_cn else ANONYMOUS
+        connection.bind(read_server_info=False)
+
+    def clear(self):
+        """Close all idle connections"""
+        self.service.clear()
+        self.bind.clear()
+
+
+class LDAPPools:
+    """Connection pools of all sources used by this process. Pools are replaced when the
+    connection settings of their source change, and aren't shared with forked processes."""
+
+    def __init__(self):
+        self._pools: dict[str, tuple[str, LDAPSourcePools]] = {}
+        self._pid = getpid()
+        self._lock = Lock()
+
+    @staticmethod
+    def _fingerprint(source: LDAPSource) -> str:
+        """Hash of all settings which affect connections of `source`"""
+        settings = [
+            source.server_uri,
+            source.bind_cn,
+            source.bind_password,
+            str(source.start_tls),
+        ]
+        if source.peer_certificate:
+            settings.append(source.peer_certificate.certificate_data)
+        return sha256("\0".join(settings).encode()).hexdigest()
+
+    def get(self, source: LDAPSource) -> LDAPSourcePools:
+        """Get the pools of `source`"""
+        fingerprint = self._fingerprint(source)
+        with self._lock:
+            if self._pid != getpid():
+                # Connections opened before forking belong to the parent process
+                self._pools = {}
+                self._pid = getpid()
+            current = self._pools.get(source.pk.hex)
+            if current and current[0] == fingerprint:
+                return current[1]
+            pools = LDAPSourcePools(source)
+            self._pools[source.pk.hex] = (fingerprint, pools)
+        if current:
+            current[1].clear()
+        return pools
+
+    def discard(self, source: LDAPSource):
+        """Close the connections of a source which was deleted"""
+        with self._lock:
+            current = self._pools.pop(source.pk.hex, None)
+        if current:
+            current[1].clear()
+
+
+LDAP_POOLS = LDAPPools()
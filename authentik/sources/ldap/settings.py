@@ -1,10 +1,28 @@
 """LDAP Settings"""
+from datetime import timedelta
+
 from celery.schedules import crontab
 
+from authentik.lib.config import CONFIG
+
 CELERY_BEAT_SCHEDULE = {
     "sources_ldap_sync": {
         "task": "authentik.sources.ldap.tasks.ldap_sync_all",
         "schedule": crontab(minute="*/120"),  # Run every other hour
         "options": {"queue": "authentik_scheduled"},
-    }
+    },
+    "sources_ldap_refresh_metadata": {
+        "task": "authentik.sources.ldap.tasks.ldap_refresh_metadata_all",
+        "schedule": crontab(minute="30"),  # Run every hour
+        "options": {"queue": "authentik_scheduled"},
+    },
 }
+
+if int(CONFIG.y("ldap.incremental_sync_interval", 0)) > 0:
+    # Only fetch changed entries in between the full syncs above
+    CELERY_BEAT_SCHEDULE["sources_ldap_sync_incremental"] = {
+        "task": "authentik.sources.ldap.tasks.ldap_sync_all",
+        "schedule": timedelta(minutes=int(CONFIG.y("ldap.incremental_sync_interval"))),
+        "kwargs": {"incremental": True},
+        "options": {"queue": "authentik_scheduled"},
+    }
@@ -1,7 +1,7 @@
 """authentik ldap source signals"""
 from typing import Any
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from ldap3.core.exceptions import LDAPOperationResult
@@ -11,13 +11,11 @@ from authentik.core.models import User
 from authentik.core.signals import password_changed
 from authentik.events.models import Event, EventAction
 from authentik.flows.planner import PLAN_CONTEXT_PENDING_USER
-from authentik.lib.utils.reflection import class_to_path
+from authentik.sources.ldap.metadata import clear_metadata
 from authentik.sources.ldap.models import LDAPSource
 from authentik.sources.ldap.password import LDAPPasswordChanger
-from authentik.sources.ldap.sync.groups import GroupLDAPSynchronizer
-from authentik.sources.ldap.sync.membership import MembershipLDAPSynchronizer
-from authentik.sources.ldap.sync.users import UserLDAPSynchronizer
-from authentik.sources.ldap.tasks import ldap_sync
+from authentik.sources.ldap.pool import LDAP_POOLS
+from authentik.sources.ldap.tasks import ldap_sync_source
 from authentik.stages.prompt.signals import password_validate
 
 
@@ -33,12 +31,22 @@ def sync_ldap_source_on_save(sender, instance: LDAPSource, **_):
     #   and the mappings are created with an m2m event
     if not instance.property_mappings.exists() or not instance.property_mappings_group.exists():
         return
-    for sync_class in [
-        UserLDAPSynchronizer,
-        GroupLDAPSynchronizer,
-        MembershipLDAPSynchronizer,
-    ]:
-        ldap_sync.delay(instance.pk, class_to_path(sync_class))
+    ldap_sync_source(instance)
+
+
+@receiver(post_save, sender=LDAPSource)
+@receiver(post_delete, sender=LDAPSource)
+# pylint: disable=unused-argument
+def clear_ldap_source_metadata(sender, instance: LDAPSource, **_):
+    """Clear cached directory metadata, which is fetched again on next use"""
+    clear_metadata(instance)
+
+
+@receiver(post_delete, sender=LDAPSource)
+# pylint: disable=unused-argument
+def close_ldap_source_connections(sender, instance: LDAPSource, **_):
+    """Close pooled connections of deleted sources"""
+    LDAP_POOLS.discard(instance)
 
 
 @receiver(password_validate)
@@ -1,17 +1,63 @@
 """Sync LDAP Users and groups into authentik"""
-from typing import Any
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from typing import Any, Iterable, Iterator, Optional
 
+from django.core.exceptions import FieldError
+from django.db import transaction
 from django.db.models.base import Model
 from django.db.models.query import QuerySet
+from django.db.utils import IntegrityError
+from django.utils.functional import cached_property
+from ldap3 import Connection
+from pytz import UTC
 from structlog.stdlib import BoundLogger, get_logger
 
-from authentik.core.exceptions import PropertyMappingExpressionException
+from authentik.core.expression import PropertyMappingEvaluator
 from authentik.events.models import Event, EventAction
 from authentik.lib.merge import MERGE_LIST_UNIQUE
 from authentik.sources.ldap.auth import LDAP_DISTINGUISHED_NAME
 from authentik.sources.ldap.models import LDAPPropertyMapping, LDAPSource
 
 LDAP_UNIQUENESS = "ldap_uniq"
+# Amount of LDAP entries which are written to the database at once
+LDAP_SYNC_PAGE_SIZE = 100
+# Attributes used to track which entries changed since the last sync, in order of preference.
+# uSNChanged is specific to Active Directory and only valid for the domain controller it was
+# read from, modifyTimestamp is available on most other directories.
+LDAP_WATERMARK_USN = "uSNChanged"
+LDAP_WATERMARK_TIMESTAMP = "modifyTimestamp"
+LDAP_WATERMARK_ATTRIBUTES = [LDAP_WATERMARK_USN, LDAP_WATERMARK_TIMESTAMP]
+# Sharded syncs split entries by the first character of this attribute, which is required
+# by the object classes commonly used for users and groups
+LDAP_SHARD_ATTRIBUTE = "cn"
+LDAP_SHARD_PREFIXES = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def shard_filter(shard: int, shard_count: int) -> str:
+    """Build a filter matching the entries of `shard` out of `shard_count` shards. Prefixes
+    are distributed round-robin to spread common initials, the first shard also contains
+    all entries that don't start with any of the prefixes."""
+    prefixes = "".join(
+        f"({LDAP_SHARD_ATTRIBUTE}={prefix}*)" for prefix in LDAP_SHARD_PREFIXES[shard::shard_count]
+    )
+    if shard == 0:
+        all_prefixes = "".join(
+            f"({LDAP_SHARD_ATTRIBUTE}={prefix}*)" for prefix in LDAP_SHARD_PREFIXES
+        )
+        prefixes += f"(!(|{all_prefixes}))"
+    return f"(|{prefixes})"
+
+
+@dataclass
+class LDAPSyncEntry:
+    """Single LDAP entry and the data built from it by the property mappings"""
+
+    object_dn: str
+    uniq: str
+    attributes: dict[str, Any]
+    data: dict[str, Any]
 
 
 class BaseLDAPSynchronizer:
@@ -21,10 +67,30 @@ class BaseLDAPSynchronizer:
     _logger: BoundLogger
     _messages: list[str]
 
-    def __init__(self, source: LDAPSource):
+    # Key in `LDAPSource.sync_watermarks` this synchronizer stores its watermark in
+    watermark_key = ""
+    incremental: bool
+    shard: int
+    shard_count: int
+
+    def __init__(
+        self,
+        source: LDAPSource,
+        incremental: bool = False,
+        shard: int = 0,
+        shard_count: int = 1,
+    ):
         self._source = source
         self._messages = []
         self._logger = get_logger().bind(source=source, syncer=self.__class__.__name__)
+        self.incremental = incremental
+        self.shard = shard
+        self.shard_count = shard_count
+        if shard_count > 1:
+            self._logger = self._logger.bind(shard=shard)
+            self.watermark_key = f"{self.watermark_key}_{shard}"
+        self._watermarks: dict[str, Any] = {}
+        self._watermark_server = None
 
     @property
     def messages(self) -> list[str]:
@@ -54,6 +120,95 @@ class BaseLDAPSynchronizer:
         """Sync function, implemented in subclass"""
         raise NotImplementedError()
 
+    def sync_error(self, entry: LDAPSyncEntry, exc: Exception):
+        """Report an entry which couldn't be synced"""
+        self.message(f"Failed to sync '{entry.object_dn}': {str(exc)}", dn=entry.object_dn)
+
+    def pages(self, entries: Iterable[dict[str, Any]]) -> Iterator[list[dict[str, Any]]]:
+        """Split search results into pages of `LDAP_SYNC_PAGE_SIZE` entries"""
+        entries = iter(entries)
+        while page := list(islice(entries, LDAP_SYNC_PAGE_SIZE)):
+            for entry in page:
+                self.track_watermark(entry.get("attributes", {}))
+            yield page
+
+    def search_filter(self, connection: Connection, object_filter: str) -> str:
+        """Restrict `object_filter` to this synchronizer's shard, and to entries which changed
+        since the last sync when running incrementally. Without a usable watermark,
+        all entries are fetched."""
+        filters = [object_filter]
+        if self.shard_count > 1:
+            filters.append(shard_filter(self.shard, self.shard_count))
+        self._watermark_server = connection.server.name
+        watermark = self._watermark_filter()
+        if watermark:
+            filters.append(watermark)
+        if len(filters) == 1:
+            return object_filter
+        return f"(&{''.join(filters)})"
+
+    def _watermark_filter(self) -> Optional[str]:
+        """Filter for entries changed since the last sync, if running incrementally"""
+        watermark: Optional[dict[str, Any]] = self._source.sync_watermarks.get(self.watermark_key)
+        if not self.incremental or not watermark:
+            return None
+        attribute, value = watermark.get("attribute"), watermark.get("value")
+        if attribute == LDAP_WATERMARK_USN:
+            # USNs are local to a domain controller and can't be compared across servers
+            if watermark.get("server") != self._watermark_server:
+                self._logger.debug("Watermark is from a different server, running full sync")
+                return None
+            value = int(value) + 1
+        elif attribute != LDAP_WATERMARK_TIMESTAMP:
+            return None
+        self._logger.debug("Running incremental sync", attribute=attribute, value=value)
+        return f"({attribute}>={value})"
+
+    def _watermark_value(self, attribute: str, value: Any) -> Any:
+        """Normalise a watermark attribute's value so values can be compared"""
+        if attribute == LDAP_WATERMARK_USN:
+            return int(value)
+        if isinstance(value, datetime):
+            if not value.tzinfo:
+                value = value.replace(tzinfo=UTC)
+            return value.astimezone(UTC).strftime("%Y%m%d%H%M%SZ")
+        # Generalized time, drop fractions and assume UTC
+        return str(value)[:14] + "Z"
+
+    def track_watermark(self, attributes: dict[str, Any]):
+        """Keep track of the highest watermark value seen during this sync"""
+        for attribute in LDAP_WATERMARK_ATTRIBUTES:
+            value = self._flatten(attributes.get(attribute))
+            if value is None:
+                continue
+            try:
+                value = self._watermark_value(attribute, value)
+            except ValueError:
+                continue
+            if attribute not in self._watermarks or value > self._watermarks[attribute]:
+                self._watermarks[attribute] = value
+
+    def save_watermark(self):
+        """Save the highest watermark seen, so the next incremental sync only fetches
+        entries changed afterwards. Should only be called once the sync succeeded."""
+        attribute = next(
+            (attribute for attribute in LDAP_WATERMARK_ATTRIBUTES if attribute in self._watermarks),
+            None,
+        )
+        if not attribute or not self.watermark_key:
+            return
+        with transaction.atomic():
+            # Lock the source, as other synchronizers of this source may run concurrently
+            source = LDAPSource.objects.select_for_update().get(pk=self._source.pk)
+            watermarks = source.sync_watermarks
+            watermarks[self.watermark_key] = {
+                "attribute": attribute,
+                "value": str(self._watermarks[attribute]),
+                "server": self._watermark_server,
+            }
+            LDAPSource.objects.filter(pk=self._source.pk).update(sync_watermarks=watermarks)
+        self._source.sync_watermarks = watermarks
+
     def _flatten(self, value: Any) -> Any:
         """Flatten `value` if its a list"""
         if isinstance(value, list):
@@ -62,38 +217,48 @@ class BaseLDAPSynchronizer:
             return value[0]
         return value
 
+    def _resolve_mappings(self, mappings: QuerySet) -> list[LDAPPropertyMapping]:
+        """Resolve the LDAP property mappings of `mappings` to their subclasses"""
+        return [
+            mapping
+            for mapping in mappings.all().select_subclasses()
+            if isinstance(mapping, LDAPPropertyMapping)
+        ]
+
+    @cached_property
+    def user_property_mappings(self) -> list[LDAPPropertyMapping]:
+        """Property mappings for users, resolved once per sync run"""
+        return self._resolve_mappings(self._source.property_mappings)
+
+    @cached_property
+    def group_property_mappings(self) -> list[LDAPPropertyMapping]:
+        """Property mappings for groups, resolved once per sync run"""
+        return self._resolve_mappings(self._source.property_mappings_group)
+
+    @cached_property
+    def _evaluator(self) -> PropertyMappingEvaluator:
+        """Evaluator shared by all mappings of a sync run, the context is updated per object"""
+        return PropertyMappingEvaluator()
+
     def build_user_properties(self, user_dn: str, **kwargs) -> dict[str, Any]:
         """Build attributes for User object based on property mappings."""
-        return self._build_object_properties(user_dn, self._source.property_mappings, **kwargs)
+        return self._build_object_properties(user_dn, self.user_property_mappings, **kwargs)
 
     def build_group_properties(self, group_dn: str, **kwargs) -> dict[str, Any]:
         """Build attributes for Group object based on property mappings."""
-        return self._build_object_properties(
-            group_dn, self._source.property_mappings_group, **kwargs
-        )
+        return self._build_object_properties(group_dn, self.group_property_mappings, **kwargs)
 
     def _build_object_properties(
-        self, object_dn: str, mappings: QuerySet, **kwargs
+        self, object_dn: str, mappings: list[LDAPPropertyMapping], **kwargs
     ) -> dict[str, dict[Any, Any]]:
         properties = {"attributes": {}}
-        for mapping in mappings.all().select_subclasses():
-            if not isinstance(mapping, LDAPPropertyMapping):
-                continue
-            mapping: LDAPPropertyMapping
+        evaluator = self._evaluator
+        evaluator.set_context(user=None, request=None, mapping=None, ldap=kwargs, dn=object_dn)
+        for mapping in mappings:
+            evaluator.set_mapping(mapping)
             try:
-                value = mapping.evaluate(user=None, request=None, ldap=kwargs, dn=object_dn)
-                if value is None:
-                    continue
-                if isinstance(value, (bytes)):
-                    continue
-                object_field = mapping.object_field
-                if object_field.startswith("attributes."):
-                    # Because returning a list might desired, we can't
-                    # rely on self._flatten here. Instead, just save the result as-is
-                    properties["attributes"][object_field.replace("attributes.", "")] = value
-                else:
-                    properties[object_field] = self._flatten(value)
-            except PropertyMappingExpressionException as exc:
+                value = evaluator.evaluate(mapping.expression)
+            except Exception as exc:  # pylint: disable=broad-except
                 Event.new(
                     EventAction.CONFIGURATION_ERROR,
                     message=f"Failed to evaluate property-mapping: {str(exc)}",
@@ -101,6 +266,17 @@ class BaseLDAPSynchronizer:
                 ).save()
                 self._logger.warning("Mapping failed to evaluate", exc=exc, mapping=mapping)
                 continue
+            if value is None:
+                continue
+            if isinstance(value, (bytes)):
+                continue
+            object_field = mapping.object_field
+            if object_field.startswith("attributes."):
+                # Because returning a list might desired, we can't
+                # rely on self._flatten here. Instead, just save the result as-is
+                properties["attributes"][object_field.replace("attributes.", "")] = value
+            else:
+                properties[object_field] = self._flatten(value)
         if self._source.object_uniqueness_field in kwargs:
             properties["attributes"][LDAP_UNIQUENESS] = self._flatten(
                 kwargs.get(self._source.object_uniqueness_field)
@@ -128,3 +304,75 @@ class BaseLDAPSynchronizer:
         instance.attributes = final_atttributes
         instance.save()
         return (instance, False)
+
+    def bulk_update_or_create_attributes(
+        self,
+        obj: type[Model],
+        query: dict[str, Any],
+        entries: list[LDAPSyncEntry],
+    ) -> list[tuple[LDAPSyncEntry, Model, bool]]:
+        """Batched version of `update_or_create_attributes` for a page of entries. Existing
+        objects matching `query` are fetched by their uniqueness attribute in a single query,
+        attributes are merged in memory, and changes are written with `bulk_create` and
+        `bulk_update`. Raises if any object can't be written; nothing is saved then."""
+        existing: dict[str, Model] = {}
+        for instance in obj.objects.filter(
+            **query, **{f"attributes__{LDAP_UNIQUENESS}__in": [entry.uniq for entry in entries]}
+        ).order_by("pk"):
+            existing.setdefault(instance.attributes.get(LDAP_UNIQUENESS), instance)
+        results = []
+        to_create: list[Model] = []
+        to_update: dict[Any, Model] = {}
+        fields = {"attributes"}
+        for entry in entries:
+            instance = existing.get(entry.uniq)
+            if not instance:
+                instance = obj(**entry.data)
+                existing[entry.uniq] = instance
+                to_create.append(instance)
+                results.append((entry, instance, True))
+                continue
+            for key, value in entry.data.items():
+                if key == "attributes":
+                    continue
+                setattr(instance, key, value)
+                fields.add(key)
+            final_atttributes = {}
+            MERGE_LIST_UNIQUE.merge(final_atttributes, instance.attributes)
+            MERGE_LIST_UNIQUE.merge(final_atttributes, entry.data.get("attributes", {}))
+            instance.attributes = final_atttributes
+            # Objects created earlier in this page are saved by bulk_create
+            if instance.pk and not instance._state.adding:
+                to_update[instance.pk] = instance
+            results.append((entry, instance, False))
+        # Only concrete fields can be updated in bulk, others are ignored just like save() does
+        fields &= {field.name for field in obj._meta.concrete_fields}
+        with transaction.atomic():
+            obj.objects.bulk_create(to_create)
+            obj.objects.bulk_update(to_update.values(), fields)
+        return results
+
+    def sync_page(
+        self,
+        obj: type[Model],
+        query: dict[str, Any],
+        entries: list[LDAPSyncEntry],
+    ) -> list[tuple[LDAPSyncEntry, Model, bool]]:
+        """Write a page of entries with `bulk_update_or_create_attributes`. If that fails, the
+        page is written object by object so errors can be attributed to single entries."""
+        try:
+            return self.bulk_update_or_create_attributes(obj, query, entries)
+        except (IntegrityError, FieldError, TypeError, ValueError) as exc:
+            self._logger.debug("Failed to write page, syncing objects individually", exc=exc)
+        results = []
+        for entry in entries:
+            try:
+                with transaction.atomic():
+                    instance, created = self.update_or_create_attributes(
+                        obj, {**query, f"attributes__{LDAP_UNIQUENESS}": entry.uniq}, entry.data
+                    )
+            except (IntegrityError, FieldError, TypeError) as exc:
+                self.sync_error(entry, exc)
+                continue
+            results.append((entry, instance, created))
+        return results
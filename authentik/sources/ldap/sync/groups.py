@@ -1,4 +1,6 @@
 """Sync LDAP Users and groups into authentik"""
+from typing import Any
+
 import ldap3
 import ldap3.core.exceptions
 from django.core.exceptions import FieldError
@@ -6,25 +8,36 @@ from django.db.utils import IntegrityError
 
 from authentik.core.models import Group
 from authentik.events.models import Event, EventAction
-from authentik.sources.ldap.sync.base import LDAP_UNIQUENESS, BaseLDAPSynchronizer
+from authentik.sources.ldap.sync.base import LDAP_UNIQUENESS, BaseLDAPSynchronizer, LDAPSyncEntry
 
 
 class GroupLDAPSynchronizer(BaseLDAPSynchronizer):
     """Sync LDAP Users and groups into authentik"""
 
+    watermark_key = "groups"
+
     def sync(self) -> int:
         """Iterate over all LDAP Groups and create authentik_core.Group instances"""
         if not self._source.sync_groups:
             self.message("Group syncing is disabled for this Source")
             return -1
-        groups = self._source.connection.extend.standard.paged_search(
+        connection = self._source.connection
+        groups = connection.extend.standard.paged_search(
             search_base=self.base_dn_groups,
-            search_filter=self._source.group_object_filter,
+            search_filter=self.search_filter(connection, self._source.group_object_filter),
             search_scope=ldap3.SUBTREE,
             attributes=[ldap3.ALL_ATTRIBUTES, ldap3.ALL_OPERATIONAL_ATTRIBUTES],
         )
         group_count = 0
-        for group in groups:
+        for page in self.pages(groups):
+            group_count += self.sync_groups(page)
+        self.save_watermark()
+        return group_count
+
+    def sync_groups(self, page: list[dict[str, Any]]) -> int:
+        """Build properties for a page of LDAP groups and write them in bulk"""
+        entries = []
+        for group in page:
             attributes = group.get("attributes", {})
             group_dn = self._flatten(self._flatten(group.get("entryDN", group.get("dn"))))
             if self._source.object_uniqueness_field not in attributes:
@@ -34,35 +47,37 @@ class GroupLDAPSynchronizer(BaseLDAPSynchronizer):
                     dn=group_dn,
                 )
                 continue
-            uniq = self._flatten(attributes[self._source.object_uniqueness_field])
+            entry = LDAPSyncEntry(
+                group_dn,
+                self._flatten(attributes[self._source.object_uniqueness_field]),
+                attributes,
+                {},
+            )
             try:
-                defaults = self.build_group_properties(group_dn, **attributes)
-                self._logger.debug("Creating group with attributes", **defaults)
-                if "name" not in defaults:
+                entry.data = self.build_group_properties(group_dn, **attributes)
+                self._logger.debug("Creating group with attributes", **entry.data)
+                if "name" not in entry.data:
                     raise IntegrityError("Name was not set by propertymappings")
                 # Special check for `users` field, as this is an M2M relation, and cannot be sync'd
-                if "users" in defaults:
-                    del defaults["users"]
-                ak_group, created = self.update_or_create_attributes(
-                    Group,
-                    {
-                        f"attributes__{LDAP_UNIQUENESS}": uniq,
-                        "parent": self._source.sync_parent_group,
-                    },
-                    defaults,
-                )
+                if "users" in entry.data:
+                    del entry.data["users"]
             except (IntegrityError, FieldError, TypeError) as exc:
-                Event.new(
-                    EventAction.CONFIGURATION_ERROR,
-                    message=(
-                        f"Failed to create group: {str(exc)} "
-                        "To merge new group with existing group, set the groups's "
-                        f"Attribute '{LDAP_UNIQUENESS}' to '{uniq}'"
-                    ),
-                    source=self._source,
-                    dn=group_dn,
-                ).save()
-            else:
-                self._logger.debug("Synced group", group=ak_group.name, created=created)
-                group_count += 1
-        return group_count
+                self.sync_error(entry, exc)
+                continue
+            entries.append(entry)
+        synced = self.sync_page(Group, {"parent": self._source.sync_parent_group}, entries)
+        for _, ak_group, created in synced:
+            self._logger.debug("Synced group", group=ak_group.name, created=created)
+        return len(synced)
+
+    def sync_error(self, entry: LDAPSyncEntry, exc: Exception):
+        Event.new(
+            EventAction.CONFIGURATION_ERROR,
+            message=(
+                f"Failed to create group: {str(exc)} "
+                "To merge new group with existing group, set the groups's "
+                f"Attribute '{LDAP_UNIQUENESS}' to '{entry.uniq}'"
+            ),
+            source=self._source,
+            dn=entry.object_dn,
+        ).save()
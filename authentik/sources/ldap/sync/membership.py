@@ -1,64 +1,137 @@
 """Sync LDAP Users and groups into authentik"""
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
 import ldap3
 import ldap3.core.exceptions
+from django.db import transaction
 from django.db.models import Q
+from django.utils.functional import cached_property
 
 from authentik.core.models import Group, User
 from authentik.sources.ldap.auth import LDAP_DISTINGUISHED_NAME
+from authentik.sources.ldap.metadata import get_metadata
 from authentik.sources.ldap.models import LDAPSource
-from authentik.sources.ldap.sync.base import LDAP_UNIQUENESS, BaseLDAPSynchronizer
+from authentik.sources.ldap.sync.base import (
+    LDAP_UNIQUENESS,
+    LDAP_WATERMARK_ATTRIBUTES,
+    BaseLDAPSynchronizer,
+)
 
 
 class MembershipLDAPSynchronizer(BaseLDAPSynchronizer):
     """Sync LDAP Users and groups into authentik"""
 
     group_cache: dict[str, Group]
+    watermark_key = "membership"
 
-    def __init__(self, source: LDAPSource):
-        super().__init__(source)
+    def __init__(self, source: LDAPSource, **kwargs):
+        super().__init__(source, **kwargs)
         self.group_cache: dict[str, Group] = {}
 
     def sync(self) -> int:
         """Iterate over all Users and assign Groups using memberOf Field"""
-        groups = self._source.connection.extend.standard.paged_search(
+        connection = self._source.connection
+        metadata = get_metadata(self._source)
+        groups = connection.extend.standard.paged_search(
             search_base=self.base_dn_groups,
-            search_filter=self._source.group_object_filter,
+            search_filter=self.search_filter(connection, self._source.group_object_filter),
             search_scope=ldap3.SUBTREE,
             attributes=[
                 self._source.group_membership_field,
                 self._source.object_uniqueness_field,
                 LDAP_DISTINGUISHED_NAME,
+            ]
+            + [
+                attribute
+                for attribute in LDAP_WATERMARK_ATTRIBUTES
+                if metadata.has_attribute(attribute)
             ],
         )
         membership_count = 0
-        for group in groups:
-            members = group.get("attributes", {}).get(self._source.group_membership_field, [])
+        for page in self.pages(groups):
+            membership_count += self.sync_memberships(page)
+        self.save_watermark()
+        self._logger.debug("Successfully updated group membership")
+        return membership_count
+
+    @property
+    def membership_mapping_attribute(self) -> str:
+        """User attribute which group members are matched against"""
+        if self._source.group_membership_field == "memberUid":
+            # If memberships are based on the posixGroup's 'memberUid'
+            # attribute we use the RDN instead of the FDN to lookup members.
+            return LDAP_UNIQUENESS
+        return LDAP_DISTINGUISHED_NAME
+
+    @cached_property
+    def user_index(self) -> dict[str, list[int]]:
+        """Map the membership mapping attribute of all users which have it to their PKs,
+        loaded once per sync"""
+        index = {}
+        for pk, value in User.objects.filter(
+            **{f"attributes__{self.membership_mapping_attribute}__isnull": False}
+        ).values_list("pk", f"attributes__{self.membership_mapping_attribute}"):
+            if isinstance(value, str):
+                index.setdefault(value, []).append(pk)
+        return index
+
+    @cached_property
+    def indexed_users(self) -> set[int]:
+        """PKs of all users which are matched against group members"""
+        return {pk for pks in self.user_index.values() for pk in pks}
+
+    def get_members(self, group_dict: dict[str, Any]) -> set[int]:
+        """Resolve the members of an LDAP group to user PKs"""
+        members = group_dict.get("attributes", {}).get(self._source.group_membership_field, [])
+        if isinstance(members, str):
+            members = [members]
+        return {pk for member in members for pk in self.user_index.get(member, [])}
+
+    def current_memberships(self, group_pks: Iterable[int]) -> dict[int, set[int]]:
+        """Get the PKs of the current members of all groups in `group_pks`"""
+        current: dict[int, set[int]] = {}
+        for group_pk, user_pk in User.ak_groups.through.objects.filter(
+            group_id__in=group_pks
+        ).values_list("group_id", "user_id"):
+            current.setdefault(group_pk, set()).add(user_pk)
+        return current
+
+    def sync_memberships(self, page: list[dict[str, Any]]) -> int:
+        """Update memberships of a page of groups. Only added and removed memberships are
+        written, groups whose members didn't change aren't touched."""
+        groups: dict[int, tuple[Group, set[int]]] = {}
+        for group in page:
             ak_group = self.get_group(group)
             if not ak_group:
                 continue
-
-            membership_mapping_attribute = LDAP_DISTINGUISHED_NAME
-            if self._source.group_membership_field == "memberUid":
-                # If memberships are based on the posixGroup's 'memberUid'
-                # attribute we use the RDN instead of the FDN to lookup members.
-                membership_mapping_attribute = LDAP_UNIQUENESS
-
-            users = User.objects.filter(
-                Q(**{f"attributes__{membership_mapping_attribute}__in": members})
-                | Q(
-                    **{
-                        f"attributes__{membership_mapping_attribute}__isnull": True,
-                        "ak_groups__in": [ak_group],
-                    }
-                )
+            groups[ak_group.pk] = (ak_group, self.get_members(group))
+        current = self.current_memberships(groups.keys())
+        membership_count = 0
+        to_add = []
+        to_remove = Q()
+        changed = []
+        for group_pk, (ak_group, users) in groups.items():
+            existing = current.get(group_pk, set())
+            # Users which aren't from LDAP keep their memberships
+            users |= existing - self.indexed_users
+            membership_count += 1 + len(users)
+            added, removed = users - existing, existing - users
+            if not added and not removed:
+                continue
+            to_add.extend(
+                User.ak_groups.through(group_id=group_pk, user_id=user_pk) for user_pk in added
             )
-            membership_count += 1
-            membership_count += users.count()
-            ak_group.users.set(users)
-            ak_group.save()
-        self._logger.debug("Successfully updated group membership")
+            if removed:
+                to_remove |= Q(group_id=group_pk, user_id__in=removed)
+            changed.append(ak_group)
+        if not changed:
+            return membership_count
+        with transaction.atomic():
+            User.ak_groups.through.objects.bulk_create(to_add, ignore_conflicts=True)
+            if to_remove:
+                User.ak_groups.through.objects.filter(to_remove).delete()
+            for ak_group in changed:
+                ak_group.save()
         return membership_count
 
     def get_group(self, group_dict: dict[str, Any]) -> Optional[Group]:
@@ -75,12 +148,12 @@ class MembershipLDAPSynchronizer(BaseLDAPSynchronizer):
                 return None
             group_uniq = group_uniq[0]
         if group_uniq not in self.group_cache:
-            groups = Group.objects.filter(**{f"attributes__{LDAP_UNIQUENESS}": group_uniq})
-            if not groups.exists():
+            group = Group.objects.filter(**{f"attributes__{LDAP_UNIQUENESS}": group_uniq}).first()
+            if not group:
                 self.message(
                     f"Group does not exist in our DB yet, run sync_groups first: '{group_dn}'",
                     group=group_dn,
                 )
                 return None
-            self.group_cache[group_uniq] = groups.first()
+            self.group_cache[group_uniq] = group
         return self.group_cache[group_uniq]
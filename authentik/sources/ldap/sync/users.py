@@ -1,4 +1,6 @@
 """Sync LDAP Users into authentik"""
+from typing import Any
+
 import ldap3
 import ldap3.core.exceptions
 from django.core.exceptions import FieldError
@@ -6,7 +8,8 @@ from django.db.utils import IntegrityError
 
 from authentik.core.models import User
 from authentik.events.models import Event, EventAction
-from authentik.sources.ldap.sync.base import LDAP_UNIQUENESS, BaseLDAPSynchronizer
+from authentik.sources.ldap.metadata import LDAPVendor, get_metadata
+from authentik.sources.ldap.sync.base import LDAP_UNIQUENESS, BaseLDAPSynchronizer, LDAPSyncEntry
 from authentik.sources.ldap.sync.vendor.freeipa import FreeIPA
 from authentik.sources.ldap.sync.vendor.ms_ad import MicrosoftActiveDirectory
 
@@ -14,19 +17,30 @@ from authentik.sources.ldap.sync.vendor.ms_ad import MicrosoftActiveDirectory
 class UserLDAPSynchronizer(BaseLDAPSynchronizer):
     """Sync LDAP Users into authentik"""
 
+    watermark_key = "users"
+
     def sync(self) -> int:
         """Iterate over all LDAP Users and create authentik_core.User instances"""
         if not self._source.sync_users:
             self.message("User syncing is disabled for this Source")
             return -1
-        users = self._source.connection.extend.standard.paged_search(
+        connection = self._source.connection
+        users = connection.extend.standard.paged_search(
             search_base=self.base_dn_users,
-            search_filter=self._source.user_object_filter,
+            search_filter=self.search_filter(connection, self._source.user_object_filter),
             search_scope=ldap3.SUBTREE,
             attributes=[ldap3.ALL_ATTRIBUTES, ldap3.ALL_OPERATIONAL_ATTRIBUTES],
         )
         user_count = 0
-        for user in users:
+        for page in self.pages(users):
+            user_count += self.sync_users(page)
+        self.save_watermark()
+        return user_count
+
+    def sync_users(self, page: list[dict[str, Any]]) -> int:
+        """Build properties for a page of LDAP users and write them in bulk"""
+        entries = []
+        for user in page:
             attributes = user.get("attributes", {})
             user_dn = self._flatten(user.get("entryDN", user.get("dn")))
             if self._source.object_uniqueness_field not in attributes:
@@ -36,29 +50,48 @@ class UserLDAPSynchronizer(BaseLDAPSynchronizer):
                     dn=user_dn,
                 )
                 continue
-            uniq = self._flatten(attributes[self._source.object_uniqueness_field])
+            entry = LDAPSyncEntry(
+                user_dn,
+                self._flatten(attributes[self._source.object_uniqueness_field]),
+                attributes,
+                {},
+            )
             try:
-                defaults = self.build_user_properties(user_dn, **attributes)
-                self._logger.debug("Creating user with attributes", **defaults)
-                if "username" not in defaults:
+                entry.data = self.build_user_properties(user_dn, **attributes)
+                self._logger.debug("Creating user with attributes", **entry.data)
+                if "username" not in entry.data:
                     raise IntegrityError("Username was not set by propertymappings")
-                ak_user, created = self.update_or_create_attributes(
-                    User, {f"attributes__{LDAP_UNIQUENESS}": uniq}, defaults
-                )
             except (IntegrityError, FieldError, TypeError) as exc:
-                Event.new(
-                    EventAction.CONFIGURATION_ERROR,
-                    message=(
-                        f"Failed to create user: {str(exc)} "
-                        "To merge new user with existing user, set the user's "
-                        f"Attribute '{LDAP_UNIQUENESS}' to '{uniq}'"
-                    ),
-                    source=self._source,
-                    dn=user_dn,
-                ).save()
-            else:
-                self._logger.debug("Synced User", user=ak_user.username, created=created)
-                user_count += 1
-                MicrosoftActiveDirectory(self._source).sync(attributes, ak_user, created)
-                FreeIPA(self._source).sync(attributes, ak_user, created)
-        return user_count
+                self.sync_error(entry, exc)
+                continue
+            entries.append(entry)
+        changed = []
+        metadata = get_metadata(self._source)
+        vendors = [
+            vendor(self._source)
+            for vendor, name in [
+                (MicrosoftActiveDirectory, LDAPVendor.ACTIVE_DIRECTORY),
+                (FreeIPA, LDAPVendor.FREEIPA),
+            ]
+            if metadata.is_vendor(name)
+        ]
+        synced = self.sync_page(User, {}, entries)
+        for entry, ak_user, created in synced:
+            self._logger.debug("Synced User", user=ak_user.username, created=created)
+            vendor_changed = [vendor.sync(entry.attributes, ak_user, created) for vendor in vendors]
+            if any(vendor_changed):
+                changed.append(ak_user)
+        User.objects.bulk_update(changed, ["password", "is_active"])
+        return len(synced)
+
+    def sync_error(self, entry: LDAPSyncEntry, exc: Exception):
+        Event.new(
+            EventAction.CONFIGURATION_ERROR,
+            message=(
+                f"Failed to create user: {str(exc)} "
+                "To merge new user with existing user, set the user's "
+                f"Attribute '{LDAP_UNIQUENESS}' to '{entry.uniq}'"
+            ),
+            source=self._source,
+            dn=entry.object_dn,
+        ).save()
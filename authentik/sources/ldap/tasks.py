@@ -1,12 +1,18 @@
 """LDAP Sync tasks"""
+from typing import Optional
+
+from celery import chord
 from ldap3.core.exceptions import LDAPException
 from structlog.stdlib import get_logger
 
 from authentik.events.monitored_tasks import MonitoredTask, TaskResult, TaskResultStatus
+from authentik.lib.config import CONFIG
 from authentik.lib.utils.errors import exception_to_string
 from authentik.lib.utils.reflection import class_to_path, path_to_class
 from authentik.root.celery import CELERY_APP
+from authentik.sources.ldap.metadata import refresh_metadata
 from authentik.sources.ldap.models import LDAPSource
+from authentik.sources.ldap.sync.base import LDAP_SHARD_PREFIXES
 from authentik.sources.ldap.sync.groups import GroupLDAPSynchronizer
 from authentik.sources.ldap.sync.membership import MembershipLDAPSynchronizer
 from authentik.sources.ldap.sync.users import UserLDAPSynchronizer
@@ -14,34 +20,91 @@ from authentik.sources.ldap.sync.users import UserLDAPSynchronizer
 LOGGER = get_logger()
 
 
+def ldap_sync_shard_count() -> int:
+    """Amount of shards user and group syncs are split into"""
+    return min(max(int(CONFIG.y("ldap.sync_shards", 1)), 1), len(LDAP_SHARD_PREFIXES))
+
+
+def ldap_sync_source(source: LDAPSource, incremental: bool = False):
+    """Queue a sync of `source`. Users and groups are synced in parallel shards,
+    group memberships are synced once all of them finished."""
+    shard_count = ldap_sync_shard_count()
+    shards = [
+        ldap_sync.si(source.pk, class_to_path(sync_class), incremental, shard, shard_count)
+        for sync_class in [UserLDAPSynchronizer, GroupLDAPSynchronizer]
+        for shard in range(shard_count)
+    ]
+    chord(shards)(ldap_sync_shards_finished.s(source.pk, incremental))
+
+
+@CELERY_APP.task()
+def ldap_sync_all(incremental: bool = False):
+    """Sync all sources, when `incremental` is set only entries which changed
+    since the last sync are fetched"""
+    for source in LDAPSource.objects.filter(enabled=True):
+        ldap_sync_source(source, incremental)
+
+
 @CELERY_APP.task()
-def ldap_sync_all():
-    """Sync all sources"""
+def ldap_refresh_metadata_all():
+    """Refresh the cached directory metadata of all sources"""
     for source in LDAPSource.objects.filter(enabled=True):
-        for sync_class in [
-            UserLDAPSynchronizer,
-            GroupLDAPSynchronizer,
-            MembershipLDAPSynchronizer,
-        ]:
-            ldap_sync.delay(source.pk, class_to_path(sync_class))
+        try:
+            refresh_metadata(source)
+        except LDAPException as exc:
+            LOGGER.warning("Failed to refresh LDAP directory metadata", source=source, exc=exc)
+
+
+@CELERY_APP.task(bind=True, base=MonitoredTask)
+def ldap_sync_shards_finished(
+    self: MonitoredTask, results: list[Optional[list[str]]], source_pk: str, incremental: bool
+):
+    """Collect the results of all user and group sync shards and start the membership sync"""
+    try:
+        source: LDAPSource = LDAPSource.objects.get(pk=source_pk)
+    except LDAPSource.DoesNotExist:
+        return
+    self.set_uid(f"{source.slug}_shards")
+    messages = []
+    status = TaskResultStatus.SUCCESSFUL
+    for result in results:
+        if result is None:
+            status = TaskResultStatus.WARNING
+            continue
+        messages.extend(result)
+    failed = results.count(None)
+    messages.append(f"Finished {len(results) - failed} of {len(results)} shards.")
+    self.set_status(TaskResult(status, messages))
+    ldap_sync.delay(source.pk, class_to_path(MembershipLDAPSynchronizer), incremental)
 
 
 @CELERY_APP.task(
     bind=True, base=MonitoredTask, soft_time_limit=60 * 60 * 2, task_time_limit=60 * 60 * 2
 )
-def ldap_sync(self: MonitoredTask, source_pk: str, sync_class: str):
-    """Synchronization of an LDAP Source"""
+# pylint: disable=too-many-arguments
+def ldap_sync(
+    self: MonitoredTask,
+    source_pk: str,
+    sync_class: str,
+    incremental: bool = False,
+    shard: int = 0,
+    shard_count: int = 1,
+) -> Optional[list[str]]:
+    """Synchronization of an LDAP Source, returns the status messages if successful"""
     self.result_timeout_hours = 2
     try:
         source: LDAPSource = LDAPSource.objects.get(pk=source_pk)
     except LDAPSource.DoesNotExist:
         # Because the source couldn't be found, we don't have a UID
         # to set the state with
-        return
+        return None
     sync = path_to_class(sync_class)
-    self.set_uid(f"{source.slug}_{sync.__name__.replace('LDAPSynchronizer', '').lower()}")
+    uid = f"{source.slug}_{sync.__name__.replace('LDAPSynchronizer', '').lower()}"
+    if shard_count > 1:
+        uid += f"_{shard}"
+    self.set_uid(uid)
     try:
-        sync_inst = sync(source)
+        sync_inst = sync(source, incremental=incremental, shard=shard, shard_count=shard_count)
         count = sync_inst.sync()
         messages = sync_inst.messages
         messages.append(f"Synced {count} objects.")
@@ -51,7 +114,10 @@ def ldap_sync(self: MonitoredTask, source_pk: str, sync_class: str):
                 messages,
             )
         )
-    except LDAPException as exc:
+        return messages
+    # Errors aren't raised, so the membership sync still runs when a shard fails
+    except Exception as exc:  # pylint: disable=broad-except
         # No explicit event is created here as .set_status with an error will do that
         LOGGER.warning(exception_to_string(exc))
         self.set_status(TaskResult(TaskResultStatus.ERROR).with_error(exc))
+        return None
@@ -0,0 +1,77 @@
+"""LDAP Source directory metadata tests"""
+from unittest.mock import PropertyMock, patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from authentik.lib.generators import generate_id, generate_key
+from authentik.sources.ldap.metadata import (
+    LDAPVendor,
+    get_metadata,
+    metadata_cache_key,
+    refresh_metadata,
+)
+from authentik.sources.ldap.models import LDAPSource
+from authentik.sources.ldap.password import LDAPPasswordChanger
+from authentik.sources.ldap.tests.mock_ad import mock_ad_connection
+from authentik.sources.ldap.tests.mock_slapd import mock_slapd_connection
+
+LDAP_PASSWORD = generate_key()
+
+
+class LDAPMetadataTests(TestCase):
+    """LDAP Source directory metadata tests"""
+
+    def setUp(self):
+        self.source = LDAPSource.objects.create(
+            name=generate_id(),
+            slug=generate_id(),
+            base_dn="dc=goauthentik,dc=io",
+        )
+
+    def test_ad(self):
+        """Test metadata of an Active Directory"""
+        connection = mock_ad_connection(LDAP_PASSWORD)
+        connection.strategy.add_entry(
+            "DC=AD2012,DC=LAB", {"objectClass": "domainDNS", "pwdProperties": 1}
+        )
+        with patch(
+            "authentik.sources.ldap.models.LDAPSource.connection",
+            PropertyMock(return_value=connection),
+        ):
+            metadata = get_metadata(self.source)
+        self.assertEqual(metadata.vendor, LDAPVendor.ACTIVE_DIRECTORY)
+        self.assertEqual(metadata.root_dn, "DC=AD2012,DC=LAB")
+        self.assertEqual(metadata.pwd_properties, 1)
+        self.assertTrue(metadata.has_attribute("uSNChanged"))
+        self.assertTrue(metadata.is_vendor(LDAPVendor.ACTIVE_DIRECTORY))
+        self.assertFalse(metadata.is_vendor(LDAPVendor.FREEIPA))
+        self.assertTrue(LDAPPasswordChanger(self.source).check_ad_password_complexity_enabled())
+
+    def test_openldap(self):
+        """Test metadata of an OpenLDAP directory"""
+        with patch(
+            "authentik.sources.ldap.models.LDAPSource.connection",
+            PropertyMock(return_value=mock_slapd_connection(LDAP_PASSWORD)),
+        ):
+            metadata = get_metadata(self.source)
+        self.assertEqual(metadata.vendor, LDAPVendor.OPENLDAP)
+        self.assertEqual(metadata.root_dn, "o=test")
+        self.assertIsNone(metadata.pwd_properties)
+        self.assertFalse(metadata.has_attribute("uSNChanged"))
+        self.assertTrue(metadata.has_attribute("modifyTimestamp"))
+        self.assertFalse(LDAPPasswordChanger(self.source).check_ad_password_complexity_enabled())
+
+    def test_cache(self):
+        """Test metadata being cached until the source is saved"""
+        connection = PropertyMock(return_value=mock_ad_connection(LDAP_PASSWORD))
+        with patch("authentik.sources.ldap.models.LDAPSource.connection", connection):
+            refresh_metadata(self.source)
+            self.assertEqual(connection.call_count, 1)
+            # Cached metadata is used without checking out a connection
+            with patch("authentik.sources.ldap.metadata.LDAP_POOLS") as pools:
+                get_metadata(self.source)
+                LDAPPasswordChanger(self.source).get_domain_root_dn()
+                pools.get.assert_not_called()
+        self.source.save()
+        self.assertIsNone(cache.get(metadata_cache_key(self.source)))
@@ -0,0 +1,101 @@
+"""LDAP Source connection pool tests"""
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from ldap3.core.exceptions import LDAPNoSuchObjectResult, LDAPSocketReceiveError
+
+from authentik.core.models import User
+from authentik.lib.generators import generate_id, generate_key
+from authentik.sources.ldap.auth import LDAP_DISTINGUISHED_NAME, LDAPBackend
+from authentik.sources.ldap.models import LDAPSource
+from authentik.sources.ldap.pool import LDAP_POOLS, LDAPConnectionPool
+from authentik.sources.ldap.tests.mock_ad import mock_ad_connection
+
+LDAP_PASSWORD = generate_key()
+
+
+class LDAPPoolTests(TestCase):
+    """LDAP Source connection pool tests"""
+
+    def setUp(self):
+        self.source = LDAPSource.objects.create(
+            name=generate_id(),
+            slug=generate_id(),
+            base_dn="dc=goauthentik,dc=io",
+        )
+
+    def test_reuse(self):
+        """Test connections being re-used, and discarded after connection errors"""
+        opener = MagicMock(side_effect=lambda: MagicMock(closed=False))
+        pool = LDAPConnectionPool(self.source, "test", opener)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(first, second)
+            # Connections are only used by a single caller at a time
+            with pool.connection() as third:
+                self.assertIsNot(first, third)
+        self.assertEqual(opener.call_count, 2)
+        # Errors sent by the server don't affect the connection
+        with self.assertRaises(LDAPNoSuchObjectResult):
+            with pool.connection() as connection:
+                raise LDAPNoSuchObjectResult()
+        with pool.connection() as connection:
+            self.assertIn(connection, [first, third])
+            with self.assertRaises(LDAPSocketReceiveError):
+                with pool.connection() as broken:
+                    raise LDAPSocketReceiveError()
+        with pool.connection() as connection:
+            with pool.connection() as other:
+                self.assertNotIn(broken, [connection, other])
+        broken.unbind.assert_called_once()
+
+    def test_size(self):
+        """Test amount of idle connections being bounded, and unhealthy connections
+        being replaced"""
+        opener = MagicMock(side_effect=lambda: MagicMock(closed=False))
+        pool = LDAPConnectionPool(self.source, "test", opener)
+        pool.size = 1
+        with pool.connection() as first:
+            with pool.connection() as second:
+                pass
+        first.unbind.assert_called_once()
+        second.closed = True
+        with pool.connection() as connection:
+            self.assertNotIn(connection, [first, second])
+        pool.health_check_interval = 0
+        connection.search.side_effect = LDAPSocketReceiveError()
+        with pool.connection() as healthy:
+            self.assertIsNot(healthy, connection)
+        self.assertEqual(opener.call_count, 4)
+
+    def test_settings_changed(self):
+        """Test pools being replaced when the source's connection settings change"""
+        pools = LDAP_POOLS.get(self.source)
+        self.assertIs(LDAP_POOLS.get(LDAPSource.objects.get(pk=self.source.pk)), pools)
+        self.source.server_uri = "ldap://goauthentik.io"
+        self.source.save()
+        self.assertIsNot(LDAP_POOLS.get(self.source), pools)
+
+    def test_bind(self):
+        """Test user binds using pooled connections"""
+        connection = mock_ad_connection(LDAP_PASSWORD)
+        connection.raise_exceptions = True
+        user = User.objects.create(
+            username=generate_id(),
+            attributes={LDAP_DISTINGUISHED_NAME: "cn=user3,ou=users,dc=goauthentik,dc=io"},
+        )
+        backend = LDAPBackend()
+        with patch(
+            "authentik.sources.ldap.models.LDAPSource.open_connection",
+            MagicMock(return_value=connection),
+        ) as opener:
+            self.assertEqual(backend.auth_user_by_bind(self.source, user, "test2222"), user)
+            self.assertIsNone(backend.auth_user_by_bind(self.source, user, generate_key()))
+            self.assertEqual(backend.auth_user_by_bind(self.source, user, "test2222"), user)
+            opener.assert_called_once()
+        # Idle connections don't keep the credentials of the last user
+        idle, _ = LDAP_POOLS.get(self.source).bind._idle[0]
+        self.assertIs(idle, connection)
+        self.assertNotEqual(connection.user, user.attributes[LDAP_DISTINGUISHED_NAME])
+        self.assertNotEqual(connection.password, "test2222")
@@ -6,9 +6,11 @@ from django.test import TestCase
 
 from authentik.core.models import Group, User
 from authentik.events.models import Event, EventAction
+from authentik.events.monitored_tasks import TaskInfo
 from authentik.lib.generators import generate_key
 from authentik.managed.manager import ObjectManager
 from authentik.sources.ldap.models import LDAPPropertyMapping, LDAPSource
+from authentik.sources.ldap.sync.base import shard_filter
 from authentik.sources.ldap.sync.groups import GroupLDAPSynchronizer
 from authentik.sources.ldap.sync.membership import MembershipLDAPSynchronizer
 from authentik.sources.ldap.sync.users import UserLDAPSynchronizer
@@ -92,6 +94,96 @@ class LDAPSyncTests(TestCase):
             self.assertFalse(user.is_active)
             self.assertFalse(User.objects.filter(username="user1_sn").exists())
 
+    def test_sync_users_mappings_resolved_once(self):
+        """Test property mappings being resolved once per sync run"""
+        self.source.property_mappings.set(
+            LDAPPropertyMapping.objects.filter(
+                Q(managed__startswith="goauthentik.io/sources/ldap/default")
+                | Q(managed__startswith="goauthentik.io/sources/ldap/ms")
+            )
+        )
+        self.source.save()
+        connection = PropertyMock(return_value=mock_ad_connection(LDAP_PASSWORD))
+        with patch("authentik.sources.ldap.models.LDAPSource.connection", connection):
+            user_sync = UserLDAPSynchronizer(self.source)
+            with patch.object(
+                UserLDAPSynchronizer,
+                "_resolve_mappings",
+                wraps=user_sync._resolve_mappings,
+            ) as resolve:
+                user_sync.sync()
+            resolve.assert_called_once()
+            self.assertTrue(User.objects.filter(username="user0_sn").exists())
+
+    def test_sync_users_bulk_fallback(self):
+        """Test a conflicting user in a page not preventing the rest of the page from syncing"""
+        self.source.property_mappings.set(
+            LDAPPropertyMapping.objects.filter(
+                Q(managed__startswith="goauthentik.io/sources/ldap/default")
+                | Q(managed__startswith="goauthentik.io/sources/ldap/ms")
+            )
+        )
+        self.source.save()
+        # Existing user without a matching ldap_uniq, which can't be created again
+        User.objects.create(username="user0_sn")
+        connection = PropertyMock(return_value=mock_ad_connection(LDAP_PASSWORD))
+        with patch("authentik.sources.ldap.models.LDAPSource.connection", connection):
+            user_sync = UserLDAPSynchronizer(self.source)
+            user_sync.sync()
+        self.assertTrue(User.objects.filter(username="sAMAccountName").exists())
+        self.assertEqual(User.objects.filter(username="user0_sn").count(), 1)
+        events = Event.objects.filter(
+            action=EventAction.CONFIGURATION_ERROR,
+            context__message__startswith="Failed to create user",
+        )
+        self.assertTrue(events.exists())
+
+    def test_sync_users_incremental(self):
+        """Test incremental sync only fetching users changed since the last sync"""
+        self.source.property_mappings.set(
+            LDAPPropertyMapping.objects.filter(
+                Q(managed__startswith="goauthentik.io/sources/ldap/default")
+                | Q(managed__startswith="goauthentik.io/sources/ldap/ms")
+            )
+        )
+        self.source.save()
+        connection = mock_ad_connection(LDAP_PASSWORD)
+        connection.strategy.add_entry(
+            "cn=user-usn,ou=users,dc=goauthentik,dc=io",
+            {
+                "name": "user-usn",
+                "sAMAccountName": "user-usn",
+                "objectSid": "user-usn",
+                "objectClass": "person",
+                "distinguishedName": "cn=user-usn,ou=users,dc=goauthentik,dc=io",
+                "uSNChanged": 10,
+            },
+        )
+        with patch(
+            "authentik.sources.ldap.models.LDAPSource.connection",
+            PropertyMock(return_value=connection),
+        ):
+            # Without a watermark, all users are synced
+            self.assertGreater(UserLDAPSynchronizer(self.source, incremental=True).sync(), 1)
+            self.source.refresh_from_db()
+            self.assertEqual(self.source.sync_watermarks["users"]["attribute"], "uSNChanged")
+            self.assertEqual(self.source.sync_watermarks["users"]["value"], "10")
+            connection.strategy.add_entry(
+                "cn=user-usn2,ou=users,dc=goauthentik,dc=io",
+                {
+                    "name": "user-usn2",
+                    "sAMAccountName": "user-usn2",
+                    "objectSid": "user-usn2",
+                    "objectClass": "person",
+                    "distinguishedName": "cn=user-usn2,ou=users,dc=goauthentik,dc=io",
+                    "uSNChanged": 11,
+                },
+            )
+            self.assertEqual(UserLDAPSynchronizer(self.source, incremental=True).sync(), 1)
+            self.assertTrue(User.objects.filter(username="user-usn2").exists())
+            self.source.refresh_from_db()
+            self.assertEqual(self.source.sync_watermarks["users"]["value"], "11")
+
     def test_sync_users_openldap(self):
         """Test user sync"""
         self.source.object_uniqueness_field = "uid"
@@ -181,6 +273,42 @@ class LDAPSyncTests(TestCase):
             posix_group = Group.objects.filter(name="group-posix").first()
             self.assertTrue(posix_group.users.filter(name="user-posix").exists())
 
+    def test_sync_membership_diff(self):
+        """Test membership sync only changing memberships of LDAP users"""
+        self.source.object_uniqueness_field = "cn"
+        self.source.group_membership_field = "memberUid"
+        self.source.user_object_filter = "(objectClass=posixAccount)"
+        self.source.group_object_filter = "(objectClass=posixGroup)"
+        self.source.property_mappings.set(
+            LDAPPropertyMapping.objects.filter(
+                Q(managed__startswith="goauthentik.io/sources/ldap/default")
+                | Q(managed__startswith="goauthentik.io/sources/ldap/openldap")
+            )
+        )
+        self.source.property_mappings_group.set(
+            LDAPPropertyMapping.objects.filter(managed="goauthentik.io/sources/ldap/openldap-cn")
+        )
+        connection = PropertyMock(return_value=mock_slapd_connection(LDAP_PASSWORD))
+        with patch("authentik.sources.ldap.models.LDAPSource.connection", connection):
+            self.source.save()
+            UserLDAPSynchronizer(self.source).sync()
+            GroupLDAPSynchronizer(self.source).sync()
+            MembershipLDAPSynchronizer(self.source).sync()
+            posix_group = Group.objects.get(name="group-posix")
+            local_user = User.objects.create(username="local")
+            removed_user = User.objects.create(
+                username="removed", attributes={"ldap_uniq": "removed"}
+            )
+            posix_group.users.add(local_user, removed_user)
+            MembershipLDAPSynchronizer(self.source).sync()
+            self.assertEqual(
+                set(posix_group.users.values_list("username", flat=True)),
+                {"user-posix", "local"},
+            )
+            # Nothing is written when memberships are unchanged
+            with self.assertNumQueries(3):
+                MembershipLDAPSynchronizer(self.source).sync()
+
     def test_tasks_ad(self):
         """Test Scheduled tasks"""
         self.source.property_mappings.set(
@@ -208,3 +336,60 @@ class LDAPSyncTests(TestCase):
         connection = PropertyMock(return_value=mock_slapd_connection(LDAP_PASSWORD))
         with patch("authentik.sources.ldap.models.LDAPSource.connection", connection):
             ldap_sync_all.delay().get()
+
+    def test_tasks_sharded(self):
+        """Test Scheduled tasks with users and groups split into shards"""
+        self.source.object_uniqueness_field = "cn"
+        self.source.group_membership_field = "memberUid"
+        self.source.user_object_filter = "(objectClass=posixAccount)"
+        self.source.group_object_filter = "(objectClass=posixGroup)"
+        self.source.property_mappings.set(
+            LDAPPropertyMapping.objects.filter(
+                Q(managed__startswith="goauthentik.io/sources/ldap/default")
+                | Q(managed__startswith="goauthentik.io/sources/ldap/openldap")
+            )
+        )
+        self.source.property_mappings_group.set(
+            LDAPPropertyMapping.objects.filter(managed="goauthentik.io/sources/ldap/openldap-cn")
+        )
+        connection = PropertyMock(return_value=mock_slapd_connection(LDAP_PASSWORD))
+        with (
+            patch("authentik.sources.ldap.models.LDAPSource.connection", connection),
+            patch("authentik.sources.ldap.tasks.ldap_sync_shard_count", return_value=3),
+        ):
+            self.source.save()
+            ldap_sync_all.delay().get()
+        # group-posix is in the shard of its cn's initial, other shards are empty
+        self.assertEqual(
+            TaskInfo.by_name("ldap_sync_ldap_group_1").result.messages, ["Synced 1 objects."]
+        )
+        self.assertEqual(
+            TaskInfo.by_name("ldap_sync_ldap_group_2").result.messages, ["Synced 0 objects."]
+        )
+        self.assertEqual(
+            TaskInfo.by_name("ldap_sync_shards_finished_ldap_shards").result.messages[-1],
+            "Finished 6 of 6 shards.",
+        )
+        # Memberships are synced once all shards are done
+        posix_group = Group.objects.filter(name="group-posix").first()
+        self.assertTrue(posix_group.users.filter(name="user-posix").exists())
+
+    def test_tasks_sharded_error(self):
+        """Test memberships being synced when a shard fails"""
+        connection = PropertyMock(return_value=mock_slapd_connection(LDAP_PASSWORD))
+        with (
+            patch("authentik.sources.ldap.models.LDAPSource.connection", connection),
+            patch("authentik.sources.ldap.tasks.ldap_sync_shard_count", return_value=3),
+            patch.object(GroupLDAPSynchronizer, "sync", side_effect=ValueError),
+        ):
+            ldap_sync_all.delay().get()
+        self.assertEqual(
+            TaskInfo.by_name("ldap_sync_shards_finished_ldap_shards").result.messages[-1],
+            "Finished 3 of 6 shards.",
+        )
+        self.assertIsNotNone(TaskInfo.by_name("ldap_sync_ldap_membership"))
+
+    def test_shard_filter(self):
+        """Test shard filters"""
+        self.assertEqual(shard_filter(1, 12), "(|(cn=1*)(cn=d*)(cn=p*))")
+        self.assertTrue(shard_filter(0, 12).endswith("(cn=y*)(cn=z*))))"))
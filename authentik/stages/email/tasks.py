@@ -35,6 +35,44 @@ def get_email_body(email: EmailMultiAlternatives) -> str:
     return email.body
 
 
+def email_sent_event(message: EmailMultiAlternatives) -> Event:
+    """Create the event logged for each sent email"""
+    return Event.new(
+        EventAction.EMAIL_SENT,
+        message=(f"Email to {', '.join(message.to)} sent"),
+        subject=message.subject,
+        body=get_email_body(message),
+        from_email=message.from_email,
+        to_email=message.to,
+    )
+
+
+def send_mails_connection(messages: list[EmailMultiAlternatives]) -> list[EmailMultiAlternatives]:
+    """Send `messages` with the global email settings over a single connection.
+    Returns the messages which couldn't be sent, so they can be retried individually."""
+    try:
+        backend = EmailStage(use_global_settings=True).backend
+        backend.open()
+    except (SMTPException, ConnectionError, OSError, ValueError) as exc:
+        LOGGER.debug("Error opening email connection", exc=exc)
+        return messages
+    unsent = []
+    try:
+        for message in messages:
+            message.extra_headers["Message-ID"] = make_msgid(domain=DNS_NAME)
+            LOGGER.debug("Sending mail", to=message.to)
+            try:
+                backend.send_messages([message])
+            except (SMTPException, ConnectionError, OSError) as exc:
+                LOGGER.debug("Error sending email", exc=exc)
+                unsent.append(message)
+                continue
+            email_sent_event(message).save()
+    finally:
+        backend.close()
+    return unsent
+
+
 @CELERY_APP.task(
     bind=True,
     autoretry_for=(
@@ -84,14 +122,7 @@ def send_mail(self: MonitoredTask, message: dict[Any, Any], email_stage_pk: Opti
 
         LOGGER.debug("Sending mail", to=message_object.to)
         backend.send_messages([message_object])
-        Event.new(
-            EventAction.EMAIL_SENT,
-            message=(f"Email to {', '.join(message_object.to)} sent"),
-            subject=message_object.subject,
-            body=get_email_body(message_object),
-            from_email=message_object.from_email,
-            to_email=message_object.to,
-        ).save()
+        email_sent_event(message_object).save()
         self.set_status(
             TaskResult(
                 TaskResultStatus.SUCCESSFUL,
@@ -1,4 +1,6 @@
 """authentik tenant app"""
+from importlib import import_module
+
 from django.apps import AppConfig
 
 
@@ -8,3 +10,6 @@ class AuthentikTenantsConfig(AppConfig):
     name = "authentik.tenants"
     label = "authentik_tenants"
     verbose_name = "authentik Tenants"
+
+    def ready(self):
+        import_module("authentik.tenants.signals")
@@ -0,0 +1,18 @@
+"""authentik tenant signals"""
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from authentik.tenants.models import Tenant
+from authentik.tenants.utils import CACHE_KEY_TENANT_VERSION
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+# pylint: disable=unused-argument
+def invalidate_tenant_index(sender, instance: Tenant, **_):
+    """Rebuild the tenant index of all processes once the change is committed"""
+    transaction.on_commit(lambda: cache.set(CACHE_KEY_TENANT_VERSION, uuid4().hex, timeout=None))
@@ -1,4 +1,8 @@
 """Test tenants"""
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
 from django.test.client import RequestFactory
 from django.urls import reverse
 from rest_framework.test import APITestCase
@@ -6,8 +10,10 @@ from rest_framework.test import APITestCase
 from authentik.core.tests.utils import create_test_admin_user, create_test_tenant
 from authentik.events.models import Event, EventAction
 from authentik.lib.config import CONFIG
+from authentik.lib.generators import generate_id
 from authentik.lib.utils.time import timedelta_from_string
 from authentik.tenants.models import Tenant
+from authentik.tenants.utils import CACHE_KEY_TENANT_VERSION, TenantIndex
 
 
 class TestTenants(APITestCase):
@@ -58,6 +64,23 @@ class TestTenants(APITestCase):
             },
         )
 
+    def test_tenant_index(self):
+        """Test tenant index resolving tenants without queries"""
+        Tenant.objects.all().delete()
+        Tenant.objects.create(domain="bar.baz", branding_title="custom")
+        Tenant.objects.create(domain="foo.bar.baz", branding_title="specific")
+        default = Tenant.objects.create(domain="default", default=True)
+        index = TenantIndex()
+        # Outside of transactions (like in requests) the index is kept
+        with patch.object(connection, "in_atomic_block", False):
+            self.assertEqual(index.get("a.foo.bar.baz").branding_title, "specific")
+            with self.assertNumQueries(0):
+                self.assertEqual(index.get("Other.BAR.baz").branding_title, "custom")
+                self.assertEqual(index.get("example.com"), default)
+            cache.set(CACHE_KEY_TENANT_VERSION, generate_id(), timeout=None)
+            with self.assertNumQueries(1):
+                index.get("bar.baz")
+
     def test_event_retention(self):
         """Test tenant's event retention"""
         tenant = Tenant.objects.create(
@@ -1,29 +1,75 @@
 """Tenant utilities"""
-from typing import Any
+from threading import Lock
+from typing import Any, Optional
+from uuid import uuid4
 
-from django.db.models import F, Q
-from django.db.models import Value as V
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection
 from django.http.request import HttpRequest
 from sentry_sdk.hub import Hub
 
 from authentik.lib.config import CONFIG
 from authentik.tenants.models import Tenant
 
-_q_default = Q(default=True)
 DEFAULT_TENANT = Tenant(domain="fallback")
+CACHE_KEY_TENANT_VERSION = "authentik_tenants_version"
+
+
+class TenantIndex:
+    """Per-process index of all tenants by domain, so tenants can be resolved without
+    querying the database. The index is rebuilt when the version stored in the cache changes,
+    which happens whenever a tenant is saved or deleted."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version: Optional[str] = None
+        self._fields = [field.attname for field in Tenant._meta.concrete_fields]
+        self._domains: dict[str, tuple[Any, ...]] = {}
+        self._default: Optional[tuple[Any, ...]] = None
+
+    def _build(self) -> tuple[dict[str, tuple[Any, ...]], Optional[tuple[Any, ...]]]:
+        """Load all tenants, keeping the database values of the first non-default tenant for
+        each domain and the default tenant"""
+        domains, default = {}, None
+        for values in Tenant.objects.order_by("default").values_list(*self._fields):
+            tenant = dict(zip(self._fields, values))
+            if tenant["default"]:
+                default = default or values
+                continue
+            domains.setdefault(tenant["domain"].lower(), values)
+        return domains, default
+
+    def _tenant(self, values: tuple[Any, ...]) -> Tenant:
+        """Create a new Tenant instance for each request, so related objects
+        aren't cached across requests"""
+        return Tenant.from_db(DEFAULT_DB_ALIAS, self._fields, values)
+
+    def get(self, host: str) -> Tenant:
+        """Get the tenant whose domain is the longest suffix of `host`, or the default tenant"""
+        domains, default = self._domains, self._default
+        version = cache.get_or_set(CACHE_KEY_TENANT_VERSION, lambda: uuid4().hex, timeout=None)
+        if version != self._version or connection.in_atomic_block:
+            domains, default = self._build()
+            # An index built from uncommitted data isn't kept, as it might be rolled back
+            if not connection.in_atomic_block:
+                with self._lock:
+                    self._domains, self._default, self._version = domains, default, version
+        host = host.lower()
+        for idx in range(len(host) + 1):
+            values = domains.get(host[idx:])
+            if values:
+                return self._tenant(values)
+        if default:
+            return self._tenant(default)
+        return DEFAULT_TENANT
+
+
+TENANT_INDEX = TenantIndex()
 
 
 def get_tenant_for_request(request: HttpRequest) -> Tenant:
     """Get tenant object for current request"""
-    db_tenants = (
-        Tenant.objects.annotate(host_domain=V(request.get_host()))
-        .filter(Q(host_domain__iendswith=F("domain")) | _q_default)
-        .order_by("default")
-    )
-    tenants = list(db_tenants.all())
-    if len(tenants) < 1:
-        return DEFAULT_TENANT
-    return tenants[0]
+    return TENANT_INDEX.get(request.get_host())
 
 
 def context_processor(request: HttpRequest) -> dict[str, Any]: